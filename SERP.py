@@ -1,13 +1,15 @@
 import requests
 import os 
 from dotenv import load_dotenv
-from postgres_db import fetch_from_saral_data , data_input , check_completeness, cur, get_connection
 import re
+from rate_limit import acquire, acquire_async, record_usage
+from deadline import bounded_timeout, expired, remaining
 
 
 load_dotenv()
 
 SERP_API_KEY = os.getenv("SERP_API_KEY")
+SERP_TIMEOUT = float(os.getenv("SARAL_SERP_TIMEOUT", "30"))
 
 
 
@@ -60,97 +62,122 @@ SERP_API_KEY = os.getenv("SERP_API_KEY")
 
 import re
 
-def query_making(data):
-    """
-    Build a Google dork for LinkedIn profiles similar to:
-    site:linkedin.com/in ( "Graphic Designer" ) ( "2 years" OR "2+ years" OR "2 yrs" OR "2yrs" )
-    ( "Surat" OR "Surat, Gujarat" OR "Surat Area" ) -site:linkedin.com/jobs -intitle:(...)
-    """
+NEGATIVE_FILTERS = '-site:linkedin.com/jobs -intitle:("jobs" OR "hiring" OR "vacancy" OR "vacancies" OR "career" OR "apply")'
+
+
+def experience_clause(exp):
+    """OR-group of the common ways an experience requirement is written, or None"""
+    if not exp:
+        return None
+    exp_str = str(exp).strip().lower()
+    if any(w in exp_str for w in ('fresher', 'entry', 'fresh')):
+        return '("Fresher")'
+
+    # normalize "to" and spaced hyphens -> compact, then capture numeric or range like "2", "2-3", "2+"
+    norm = re.sub(r'\s*(to|-)\s*', '-', exp_str)
+    m = re.search(r'\d+(?:-\d+)?\+?', norm)
+    if not m:
+        return None
+    base = m.group(0)  # e.g. "2", "2-3", "2+"
+    # produce common variants
+    variants = [
+        f'"{base} years"',
+        f'"{base}+ years"',
+        f'"{base} yrs"',
+        f'"{base}yrs"'
+    ]
+    # remove duplicates while preserving order
+    seen = set()
+    variants = [v for v in variants if not (v in seen or seen.add(v))]
+    return '( ' + ' OR '.join(variants) + ' )'
+
+
+def location_clause(loc):
+    """OR-group of a city (or list of cities) and its "Area" variant, or None"""
+    if not loc:
+        return None
+    loc_list = loc if isinstance(loc, list) else [loc]
+    loc_terms = []
+    for l in loc_list:
+        if not l:
+            continue
+        l = l.strip()
+        # common location variants for Indian cities (you can add more rules if needed)
+        if ',' not in l and not l.lower().endswith('area'):
+            loc_terms.append(f'"{l}"')   # optional — only safe for Surat-like cities; adjust if needed
+            loc_terms.append(f'"{l} Area"')
+        else:
+            loc_terms.append(f'"{l}"')
+    # dedupe while keeping order
+    seen = set()
+    loc_terms = [t for t in loc_terms if not (t in seen or seen.add(t))]
+    return '( ' + ' OR '.join(loc_terms) + ' )' if loc_terms else None
+
+
+def build_dork(job_title=None, skills=None, experience=None, location=None, work_preference=None, job_type=None):
+    """Assemble a LinkedIn profile dork from the individual clauses"""
     # base
     parts = ['site:linkedin.com/in']
 
     # job title (put inside its own parentheses)
-    job_title = data.get('job_title')
     if job_title:
         # ensure title is quoted and grouped
         parts.append(f'( "{job_title}" )')
 
     # skills (added as separate quoted tokens - could be many)
-    skills = data.get('skills') or []
-    for s in skills:
+    for s in skills or []:
         if s:
             parts.append(f'"{s}"')
 
-    # experience
-    exp = data.get('experience')
+    exp = experience_clause(experience)
     if exp:
-        exp_str = str(exp).strip().lower()
-        if any(w in exp_str for w in ('fresher', 'entry', 'fresh')):
-            parts.append('("Fresher")')
-        else:
-            # normalize "to" and spaced hyphens -> compact, then capture numeric or range like "2", "2-3", "2+"
-            norm = re.sub(r'\s*(to|-)\s*', '-', exp_str)
-            m = re.search(r'\d+(?:-\d+)?\+?', norm)
-            if m:
-                base = m.group(0)  # e.g. "2", "2-3", "2+"
-                # produce common variants
-                variants = [
-                    f'"{base} years"',
-                    f'"{base}+ years"',
-                    f'"{base} yrs"',
-                    f'"{base}yrs"'
-                ]
-                # remove duplicates while preserving order
-                seen = set()
-                variants = [v for v in variants if not (v in seen or seen.add(v))]
-                parts.append('( ' + ' OR '.join(variants) + ' )')
-
-    # location: single or list -> grouped OR (with common variants)
-    loc = data.get('location')
+        parts.append(exp)
+
+    loc = location_clause(location)
     if loc:
-        loc_list = loc if isinstance(loc, list) else [loc]
-        loc_terms = []
-        for l in loc_list:
-            if not l:
-                continue
-            l = l.strip()
-            # common location variants for Indian cities (you can add more rules if needed)
-            if ',' not in l and not l.lower().endswith('area'):
-                loc_terms.append(f'"{l}"')   # optional — only safe for Surat-like cities; adjust if needed
-                loc_terms.append(f'"{l} Area"')
-            else:
-                loc_terms.append(f'"{l}"')
-        # dedupe while keeping order
-        seen = set()
-        loc_terms = [t for t in loc_terms if not (t in seen or seen.add(t))]
-        if loc_terms:
-            parts.append('( ' + ' OR '.join(loc_terms) + ' )')
+        parts.append(loc)
 
     # work preference / job type (optional extra quoted tokens)
-    wp = data.get('work_preference')
-    if wp:
-        parts.append(f'"{wp}"')
-    jt = data.get('job_type')
-    if jt:
-        parts.append(f'"{jt}"')
+    if work_preference:
+        parts.append(f'"{work_preference}"')
+    if job_type:
+        parts.append(f'"{job_type}"')
 
     # negative filters: avoid job pages and recruiter titles
-    negatives = '-site:linkedin.com/jobs -intitle:("jobs" OR "hiring" OR "vacancy" OR "vacancies" OR "career" OR "apply")'
-    parts.append(negatives)
+    parts.append(NEGATIVE_FILTERS)
 
     # join with spaces
-    query = ' '.join(parts)
+    return ' '.join(parts)
+
+
+def query_making(data):
+    """
+    Build a Google dork for LinkedIn profiles similar to:
+    site:linkedin.com/in ( "Graphic Designer" ) ( "2 years" OR "2+ years" OR "2 yrs" OR "2yrs" )
+    ( "Surat" OR "Surat, Gujarat" OR "Surat Area" ) -site:linkedin.com/jobs -intitle:(...)
+    """
+    query = build_dork(
+        job_title=data.get('job_title'),
+        skills=data.get('skills') or [],
+        experience=data.get('experience'),
+        location=data.get('location'),
+        work_preference=data.get('work_preference'),
+        job_type=data.get('job_type'),
+    )
 
     return query, data.get('location')
 
 
+def normalize_profile_link(link):
+    """Canonical linkedin.com/in/ URL for a SERP result link, or None for non-profile links"""
+    if link and ("linkedin.com/in/" in link or "in.linkedin.com/in/" in link):
+        return link.replace("in.linkedin.com", "linkedin.com")
+    return None
 
-def serp_api_call(query,start = 0, results_per_page = 10):
-      data = None
 
-      # SERP API CALL
 
-      params = {
+def serp_params(query, start=0, results_per_page=10):
+      return {
             "engine": "google",
             "q": query.strip(),
             "api_key": SERP_API_KEY,
@@ -164,8 +191,22 @@ def serp_api_call(query,start = 0, results_per_page = 10):
             
       }
 
+
+def serp_api_call(query,start = 0, results_per_page = 10):
+      data = None
+
+      # SERP API CALL
+
+      params = serp_params(query, start, results_per_page)
+
+      if expired():
+            print("⏰ Skipping SERP call: request deadline reached")
+            return data
+
       try:
-            response = requests.get("https://serpapi.com/search", params=params)
+            acquire("serp", SERP_API_KEY, timeout=remaining())
+            response = requests.get("https://serpapi.com/search", params=params, timeout=bounded_timeout(SERP_TIMEOUT))
+            record_usage("serp", "calls")
             if response.status_code == 200:
                   data = response.json()
                   
@@ -177,9 +218,24 @@ def serp_api_call(query,start = 0, results_per_page = 10):
       return data
 
 
+async def serp_api_call_async(http, query, start=0, results_per_page=10):
+      """serp_api_call for the ASGI app; http is a shared httpx.AsyncClient"""
+      if expired():
+            print("⏰ Skipping SERP call: request deadline reached")
+            return None
 
+      try:
+            await acquire_async("serp", SERP_API_KEY, timeout=remaining())
+            response = await http.get(
+                  "https://serpapi.com/search",
+                  params=serp_params(query, start, results_per_page),
+                  timeout=bounded_timeout(SERP_TIMEOUT)
+            )
+            record_usage("serp", "calls")
+            if response.status_code == 200:
+                  return response.json()
+            print(f"Request failed with status code: {response.status_code}")
+      except Exception as e:
+            print(f"⚠️ SERP request failed: {e}")
 
-
-
-
-
+      return None
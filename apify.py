@@ -1,6 +1,8 @@
-from apify_client import ApifyClient
 from dotenv import load_dotenv
 import os
+from rate_limit import acquire, acquire_async, record_usage
+from deadline import remaining
+from candidate_record import CandidateRecord
 
 load_dotenv()
 
@@ -20,9 +22,40 @@ linkedin_profiles = {
     "10": "https://linkedin.com/in/isha-bhanderi-244638246",
 }
 
-client = ApifyClient(APIFY_API_KEY)
+# LinkedIn profile scraper actor
+PROFILE_ACTOR_ID = "2SyF0bVxmgGr8IVCZ"
+
+_client = None
+_async_client = None
+
+
+def get_client():
+      """ApifyClient built on first use; importing apify_client is slow and not every request needs it"""
+      global _client
+      if _client is None:
+            from apify_client import ApifyClient
+            _client = ApifyClient(APIFY_API_KEY)
+      return _client
+
+
+def get_async_client():
+      """ApifyClientAsync for the ASGI app, built on first use"""
+      global _async_client
+      if _async_client is None:
+            from apify_client import ApifyClientAsync
+            _async_client = ApifyClientAsync(APIFY_API_KEY)
+      return _async_client
+
+
+def _dataset_item_loader(dataset_id, offset):
+      def load():
+            items = get_client().dataset(dataset_id).list_items(offset=offset, limit=1).items
+            return items[0] if items else None
+      return load
+
 
 def apify_call(linkedin_profiles):
+      client = get_client()
       list_links = list(linkedin_profiles.values())
       
       print(list_links)
@@ -31,12 +64,18 @@ def apify_call(linkedin_profiles):
             "profileUrls": list_links
       }
 
-      run = client.actor("2SyF0bVxmgGr8IVCZ").call(run_input=run_input)
+      # Inside a request deadline the actor run is cut off in time; items scraped so far are still returned
+      left = remaining()
+      timeout_secs = max(1, int(left)) if left is not None else None
+
+      acquire("apify", APIFY_API_KEY, timeout=left)
+      run = client.actor(PROFILE_ACTOR_ID).call(run_input=run_input, timeout_secs=timeout_secs)
 
       cleaned_profiles = []
 
 
-      for idx, item in enumerate(client.dataset(run["defaultDatasetId"]).iterate_items(),start=1):
+      dataset_id = run["defaultDatasetId"]
+      for idx, item in enumerate(client.dataset(dataset_id).iterate_items(),start=1):
             # apify_json[idx] = item
 
             # raw_skills = item.get("skills", [])
@@ -55,11 +94,37 @@ def apify_call(linkedin_profiles):
             # }
 
             # profile_data = {k: v for k, v in profile_data.items() if v}
-            cleaned_profiles.append(item)
+            # Only the fields the pipeline uses stay in memory; the full item is re-read from the dataset on demand
+            cleaned_profiles.append(CandidateRecord.from_apify_item(item, raw_loader=_dataset_item_loader(dataset_id, idx - 1)))
 
 
 
-      
+      record_usage("apify", "runs")
+      record_usage("apify", "profiles", len(cleaned_profiles))
+
       return cleaned_profiles
             
 
+
+async def apify_call_async(linkedin_profiles):
+      """apify_call for the ASGI app: waits on the actor run without holding a thread"""
+      client = get_async_client()
+      list_links = list(linkedin_profiles.values())
+
+      left = remaining()
+      timeout_secs = max(1, int(left)) if left is not None else None
+
+      await acquire_async("apify", APIFY_API_KEY, timeout=left)
+      run = await client.actor(PROFILE_ACTOR_ID).call(run_input={"profileUrls": list_links}, timeout_secs=timeout_secs)
+
+      dataset_id = run["defaultDatasetId"]
+      cleaned_profiles = []
+      offset = 0
+      async for item in client.dataset(dataset_id).iterate_items():
+            cleaned_profiles.append(CandidateRecord.from_apify_item(item, raw_loader=_dataset_item_loader(dataset_id, offset)))
+            offset += 1
+
+      record_usage("apify", "runs")
+      record_usage("apify", "profiles", len(cleaned_profiles))
+
+      return cleaned_profiles
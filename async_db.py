@@ -0,0 +1,149 @@
+"""
+asyncpg access for the ASGI app. Same tables and row shapes as postgres_db,
+but queries wait on the event loop instead of holding a worker thread.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+
+import fastjson
+from candidate_record import CandidateRecord
+from deadline import remaining
+from postgres_db import (hostname, database, username, pwd, port_id, DB_RETRY_SECONDS, FRESH_PROFILE_DAYS,
+                         SERP_CACHE_HOURS)
+
+DB_POOL_MIN = int(os.getenv("SARAL_DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("SARAL_DB_POOL_MAX", "20"))
+DB_CONNECT_TIMEOUT = int(os.getenv("SARAL_DB_CONNECT_TIMEOUT", "5"))
+
+PROFILE_COLUMNS = ("id, name, location, email, linkedin_url, headline, skills, about, experience, "
+                   "profile_pic, is_complete, created_at, career_timeline")
+
+_pool = None
+_pool_lock = None
+_pool_failed_at = None
+
+
+async def _init_connection(connection):
+    # JSON columns decode to Python objects, as they do through psycopg2
+    for type_name in ("json", "jsonb"):
+        await connection.set_type_codec(
+            type_name, encoder=fastjson.dumps, decoder=fastjson.loads, schema="pg_catalog"
+        )
+
+
+async def get_pool():
+    """Connection pool, created on first use; None while the database is unreachable"""
+    global _pool, _pool_lock, _pool_failed_at
+    if _pool is not None:
+        return _pool
+    if _pool_failed_at is not None and time.monotonic() - _pool_failed_at < DB_RETRY_SECONDS:
+        return None
+    if _pool_lock is None:
+        _pool_lock = asyncio.Lock()
+
+    async with _pool_lock:
+        if _pool is None:
+            import asyncpg
+            try:
+                _pool = await asyncpg.create_pool(
+                    host=hostname, database=database, user=username, password=pwd, port=port_id,
+                    min_size=DB_POOL_MIN, max_size=DB_POOL_MAX, timeout=DB_CONNECT_TIMEOUT,
+                    init=_init_connection,
+                )
+                _pool_failed_at = None
+                print("✓ Async database pool ready")
+            except Exception as error:
+                print(error)
+                _pool_failed_at = time.monotonic()
+                return None
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+
+def _timeout():
+    """Per-query timeout bounded by the request deadline"""
+    left = remaining()
+    return max(0.1, left) if left is not None else None
+
+
+async def fetch_from_saral_data(links):
+    """
+    Complete profiles scraped within FRESH_PROFILE_DAYS for links, plus the
+    links still to scrape (a fresh incomplete row counts as scraped)
+    """
+    pool = await get_pool()
+    if pool is None or not links:
+        return [], list(links)
+
+    fresh_since = datetime.now() - timedelta(days=FRESH_PROFILE_DAYS)
+    try:
+        rows = await pool.fetch(
+            f"""
+            SELECT DISTINCT ON (linkedin_url) {PROFILE_COLUMNS}
+            FROM profiles
+            WHERE linkedin_url = ANY($1::text[]) AND created_at >= $2
+            ORDER BY linkedin_url, created_at DESC
+            """,
+            list(links), fresh_since, timeout=_timeout(),
+        )
+    except Exception as e:
+        print(f"⚠️ Async profile lookup failed: {e}")
+        return [], list(links)
+
+    results = [CandidateRecord.from_db_row(tuple(row)) for row in rows if row["is_complete"] is not False]
+    found = {row["linkedin_url"] for row in rows}
+    return results, [link for link in links if link not in found]
+
+
+async def fetch_serp_page(query, start, results_per_page):
+    """A SERP response stored in serp_cache within SERP_CACHE_HOURS, or None"""
+    if SERP_CACHE_HOURS <= 0:
+        return None
+    pool = await get_pool()
+    if pool is None:
+        return None
+    try:
+        return await pool.fetchval(
+            """
+            SELECT response FROM serp_cache
+            WHERE query = $1 AND start_index = $2 AND results_per_page = $3 AND fetched_at >= $4
+            """,
+            query, start, results_per_page, datetime.now() - timedelta(hours=SERP_CACHE_HOURS),
+            timeout=_timeout(),
+        )
+    except Exception as e:
+        print(f"⚠️ Async SERP cache lookup failed: {e}")
+        return None
+
+
+async def fetch_profile(profile_id):
+    """One stored profile by numeric id or public LinkedIn id, newest first"""
+    pool = await get_pool()
+    if pool is None:
+        return None
+
+    if str(profile_id).isdigit():
+        where, param = "id = $1", int(profile_id)
+    else:
+        where, param = "linkedin_url = ANY($1::text[])", [
+            f"{prefix}/in/{profile_id}{suffix}"
+            for prefix in ("https://linkedin.com", "https://www.linkedin.com")
+            for suffix in ("", "/")
+        ]
+    try:
+        row = await pool.fetchrow(
+            f"SELECT {PROFILE_COLUMNS} FROM profiles WHERE {where} ORDER BY created_at DESC LIMIT 1",
+            param, timeout=_timeout(),
+        )
+    except Exception as e:
+        print("Error fetching profile:", e)
+        return None
+    return CandidateRecord.from_db_row(tuple(row)) if row else None
@@ -0,0 +1,49 @@
+"""
+Microbenchmark: stdlib json vs the fastjson backend on candidates.py-sized payloads.
+
+    python bench_json.py [repeat]
+
+Covers the hot spots: a /search page of full profiles, a 100-profile list,
+the skills/experience columns written by data_input and an LLM summary reply.
+"""
+import json
+import sys
+import timeit
+
+import fastjson
+from candidates import candidates
+
+
+def payloads():
+    page = [dict(candidates[i % len(candidates)], score=50 + i) for i in range(10)]
+    return {
+        "search page (10 profiles)": page,
+        "enrichment batch (100 profiles)": page * 10,
+        "experiences column": candidates[0].get("experiences") or [],
+        "skills column": [s.get("title") for s in candidates[0].get("skills") or [] if isinstance(s, dict)],
+    }
+
+
+def bench(label, obj, repeat):
+    text = json.dumps(obj)
+    number = max(1, 20000 // max(1, len(text) // 100))
+
+    std_dumps = min(timeit.repeat(lambda: json.dumps(obj), number=number, repeat=repeat)) / number
+    fast_dumps = min(timeit.repeat(lambda: fastjson.dumpb(obj), number=number, repeat=repeat)) / number
+    std_loads = min(timeit.repeat(lambda: json.loads(text), number=number, repeat=repeat)) / number
+    fast_loads = min(timeit.repeat(lambda: fastjson.loads(text), number=number, repeat=repeat)) / number
+
+    print(f"{label:<34} {len(text) / 1024:>8.1f} KB  "
+          f"dumps {std_dumps * 1e6:>9.1f}us -> {fast_dumps * 1e6:>8.1f}us ({std_dumps / fast_dumps:>4.1f}x)  "
+          f"loads {std_loads * 1e6:>9.1f}us -> {fast_loads * 1e6:>8.1f}us ({std_loads / fast_loads:>4.1f}x)")
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    print(f"fastjson backend: {fastjson.BACKEND}\n")
+    for label, obj in payloads().items():
+        bench(label, obj, repeat)
+
+
+if __name__ == "__main__":
+    main()
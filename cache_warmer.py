@@ -0,0 +1,232 @@
+"""
+Pre-run the searches recruiters ask for most, so the first searches of the
+day are served from warm caches instead of live scraping.
+
+    python cache_warmer.py [--top N] [--days D] [--pages P]
+                           [--serp-budget N] [--apify-budget N] [--max-seconds S] [--dry-run]
+
+Queries are mined from saral_prompts: logged prompts are grouped by their
+parsed job_title, skills, experience, location, work preference and job
+type, and every use counts with a weight that halves each
+SARAL_WARM_HALF_LIFE_DAYS, so frequent and recent queries come first. Each
+one runs through the same pipeline as the front ends (dork planning, SERP,
+DB lookup, Apify, validation) until its first `pages` pages are filled or
+the run's budget is spent. SERP pages land in the serp_cache table and
+scraped profiles in profiles, which every worker process reads.
+Run it from cron shortly before the morning peak.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import fastjson
+from deadline import deadline_scope
+from pipeline import DEFAULT_STEPS, SearchPipeline, SharedStageCache, metrics as pipeline_metrics
+from postgres_db import get_conn, fetch_recent_prompts, profile_writes, serp_page_writes
+from rate_limit import begin_request, end_request, flush_usage
+from search_results import PROFILES_PER_PAGE
+from search_state import SearchStateStore
+
+
+WARM_TOP_QUERIES = int(os.getenv("SARAL_WARM_TOP_QUERIES", "20"))
+WARM_LOOKBACK_DAYS = int(os.getenv("SARAL_WARM_LOOKBACK_DAYS", "14"))
+WARM_HALF_LIFE_DAYS = float(os.getenv("SARAL_WARM_HALF_LIFE_DAYS", "3"))
+WARM_PAGES = int(os.getenv("SARAL_WARM_PAGES", "1"))
+# Spend limits for one whole run; pages already in serp_cache and stored profiles cost nothing
+WARM_SERP_BUDGET = int(os.getenv("SARAL_WARM_SERP_BUDGET", "100"))
+WARM_APIFY_BUDGET = int(os.getenv("SARAL_WARM_APIFY_BUDGET", "300"))
+WARM_MAX_SECONDS = int(os.getenv("SARAL_WARM_MAX_SECONDS", "1800"))
+# How many of the newest logged prompts are mined
+WARM_PROMPT_SCAN = int(os.getenv("SARAL_WARM_PROMPT_SCAN", "5000"))
+# How long the final flush of queued profiles and SERP pages may take
+WARM_FLUSH_SECONDS = 60
+
+
+def _as_list(value):
+    """skills come back as JSON text and location as an array; older rows may hold plain text"""
+    if value in (None, ""):
+        return []
+    if isinstance(value, str):
+        try:
+            value = fastjson.loads(value)
+        except ValueError:
+            return [value]
+    if isinstance(value, (list, tuple)):
+        return [item for item in value if item]
+    return [value] if value else []
+
+
+def _norm(value):
+    return str(value).strip().lower() if value not in (None, "") else ""
+
+
+def popular_queries(rows, top=WARM_TOP_QUERIES, half_life_days=WARM_HALF_LIFE_DAYS, now=None):
+    """
+    Group prompt rows (newest first) by parsed intent and return the `top`
+    groups by decayed use count, each as a dict with the latest prompt
+    wording and its parsed_data.
+    """
+    now = now or datetime.now()
+    groups = {}
+    for prompt, job_title, skills, experience, location, work_preference, job_type, is_indian, created_at in rows:
+        if is_indian is False:
+            continue  # rejected by the search endpoints, nothing to warm
+        parsed_data = {
+            "job_title": job_title,
+            "skills": _as_list(skills),
+            "experience": experience,
+            "location": _as_list(location),
+            "work_preference": work_preference,
+            "job_type": job_type,
+            "is_indian": True if is_indian is None else is_indian,
+        }
+        if not job_title and not parsed_data["skills"]:
+            continue
+
+        key = (
+            _norm(job_title),
+            tuple(sorted(_norm(s) for s in parsed_data["skills"])),
+            _norm(experience),
+            tuple(sorted(_norm(c) for c in parsed_data["location"])),
+            _norm(work_preference),
+            _norm(job_type),
+        )
+        age_days = max(0.0, (now - created_at).total_seconds() / 86400) if created_at else 0.0
+        group = groups.get(key)
+        if group is None:
+            # Rows are newest first, so the first one seen is the wording to replay
+            group = groups[key] = {"prompt": prompt, "parsed_data": parsed_data, "uses": 0,
+                                   "score": 0.0, "last_used": created_at}
+        group["uses"] += 1
+        group["score"] += 0.5 ** (age_days / half_life_days)
+
+    return sorted(groups.values(), key=lambda g: g["score"], reverse=True)[:top]
+
+
+class WarmBudget:
+    """Live SERP credits, Apify profiles and wall-clock time one warm run may spend"""
+
+    def __init__(self, serp_credits=WARM_SERP_BUDGET, apify_profiles=WARM_APIFY_BUDGET, seconds=WARM_MAX_SECONDS):
+        self.serp_credits = serp_credits
+        self.apify_profiles = apify_profiles
+        self.ends_at = time.monotonic() + seconds
+        self.serp_used = 0
+        self.apify_used = 0
+
+    def seconds_left(self):
+        return max(0.0, self.ends_at - time.monotonic())
+
+    def exhausted(self):
+        return (self.serp_used >= self.serp_credits or self.apify_used >= self.apify_profiles
+                or self.seconds_left() <= 0)
+
+    def serp_step(self, serp):
+        """Pipeline serp step that counts live calls; cache hits never reach it"""
+        def step(query, start, results_per_page):
+            if self.serp_used >= self.serp_credits:
+                return None
+            self.serp_used += 1
+            return serp(query, start, results_per_page)
+        return step
+
+    def enrich_step(self, enrich):
+        """Pipeline enrich step that scrapes no more profiles than the budget has left"""
+        def step(urls):
+            urls = list(urls)[:max(0, self.apify_profiles - self.apify_used)]
+            if not urls:
+                return []
+            self.apify_used += len(urls)
+            return enrich(urls)
+        return step
+
+
+def warm(queries, budget, pages=WARM_PAGES):
+    """Run each query's first `pages` pages through the pipeline until the budget is spent"""
+    pipeline = SearchPipeline(
+        steps={'serp': budget.serp_step(DEFAULT_STEPS['serp']),
+               'enrich': budget.enrich_step(DEFAULT_STEPS['enrich'])},
+        cache=SharedStageCache(),
+    )
+    states = SearchStateStore(max_entries=max(1, len(queries)))
+    warmed = []
+
+    for rank, query in enumerate(queries, start=1):
+        if budget.exhausted():
+            print(f"💸 Warm budget spent after {len(warmed)} queries")
+            break
+        print(f"🔥 [{rank}/{len(queries)}] {query['prompt']!r} (score {query['score']:.2f}, {query['uses']} uses)")
+        serp_before, apify_before = budget.serp_used, budget.apify_used
+        with deadline_scope(budget.seconds_left()):
+            state = pipeline.plan(query["prompt"], query["parsed_data"], states)
+            credits = pipeline.enrich(state, pages * PROFILES_PER_PAGE, state.controller.max_credits,
+                                      should_stop=budget.exhausted)
+        warmed.append({
+            "prompt": query["prompt"],
+            "matched": len(state.matched_profiles),
+            "serp_pages": credits,
+            "serp_live": budget.serp_used - serp_before,
+            "scraped": budget.apify_used - apify_before,
+        })
+    return warmed
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Warm the SERP cache and profiles table from saral_prompts")
+    parser.add_argument("--top", type=int, default=WARM_TOP_QUERIES, help="queries to warm")
+    parser.add_argument("--days", type=int, default=WARM_LOOKBACK_DAYS, help="prompt history to mine")
+    parser.add_argument("--pages", type=int, default=WARM_PAGES, help="result pages to fill per query")
+    parser.add_argument("--serp-budget", type=int, default=WARM_SERP_BUDGET, help="live SERP credits")
+    parser.add_argument("--apify-budget", type=int, default=WARM_APIFY_BUDGET, help="profiles to scrape")
+    parser.add_argument("--max-seconds", type=int, default=WARM_MAX_SECONDS, help="wall-clock limit")
+    parser.add_argument("--dry-run", action="store_true", help="only list the queries that would be warmed")
+    args = parser.parse_args(argv)
+
+    conn = get_conn()
+    if conn is None:
+        print("⚠️ Database unavailable, nothing to warm")
+        return 1
+    rows = fetch_recent_prompts(conn, days=args.days, limit=WARM_PROMPT_SCAN)
+    if rows is None:
+        return 1
+
+    queries = popular_queries(rows, top=args.top)
+    print(f"📊 {len(rows)} prompts from the last {args.days} days -> {len(queries)} queries to warm")
+    for query in queries:
+        print(f"  {query['score']:>7.2f}  {query['uses']:>4}x  last {query['last_used']:%Y-%m-%d %H:%M}  "
+              f"{query['prompt']!r}")
+    if args.dry_run or not queries:
+        return 0
+
+    budget = WarmBudget(args.serp_budget, args.apify_budget, args.max_seconds)
+    started = time.perf_counter()
+    begin_request("cache_warmer")
+    try:
+        warmed = warm(queries, budget, pages=args.pages)
+    finally:
+        usage = end_request()
+
+    # Everything the run scraped or fetched is written before the process exits
+    profiles_done = profile_writes.flush(timeout=WARM_FLUSH_SECONDS)
+    pages_done = serp_page_writes.flush(timeout=WARM_FLUSH_SECONDS)
+    flush_usage()
+
+    serp_stats = pipeline_metrics.snapshot().get("serp", {})
+    print(f"✓ Warmed {len(warmed)}/{len(queries)} queries in {time.perf_counter() - started:.0f}s: "
+          f"{budget.serp_used}/{budget.serp_credits} live SERP credits, "
+          f"{serp_stats.get('cache_hits', 0)} SERP pages already cached, "
+          f"{budget.apify_used}/{budget.apify_profiles} profiles scraped")
+    for entry in warmed:
+        print(f"  {entry['matched']:>4} matched  {entry['serp_pages']:>3} pages ({entry['serp_live']} live)  "
+              f"{entry['scraped']:>4} scraped  {entry['prompt']!r}")
+    if usage:
+        print(f"💳 Upstream usage: {usage}")
+    if not (profiles_done and pages_done):
+        print("⚠️ Some profiles or SERP pages were still queued when the flush timed out")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
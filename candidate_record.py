@@ -0,0 +1,171 @@
+"""
+Compact candidate record used inside a search request.
+
+Apify items carry dozens of keys the pipeline never reads
+(profilePicAllDimensions, updates, patents, promos, ...). A CandidateRecord
+keeps only the fields validate/score/ingest/display use, in __slots__, and
+reaches for the full payload through a loader only when asked.
+"""
+
+
+# Column order of the SELECT in postgres_db.fetch_from_saral_data
+DB_COLUMNS = (
+    "id", "name", "location", "email", "linkedin_url", "headline", "skills", "about",
+    "experience", "profile_pic", "is_complete", "created_at", "career_timeline",
+)
+
+
+class CandidateRecord:
+    """Dict-like (get / [] / in) so existing profile code works unchanged"""
+
+    FIELDS = (
+        "id", "fullName", "headline", "linkedinUrl", "addressWithCountry", "email",
+        "profilePic", "about", "skills", "experiences", "educations",
+        "licenseAndCertificates", "careerTimeline", "is_complete", "created_at",
+        "score", "score_breakdown",
+    )
+    __slots__ = FIELDS + ("_raw", "_raw_loader")
+
+    def __init__(self, raw_loader=None, **fields):
+        for name in self.FIELDS:
+            setattr(self, name, fields.get(name))
+        self._raw = None
+        self._raw_loader = raw_loader
+
+    @classmethod
+    def from_apify_item(cls, item, raw_loader=None):
+        """Keep the pipeline fields of an Apify item; the item itself is not retained"""
+        return cls(raw_loader=raw_loader, **{name: item.get(name) for name in cls.FIELDS})
+
+    @classmethod
+    def from_db_row(cls, row, raw_loader=None):
+        """Build from a profiles row (DB_COLUMNS order) with the same defaults the API always used"""
+        values = dict(zip(DB_COLUMNS, row))
+        return cls(
+            raw_loader=raw_loader,
+            id=values["id"],
+            fullName=values["name"] or "Unknown",
+            addressWithCountry=values["location"] or "Unknown",
+            email=values["email"] or "-",
+            linkedinUrl=values["linkedin_url"] or "-",
+            headline=values["headline"] or "-",
+            # profiles.skills stores bare titles; present them in the Apify shape scoring expects
+            skills=[{"title": s} if isinstance(s, str) else s for s in values["skills"] or []],
+            about=values["about"] or "",
+            experiences=values["experience"] or [],
+            profilePic=values["profile_pic"] or None,
+            is_complete=values["is_complete"],
+            created_at=values["created_at"],
+            careerTimeline=values["career_timeline"],
+        )
+
+    @classmethod
+    def coerce(cls, profile):
+        """Accept a record or a plain profile dict"""
+        return profile if isinstance(profile, cls) else cls.from_apify_item(profile)
+
+    @property
+    def raw(self):
+        """Full upstream payload, fetched on first access"""
+        if self._raw is None and self._raw_loader is not None:
+            self._raw = self._raw_loader()
+            self._raw_loader = None
+        return self._raw
+
+    def get(self, key, default=None):
+        if key in self.FIELDS:
+            value = getattr(self, key)
+            return default if value is None else value
+        raw = self.raw
+        return raw.get(key, default) if raw else default
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.FIELDS:
+            raise KeyError(f"{key} is not a CandidateRecord field")
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    @property
+    def is_stored(self):
+        """Read from the profiles table (only rows carry created_at), so there is nothing to write back"""
+        return self.created_at is not None
+
+    @property
+    def profile_id(self):
+        """Public LinkedIn identifier, used by GET /profiles/<id>"""
+        url = (self.linkedinUrl or "").rstrip("/")
+        return url.rsplit("/in/", 1)[-1] if "/in/" in url else None
+
+    def to_dict(self, fields=None):
+        """JSON-ready dict of the populated fields (optionally only `fields`)"""
+        names = self.FIELDS if fields is None else [f for f in fields if f in self.FIELDS]
+        data = {name: getattr(self, name) for name in names if getattr(self, name) is not None}
+        if self.profile_id:
+            data["profileId"] = self.profile_id
+        return data
+
+    def project(self, view="full", fields=None):
+        """Named projection (see VIEWS), or an explicit field list when `fields` is given"""
+        if fields:
+            return self.to_dict(fields)
+        data = self.to_dict(VIEWS[view])
+        if view == "card":
+            data.update(_card_details(self))
+        return data
+
+    def __repr__(self):
+        return f"CandidateRecord({self.linkedinUrl!r}, {self.fullName!r})"
+
+
+# Fields each view returns; "card" is what the result cards in index.html render
+VIEWS = {
+    "card": (
+        "id", "fullName", "headline", "linkedinUrl", "addressWithCountry", "email",
+        "profilePic", "about", "skills", "experiences", "score",
+    ),
+    "full": CandidateRecord.FIELDS,
+}
+CARD_EXPERIENCE_KEYS = ("title", "subtitle", "metadata", "caption")
+
+
+def _card_details(record):
+    """Skills as bare {title} and experiences without logos, URNs or sub-components"""
+    details = {}
+    if record.skills:
+        details["skills"] = [
+            {"title": s.get("title")} for s in record.skills if isinstance(s, dict) and s.get("title")
+        ]
+    if record.experiences:
+        details["experiences"] = [
+            {k: exp[k] for k in CARD_EXPERIENCE_KEYS if exp.get(k)}
+            for exp in record.experiences if isinstance(exp, dict)
+        ]
+    return details
+
+
+def parse_projection(view=None, fields=None):
+    """
+    Validate the view= / fields= request parameters. fields may be a list or a
+    comma-separated string. Raises ValueError with a message for the client.
+    """
+    view = (view or "full").lower()
+    if view not in VIEWS:
+        raise ValueError(f"view must be one of: {', '.join(VIEWS)}")
+
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    if fields:
+        unknown = [f for f in fields if f not in CandidateRecord.FIELDS]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+        # Always keep what a client needs to identify the profile and fetch the rest
+        fields = ["linkedinUrl"] + [f for f in fields if f != "linkedinUrl"]
+    return view, fields or None
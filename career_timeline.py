@@ -0,0 +1,166 @@
+import json
+import re
+from datetime import date
+
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12,
+}
+
+_POINT = r'(?:([A-Za-z]{3})[a-z]*\.?\s+)?(\d{4})'
+_RANGE_RE = re.compile(_POINT + r'\s*[-–]\s*(?:(present)|' + _POINT + r')', re.IGNORECASE)
+_YEARS_RE = re.compile(r'(\d+)\s*(?:years?|yrs?)', re.IGNORECASE)
+_MONTHS_RE = re.compile(r'(\d+)\s*(?:months?|mos?)\b', re.IGNORECASE)
+
+
+def _month_index(year: int, month: int) -> int:
+    return year * 12 + (month - 1)
+
+
+def _month_label(index: int) -> str:
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+
+def format_months(months: int) -> str:
+    """Same "X years Y months" format calculate_career_stability produces"""
+    return f"{months // 12} years {months % 12} months"
+
+
+def _caption_duration(caption: str):
+    """The "· 2 yrs 4 mos" suffix LinkedIn appends, in months (None if absent)"""
+    tail = caption.split("·", 1)[1] if "·" in caption else ""
+    years = _YEARS_RE.search(tail)
+    months = _MONTHS_RE.search(tail)
+    if not years and not months:
+        return None
+    return (int(years.group(1)) * 12 if years else 0) + (int(months.group(1)) if months else 0)
+
+
+def parse_caption(caption: str, today: date = None):
+    """
+    Parse an experience caption such as "Jan 2025 - Present · 9 mos" into a
+    half-open month interval (start, end). Returns None when it has no dates.
+    """
+    if not caption:
+        return None
+    match = _RANGE_RE.search(caption)
+    if not match:
+        return None
+
+    today = today or date.today()
+    start_mon, start_year, present, end_mon, end_year = match.groups()
+
+    start = _month_index(int(start_year), MONTHS.get((start_mon or "jan").lower()[:3], 1))
+    duration = _caption_duration(caption)
+
+    if present:
+        end = _month_index(today.year, today.month) + 1
+    elif end_mon:
+        end = _month_index(int(end_year), MONTHS.get(end_mon.lower()[:3], 12)) + 1
+    elif duration:
+        # Year-only end date: trust the stated duration for the length
+        end = start + duration
+    else:
+        end = _month_index(int(end_year), 12) + 1
+
+    if end <= start:
+        end = start + 1
+    return start, end
+
+
+def _roles(experiences):
+    """Yield (title, caption) per role, expanding roles grouped under one company"""
+    for exp in experiences:
+        if not isinstance(exp, dict):
+            continue
+        grouped = [sub for sub in exp.get("subComponents") or [] if isinstance(sub, dict) and sub.get("caption")]
+        if exp.get("breakdown") and grouped:
+            for sub in grouped:
+                yield sub.get("title"), sub.get("caption")
+        else:
+            yield exp.get("title"), exp.get("caption")
+
+
+def merge_intervals(intervals):
+    """Merge overlapping or touching month intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def compute_career_timeline(experiences, today: date = None) -> dict:
+    """
+    Build the career timeline for a profile from its experience captions.
+
+    Overlapping roles are counted once toward total experience. Returns month
+    counts, gaps between merged intervals, and a career_stability_overview in
+    the format the summary endpoint already exposes.
+    """
+    if isinstance(experiences, str):
+        try:
+            experiences = json.loads(experiences)
+        except Exception:
+            experiences = []
+
+    today = today or date.today()
+    intervals = []
+    for _, caption in _roles(experiences or []):
+        interval = parse_caption(caption, today)
+        if interval:
+            intervals.append(interval)
+
+    merged = merge_intervals(intervals)
+    total = sum(end - start for start, end in merged)
+    average = total // len(intervals) if intervals else 0
+
+    # Most recent role: latest start date, preferring roles still open
+    current = 0
+    if intervals:
+        start, end = max(intervals, key=lambda iv: (iv[1], iv[0]))
+        current = end - start
+
+    gaps = [
+        {"from": _month_label(prev_end), "to": _month_label(next_start - 1), "months": next_start - prev_end}
+        for (_, prev_end), (next_start, _) in zip(merged, merged[1:])
+        if next_start > prev_end
+    ]
+
+    return {
+        "as_of": _month_label(_month_index(today.year, today.month)),
+        "role_count": len(intervals),
+        "total_experience_months": total,
+        "average_tenure_months": average,
+        "current_role_months": current,
+        "gaps": gaps,
+        "longest_gap_months": max((g["months"] for g in gaps), default=0),
+        "intervals": [[_month_label(s), _month_label(e - 1)] for s, e in merged],
+        "career_stability_overview": {
+            "average_tenure": format_months(average),
+            "current_role": format_months(current),
+            "total_experience": format_months(total),
+        },
+    }
+
+
+def career_timeline_for(profile: dict, today: date = None):
+    """
+    Stored timeline for a profile, recomputed when it was built in an earlier
+    month (open "Present" roles keep growing). None if no caption parses.
+    """
+    today = today or date.today()
+    timeline = profile.get("careerTimeline")
+    if isinstance(timeline, str):
+        try:
+            timeline = json.loads(timeline)
+        except Exception:
+            timeline = None
+
+    if not timeline or timeline.get("as_of") != _month_label(_month_index(today.year, today.month)):
+        timeline = compute_career_timeline(profile.get("experiences"), today)
+
+    return timeline if timeline.get("role_count") else None
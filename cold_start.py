@@ -0,0 +1,56 @@
+"""
+Measure the cold start of the Flask API: a fresh interpreter importing
+saral_ai_api and serving its first /health request.
+
+    python cold_start.py [runs]
+
+Exits non-zero when the median exceeds SARAL_COLD_START_BUDGET_MS.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BUDGET_MS = int(os.getenv("SARAL_COLD_START_BUDGET_MS", "500"))
+
+PROBE = """
+import json, time
+started = time.perf_counter()
+import saral_ai_api
+imported = time.perf_counter()
+saral_ai_api.app.test_client().get('/health')
+served = time.perf_counter()
+print(json.dumps({'import_ms': (imported - started) * 1000, 'first_request_ms': (served - started) * 1000}))
+"""
+
+
+def measure_once():
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    samples = [measure_once() for _ in range(runs)]
+    import_ms = statistics.median(s["import_ms"] for s in samples)
+    first_request_ms = statistics.median(s["first_request_ms"] for s in samples)
+
+    print(f"import saral_ai_api:  {import_ms:.0f}ms (median of {runs})")
+    print(f"first /health served: {first_request_ms:.0f}ms")
+    print(f"budget:               {BUDGET_MS}ms")
+
+    if first_request_ms > BUDGET_MS:
+        print("❌ Cold start is over budget")
+        sys.exit(1)
+    print("✅ Cold start is within budget")
+
+
+if __name__ == "__main__":
+    main()
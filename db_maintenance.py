@@ -0,0 +1,334 @@
+"""
+Schema changes, partitioning and retention for the profiles table (and
+the serp_cache table's retention).
+
+    python db_maintenance.py schema             # columns and tables the app expects (run before deploying)
+    python db_maintenance.py migrate            # one-off: profiles -> monthly range partitions
+    python db_maintenance.py partitions [ahead] # create the next months' partitions (run monthly)
+    python db_maintenance.py archive [--dry-run]
+    python db_maintenance.py status
+
+Lookups only ever read profiles scraped in the last FRESH_PROFILE_DAYS, so
+with profiles partitioned by created_at month they touch the newest one or
+two partitions however large the table grows. Months older than
+SARAL_PROFILE_RETENTION_MONTHS are detached into the profiles_archive
+schema; archived months older than SARAL_PROFILE_ARCHIVE_DROP_MONTHS are
+dropped (0 keeps them forever). `archive` also deletes serp_cache pages
+older than SARAL_SERP_CACHE_HOURS, which no lookup serves any more.
+
+Schema changes run here rather than from the app: ALTER TABLE takes an
+ACCESS EXCLUSIVE lock on profiles, which no request should wait behind,
+and request threads should not commit DDL on connections they share.
+"""
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+from postgres_db import get_connection, FRESH_PROFILE_DAYS, SERP_CACHE_HOURS
+
+
+RETENTION_MONTHS = int(os.getenv("SARAL_PROFILE_RETENTION_MONTHS", "6"))
+ARCHIVE_DROP_MONTHS = int(os.getenv("SARAL_PROFILE_ARCHIVE_DROP_MONTHS", "0"))
+# Keep this many future months created so inserts never land in the default partition
+PARTITIONS_AHEAD = int(os.getenv("SARAL_PROFILE_PARTITIONS_AHEAD", "3"))
+
+ARCHIVE_SCHEMA = "profiles_archive"
+
+# Columns and tables added after the profiles table was first created
+SCHEMA_DDL = (
+    "ALTER TABLE profiles ADD COLUMN IF NOT EXISTS career_timeline JSONB",
+    "ALTER TABLE profiles ADD COLUMN IF NOT EXISTS content_hash TEXT",
+    # Last time a re-scrape found the stored content unchanged; created_at stays the scrape time
+    "ALTER TABLE profiles ADD COLUMN IF NOT EXISTS checked_at TIMESTAMP",
+    """
+    CREATE TABLE IF NOT EXISTS profile_history (
+    id BIGSERIAL PRIMARY KEY,
+    profile_id BIGINT,
+    linkedin_url TEXT NOT NULL,
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    old_hash TEXT,
+    new_hash TEXT,
+    changes JSONB
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS profile_history_linkedin_url_idx
+    ON profile_history (linkedin_url, changed_at DESC)
+    """,
+    # SERP pages shared by every worker process and the cache warmer
+    """
+    CREATE TABLE IF NOT EXISTS serp_cache (
+    query TEXT,
+    start_index INTEGER,
+    results_per_page INTEGER,
+    response JSONB,
+    fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (query, start_index, results_per_page)
+    )
+    """,
+    # LLM profile summaries cached by summary_cache
+    """
+    CREATE TABLE IF NOT EXISTS profile_summaries (
+    cache_key TEXT PRIMARY KEY,
+    linkedin_url TEXT,
+    prompt_version TEXT,
+    summary JSONB,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    # Daily upstream spend persisted by rate_limit.flush_usage
+    """
+    CREATE TABLE IF NOT EXISTS api_usage_daily (
+    day DATE,
+    upstream TEXT,
+    metric TEXT,
+    amount BIGINT DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (day, upstream, metric)
+    )
+    """,
+)
+
+# Indexes on the partitioned parent; Postgres creates the matching index on every partition.
+# Lookups by numeric id use the (id, created_at) primary key.
+PROFILE_INDEXES = {
+    # fetch_from_saral_data and fetch_profile: linkedin_url = ANY(...) newest first
+    "profiles_linkedin_url_created_at_idx": "(linkedin_url, created_at DESC)",
+}
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f"profiles_y{month.year}m{month.month:02d}"
+
+
+def month_of(name):
+    """Month a partition covers, from its name; None for the default partition"""
+    try:
+        return date(int(name[10:14]), int(name[15:17]), 1)
+    except (ValueError, IndexError):
+        return None
+
+
+def is_partitioned(cur):
+    cur.execute("""
+        SELECT 1 FROM pg_partitioned_table pt
+        JOIN pg_class c ON c.oid = pt.partrelid
+        WHERE c.relname = 'profiles' AND c.relnamespace = 'public'::regnamespace
+    """)
+    return cur.fetchone() is not None
+
+
+def attached_partitions(cur):
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'public.profiles'::regclass
+        ORDER BY c.relname
+    """)
+    return [row[0] for row in cur.fetchall()]
+
+
+def create_partition(cur, month):
+    name = partition_name(month)
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} PARTITION OF profiles
+        FOR VALUES FROM (%s) TO (%s)
+    """, (month, add_months(month, 1)))
+    return name
+
+
+def ensure_partitions(cur, ahead=PARTITIONS_AHEAD, since=None):
+    """Partitions from `since` (default: this month) through `ahead` future months"""
+    first = month_start(since or date.today())
+    last = add_months(month_start(date.today()), ahead)
+    names = []
+    month = first
+    while month <= last:
+        names.append(create_partition(cur, month))
+        month = add_months(month, 1)
+    cur.execute("CREATE TABLE IF NOT EXISTS profiles_default PARTITION OF profiles DEFAULT")
+    return names
+
+
+def ensure_indexes(cur):
+    for name, columns in PROFILE_INDEXES.items():
+        cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON profiles {columns}")
+
+
+def apply_schema(conn):
+    """Bring the tables up to what the app expects; every statement is idempotent"""
+    with conn.cursor() as cur:
+        for statement in SCHEMA_DDL:
+            cur.execute(statement)
+    conn.commit()
+    print(f"✓ Schema up to date ({len(SCHEMA_DDL)} statements)")
+
+
+def migrate(conn):
+    """
+    Rebuild profiles as a table range-partitioned by created_at month, in
+    one transaction. The old table is kept as profiles_legacy until it is
+    dropped by hand.
+    """
+    with conn.cursor() as cur:
+        if is_partitioned(cur):
+            print("✓ profiles is already partitioned")
+            return False
+
+        cur.execute("LOCK TABLE profiles IN EXCLUSIVE MODE")
+        cur.execute("SELECT pg_get_serial_sequence('profiles', 'id')")
+        id_sequence = cur.fetchone()[0]
+        cur.execute("SELECT min(created_at), count(*) FROM profiles")
+        oldest, total = cur.fetchone()
+        print(f"🗂️ Partitioning {total} profiles (oldest {oldest or 'n/a'})...")
+
+        # The partition key has to be part of the primary key
+        cur.execute("""
+            CREATE TABLE profiles_partitioned
+            (LIKE profiles INCLUDING DEFAULTS INCLUDING IDENTITY INCLUDING GENERATED)
+            PARTITION BY RANGE (created_at)
+        """)
+        cur.execute("ALTER TABLE profiles_partitioned ALTER COLUMN created_at SET NOT NULL")
+        cur.execute("ALTER TABLE profiles_partitioned ADD PRIMARY KEY (id, created_at)")
+        cur.execute("UPDATE profiles SET created_at = now() WHERE created_at IS NULL")
+
+        cur.execute("ALTER TABLE profiles RENAME TO profiles_legacy")
+        cur.execute("ALTER TABLE profiles_partitioned RENAME TO profiles")
+        ensure_partitions(cur, since=oldest.date() if oldest else None)
+        cur.execute("INSERT INTO profiles OVERRIDING SYSTEM VALUE SELECT * FROM profiles_legacy")
+        # Built after the copy: one sort per partition instead of index maintenance per row
+        ensure_indexes(cur)
+
+        # Keep ids increasing from where the old table stopped
+        cur.execute("SELECT pg_get_serial_sequence('profiles', 'id')")
+        new_sequence = cur.fetchone()[0] or id_sequence
+        if new_sequence:
+            if new_sequence == id_sequence:
+                cur.execute(f"ALTER SEQUENCE {id_sequence} OWNED BY profiles.id")
+            cur.execute("SELECT setval(%s, COALESCE((SELECT max(id) FROM profiles), 0) + 1, false)",
+                        (new_sequence,))
+    conn.commit()
+    print("✓ profiles is now partitioned by month; the old table is kept as profiles_legacy")
+    return True
+
+
+def archive(conn, retention_months=RETENTION_MONTHS, drop_months=ARCHIVE_DROP_MONTHS, dry_run=False):
+    """Detach months past retention into the archive schema; drop archived months past drop_months"""
+    cutoff = add_months(month_start(date.today()), -retention_months)
+    # Never archive anything a freshness lookup can still read
+    cutoff = min(cutoff, month_start(date.fromordinal(date.today().toordinal() - FRESH_PROFILE_DAYS)))
+    detached, dropped = [], []
+
+    with conn.cursor() as cur:
+        if not is_partitioned(cur):
+            print("⚠️ profiles is not partitioned yet - run `python db_maintenance.py migrate` first")
+            return detached, dropped
+
+        for name in attached_partitions(cur):
+            month = month_of(name)
+            if month is None or month >= cutoff:
+                continue
+            detached.append(name)
+            if not dry_run:
+                cur.execute(f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA}")
+                cur.execute(f"ALTER TABLE profiles DETACH PARTITION {name}")
+                cur.execute(f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA}")
+
+        if drop_months > 0:
+            drop_cutoff = add_months(month_start(date.today()), -drop_months)
+            cur.execute("SELECT tablename FROM pg_tables WHERE schemaname = %s", (ARCHIVE_SCHEMA,))
+            for (name,) in cur.fetchall():
+                month = month_of(name)
+                if month is not None and month < drop_cutoff:
+                    dropped.append(name)
+                    if not dry_run:
+                        cur.execute(f"DROP TABLE {ARCHIVE_SCHEMA}.{name}")
+
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    verb = "Would archive" if dry_run else "Archived"
+    print(f"🧹 {verb} {len(detached)} partitions older than {cutoff}: {detached}")
+    if drop_months > 0:
+        print(f"🗑️ {'Would drop' if dry_run else 'Dropped'} {len(dropped)} archived partitions: {dropped}")
+    return detached, dropped
+
+
+def purge_serp_cache(conn, max_age_hours=SERP_CACHE_HOURS, dry_run=False):
+    """Delete serp_cache pages too old to be served; with the cache off (0 hours) nothing is kept"""
+    cutoff = datetime.now() - timedelta(hours=max(0, max_age_hours))
+    with conn.cursor() as cur:
+        if dry_run:
+            cur.execute("SELECT count(*) FROM serp_cache WHERE fetched_at < %s", (cutoff,))
+            purged = cur.fetchone()[0]
+        else:
+            cur.execute("DELETE FROM serp_cache WHERE fetched_at < %s", (cutoff,))
+            purged = cur.rowcount
+    if dry_run:
+        conn.rollback()
+    else:
+        conn.commit()
+    print(f"🧹 {'Would purge' if dry_run else 'Purged'} {purged} SERP pages fetched before {cutoff:%Y-%m-%d %H:%M}")
+    return purged
+
+
+def status(conn):
+    with conn.cursor() as cur:
+        if not is_partitioned(cur):
+            print("profiles is not partitioned")
+            return
+        cur.execute("""
+            SELECT c.relname, c.reltuples::bigint, pg_total_relation_size(c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'public.profiles'::regclass
+            ORDER BY c.relname
+        """)
+        for name, rows, size in cur.fetchall():
+            print(f"{name:<24} ~{max(rows, 0):>10} rows {size / 1024 / 1024:>10.1f} MB")
+    conn.rollback()
+
+
+def main(argv):
+    if not argv or argv[0] not in ("schema", "migrate", "partitions", "archive", "status"):
+        print(__doc__)
+        return 1
+
+    conn = get_connection()
+    try:
+        command = argv[0]
+        if command == "schema":
+            apply_schema(conn)
+        elif command == "migrate":
+            migrate(conn)
+        elif command == "partitions":
+            ahead = int(argv[1]) if len(argv) > 1 else PARTITIONS_AHEAD
+            with conn.cursor() as cur:
+                if not is_partitioned(cur):
+                    print("⚠️ profiles is not partitioned yet - run `python db_maintenance.py migrate` first")
+                    return 1
+                names = ensure_partitions(cur, ahead=ahead)
+                ensure_indexes(cur)
+            conn.commit()
+            print(f"✓ Partitions ready: {', '.join(names)}")
+        elif command == "archive":
+            archive(conn, dry_run="--dry-run" in argv)
+            purge_serp_cache(conn, dry_run="--dry-run" in argv)
+        else:
+            status(conn)
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,62 @@
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+
+# Default time budget for one /search request; the hosting layer kills requests well before a minute
+SEARCH_DEADLINE_MS = int(os.getenv("SARAL_SEARCH_DEADLINE_MS", "25000"))
+# Time kept back from enrichment for scoring, ranking and serialising the response
+SEARCH_DEADLINE_RESERVE = float(os.getenv("SARAL_SEARCH_DEADLINE_RESERVE", "1.5"))
+
+_deadline_at = contextvars.ContextVar("saral_deadline_at", default=None)
+
+
+@contextmanager
+def deadline_scope(seconds):
+    """Give every upstream call made inside the block at most `seconds` in total"""
+    token = _deadline_at.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _deadline_at.reset(token)
+
+
+def remaining():
+    """Seconds left in the current scope, or None when no deadline is set"""
+    deadline_at = _deadline_at.get()
+    if deadline_at is None:
+        return None
+    return max(0.0, deadline_at - time.monotonic())
+
+
+def expired(margin=0.0):
+    left = remaining()
+    return left is not None and left <= margin
+
+
+def bounded_timeout(default):
+    """A per-call timeout that never outlives the current deadline"""
+    left = remaining()
+    if left is None:
+        return default
+    return max(0.1, min(default, left)) if default else max(0.1, left)
+
+
+def statement_timeout_ms():
+    left = remaining()
+    if left is None:
+        return None
+    return max(1, int(left * 1000))
+
+
+@contextmanager
+def locked_within_deadline(lock):
+    """Hold lock, waiting for it no longer than the current deadline allows (TimeoutError otherwise)"""
+    left = remaining()
+    if not lock.acquire(timeout=left if left is not None else -1):
+        raise TimeoutError("lock still held by another worker at the deadline")
+    try:
+        yield
+    finally:
+        lock.release()
@@ -0,0 +1,139 @@
+import os
+
+from SERP import build_dork
+
+
+# Optimistic matches-per-credit assumed for a dork that has not been tried yet.
+# A tried dork keeps being used while it beats this; otherwise the next one is tried.
+UNEXPLORED_PRIOR = 2.0
+MAX_DORKS = 12
+# Google often returns fewer than `num` results while further pages still exist,
+# so a dork is only retired after this many short pages in a row (or an empty one)
+SHORT_PAGES_TO_RETIRE = int(os.getenv("SARAL_DORK_SHORT_PAGES", "2"))
+
+
+class Dork:
+    """One search query in the plan and its observed yield"""
+
+    def __init__(self, label, query, rank):
+        self.label = label
+        self.query = query
+        self.rank = rank
+        self.next_start = 0
+        self.serp_calls = 0
+        self.unique_profiles = 0
+        self.matched = 0
+        self.short_pages = 0  # consecutive pages with fewer than results_per_page results
+        self.exhausted = False
+        self.in_flight = False  # a worker is fetching its next page
+
+    def rate(self):
+        """Matched candidates per SERP credit (optimistic prior until tried)"""
+        if self.serp_calls == 0:
+            return UNEXPLORED_PRIOR - self.rank * 0.01
+        return self.matched / self.serp_calls
+
+    def stats(self):
+        return {
+            "label": self.label,
+            "serp_calls": self.serp_calls,
+            "unique_profiles": self.unique_profiles,
+            "matched": self.matched,
+            "exhausted": self.exhausted,
+        }
+
+
+def plan_dorks(parsed_data):
+    """
+    Narrower dorks for a parsed query, most specific first: per city, then
+    with skills dropped, experience relaxed, and one skill at a time.
+    """
+    job_title = parsed_data.get('job_title')
+    skills = [s for s in (parsed_data.get('skills') or []) if s]
+    experience = parsed_data.get('experience')
+    extras = {
+        'work_preference': parsed_data.get('work_preference'),
+        'job_type': parsed_data.get('job_type'),
+    }
+    loc = parsed_data.get('location')
+    cities = [c for c in (loc if isinstance(loc, list) else [loc]) if c] or [None]
+
+    candidates = []
+    for city in cities:
+        where = f" @ {city}" if city else ""
+        candidates.append((f"full{where}", build_dork(job_title, skills, experience, city, **extras)))
+    for city in cities:
+        where = f" @ {city}" if city else ""
+        if skills:
+            candidates.append((f"no-skills{where}", build_dork(job_title, None, experience, city, **extras)))
+        if experience:
+            candidates.append((f"relaxed-exp{where}", build_dork(job_title, skills[:1], None, city, **extras)))
+    for city in cities:
+        where = f" @ {city}" if city else ""
+        if len(skills) > 1:
+            for skill in skills:
+                candidates.append((f"skill:{skill}{where}", build_dork(job_title, [skill], experience, city, **extras)))
+
+    dorks = []
+    seen = set()
+    for label, query in candidates:
+        if query in seen:
+            continue
+        seen.add(query)
+        dorks.append(Dork(label, query, len(dorks)))
+        if len(dorks) >= MAX_DORKS:
+            break
+    return dorks
+
+
+class DorkPlanner:
+    """
+    Picks which dork to spend the next SERP credit on, based on how many
+    matched candidates each dork has produced per credit so far.
+    """
+
+    def __init__(self, parsed_data, results_per_page=10):
+        self.results_per_page = results_per_page
+        self.dorks = plan_dorks(parsed_data)
+
+    def next_dork(self):
+        """The live dork with the best matches-per-credit, or None when all are exhausted"""
+        live = [d for d in self.dorks if not d.exhausted]
+        if not live:
+            return None
+        return max(live, key=lambda d: (d.rate(), -d.rank))
+
+    def next_dorks(self, count):
+        """Up to count distinct live dorks, best first - one SERP page each can be fetched concurrently"""
+        live = [d for d in self.dorks if not d.exhausted and not d.in_flight]
+        live.sort(key=lambda d: (d.rate(), -d.rank), reverse=True)
+        return live[:count]
+
+    def claim_next_dorks(self, count):
+        """next_dorks, marked in flight so a concurrent worker on the same search picks others"""
+        dorks = self.next_dorks(count)
+        for dork in dorks:
+            dork.in_flight = True
+        return dorks
+
+    def release(self, dork):
+        dork.in_flight = False
+
+    def any_in_flight(self):
+        return any(d.in_flight for d in self.dorks)
+
+    def record(self, dork, result_count, new_unique, matched):
+        """Account one SERP page fetched for dork"""
+        dork.in_flight = False
+        dork.serp_calls += 1
+        dork.next_start += self.results_per_page
+        dork.unique_profiles += new_unique
+        dork.matched += matched
+        dork.short_pages = dork.short_pages + 1 if result_count < self.results_per_page else 0
+        # An empty page or a run of short ones means Google has nothing further for
+        # this dork, and a page of only already-seen profiles means it overlaps the others
+        if result_count == 0 or dork.short_pages >= SHORT_PAGES_TO_RETIRE or new_unique == 0:
+            dork.exhausted = True
+
+    def stats(self):
+        return [d.stats() for d in self.dorks if d.serp_calls]
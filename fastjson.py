@@ -0,0 +1,81 @@
+"""
+One JSON entry point for the API, DB and LLM layers.
+
+Uses orjson when installed, then msgspec, then the standard library. The
+result is the same JSON whichever backend is used; only the speed changes.
+Decode errors are always json.JSONDecodeError.
+"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+BACKEND = "orjson" if orjson is not None else "msgspec" if msgspec is not None else "json"
+
+
+def _fallback_default(obj):
+    """Types the fast encoders do not know: records, sets, decimals, dates"""
+    if hasattr(obj, "to_dict"):
+        return obj.to_dict()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, "isoformat"):
+        return obj.isoformat()
+    return str(obj)
+
+
+def dumpb(obj, *, indent=False, sort_keys=False, default=None) -> bytes:
+    """Serialize to UTF-8 bytes (what Flask and psycopg2 send anyway)"""
+    default = default or _fallback_default
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if default is not _fallback_default:
+            # A caller-supplied default decides how datetimes look (e.g. Flask's HTTP dates)
+            option |= orjson.OPT_PASSTHROUGH_DATETIME
+        return orjson.dumps(obj, default=default, option=option)
+
+    if msgspec is not None:
+        encoder = msgspec.json.Encoder(enc_hook=default, order="sorted" if sort_keys else None)
+        data = encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+
+    return json.dumps(
+        obj,
+        default=default,
+        indent=2 if indent else None,
+        sort_keys=sort_keys,
+        separators=None if indent else (",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+
+def dumps(obj, *, indent=False, sort_keys=False, default=None) -> str:
+    """Compact JSON text (two-space indented with indent=True)"""
+    return dumpb(obj, indent=indent, sort_keys=sort_keys, default=default).decode("utf-8")
+
+
+def loads(data):
+    """Parse JSON from str or bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+
+    if msgspec is not None:
+        try:
+            return msgspec.json.decode(data)
+        except msgspec.DecodeError as e:
+            text = data.decode("utf-8", "replace") if isinstance(data, (bytes, bytearray)) else data
+            raise json.JSONDecodeError(str(e), text, 0) from e
+
+    return json.loads(data)
@@ -0,0 +1,67 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Bodies smaller than this are not worth the CPU or the extra header
+COMPRESS_MIN_BYTES = int(os.getenv("SARAL_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.getenv("SARAL_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("SARAL_BROTLI_QUALITY", "5"))
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/css", "application/javascript")
+
+
+def choose_encoding(accept_encoding):
+    """Best encoding both sides support: br (when brotli is installed), then gzip"""
+    offered = {}
+    for part in (accept_encoding or "").lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        if name:
+            offered[name] = quality
+
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if offered.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress_body(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def compress_response(response, accept_encoding):
+    """
+    Compress a buffered Flask response in place. Streams (SSE), already-encoded
+    and small bodies are left alone.
+    """
+    if response.direct_passthrough or response.is_streamed:
+        return response
+    if response.status_code < 200 or response.status_code >= 300 or "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+
+    response.set_data(compress_body(body, encoding))
+    response.headers["Content-Encoding"] = encoding
+    return response
@@ -0,0 +1,22 @@
+"""
+JSON provider shared by the Flask and Quart apps (Quart uses Flask's
+provider classes), so both serialise responses the same way.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+import fastjson
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() and request bodies through fastjson; the framework's defaults still format dates"""
+
+    def dumps(self, obj, **kwargs):
+        return fastjson.dumps(
+            obj,
+            indent=bool(kwargs.get("indent")),
+            sort_keys=kwargs.get("sort_keys", self.sort_keys),
+            default=kwargs.get("default", self.default),
+        )
+
+    def loads(self, s, **kwargs):
+        return fastjson.loads(s)
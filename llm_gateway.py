@@ -0,0 +1,306 @@
+import asyncio
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from dotenv import load_dotenv
+
+from profile_projection import estimate_tokens
+from rate_limit import acquire_async, record_usage
+from deadline import bounded_timeout
+
+
+load_dotenv()
+
+endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
+api_key = os.getenv("AZURE_OPENAI_API_KEY")
+api_version = os.getenv("AZURE_OPENAI_API_VERSION")
+
+# Completions in flight across the whole process
+LLM_MAX_CONCURRENCY = int(os.getenv("SARAL_LLM_MAX_CONCURRENCY", "8"))
+# Default per-call deadline in seconds (covers queueing, retries and hedges)
+LLM_DEFAULT_DEADLINE = float(os.getenv("SARAL_LLM_DEADLINE", "30"))
+LLM_MAX_RETRIES = int(os.getenv("SARAL_LLM_MAX_RETRIES", "3"))
+# Send a second request when the first one runs past the observed p90 latency
+LLM_HEDGE = os.getenv("SARAL_LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+HEDGE_MIN_SAMPLES = 20
+
+
+def _retryable_errors():
+    # openai is imported on first use; it is the slowest import in the app
+    from openai import RateLimitError, APITimeoutError, APIConnectionError
+    return RateLimitError, APITimeoutError, APIConnectionError
+
+
+def _rate_limit_error():
+    from openai import RateLimitError
+    return RateLimitError
+
+
+def _retry_after_seconds(error, attempt):
+    """Honour Retry-After / retry-after-ms on a 429, else back off exponentially"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    if headers.get("retry-after-ms"):
+        try:
+            return float(headers["retry-after-ms"]) / 1000
+        except ValueError:
+            pass
+    if headers.get("retry-after"):
+        try:
+            return float(headers["retry-after"])
+        except ValueError:
+            pass
+    return min(8.0, 0.5 * 2 ** attempt) + random.random() * 0.25
+
+
+class LLMGateway:
+    """
+    Async gateway to Azure OpenAI.
+
+    Every completion goes through one event loop running on a background
+    thread, so a process-wide semaphore bounds concurrency. Sync callers use
+    complete(); async callers can await acomplete() on the gateway loop.
+    """
+
+    def __init__(self, max_concurrency=LLM_MAX_CONCURRENCY, hedge=LLM_HEDGE):
+        self.max_concurrency = max_concurrency
+        self.hedge = hedge
+        self.available = bool(endpoint and api_key)
+        self._client = None
+        self._loop = None
+        self._semaphore = None
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=200)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is not None:
+                return self._loop
+
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._semaphore = asyncio.Semaphore(self.max_concurrency)
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name="llm-gateway", daemon=True).start()
+            ready.wait()
+            self._loop = loop
+            return loop
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import AsyncAzureOpenAI
+            # Retries are handled here so Retry-After and deadlines are respected
+            self._client = AsyncAzureOpenAI(
+                api_key=api_key, api_version=api_version, azure_endpoint=endpoint, max_retries=0
+            )
+        return self._client
+
+    def p90_latency(self):
+        if len(self._latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[int(len(ordered) * 0.9) - 1]
+
+    async def _attempt(self, request):
+        await acquire_async("llm", api_key)
+        async with self._semaphore:
+            started = time.monotonic()
+            response = await self._get_client().chat.completions.create(**request)
+            self._latencies.append(time.monotonic() - started)
+            return response
+
+    async def _hedged(self, request):
+        """
+        Run one attempt; if it outlives p90, race a second copy against it.
+        Attempts still running when this returns, raises or is cancelled (at
+        the caller's deadline) are cancelled, so they stop holding a slot.
+        """
+        p90 = self.p90_latency() if self.hedge else None
+        first = asyncio.ensure_future(self._attempt(request))
+        attempts = [first]
+        try:
+            if p90 is None:
+                return await first
+
+            done, _ = await asyncio.wait({first}, timeout=p90)
+            if done:
+                return first.result()
+
+            if self._semaphore.locked():
+                # Every slot is busy - a hedge would only queue behind real work
+                return await first
+
+            print(f"⏱️ LLM call past p90 ({p90:.1f}s), sending hedged request")
+            second = asyncio.ensure_future(self._attempt(request))
+            attempts.append(second)
+            pending = {first, second}
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in attempts:
+                if not task.done():
+                    task.cancel()
+
+    async def _with_retries(self, request, deadline_at):
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged(request)
+            except _retryable_errors() as e:
+                attempt += 1
+                wait = _retry_after_seconds(e, attempt) if isinstance(e, _rate_limit_error()) else min(4.0, 0.5 * 2 ** attempt)
+                if attempt > LLM_MAX_RETRIES or time.monotonic() + wait >= deadline_at:
+                    raise
+                print(f"🔁 LLM {type(e).__name__}, retrying in {wait:.1f}s (attempt {attempt})")
+                await asyncio.sleep(wait)
+
+    async def acomplete(self, model, messages, deadline=None, **params):
+        """Chat completion with concurrency limit, deadline, 429 retries and optional hedging"""
+        if not self.available:
+            raise RuntimeError("Azure OpenAI client is not available")
+        deadline = LLM_DEFAULT_DEADLINE if deadline is None else deadline
+        request = {"model": model, "messages": messages, **params}
+        return await asyncio.wait_for(self._with_retries(request, time.monotonic() + deadline), timeout=deadline)
+
+    async def astream(self, model, messages, deadline=None, **params):
+        """Yield completion text deltas as they arrive; 429s are retried before the first token"""
+        if not self.available:
+            raise RuntimeError("Azure OpenAI client is not available")
+        deadline = LLM_DEFAULT_DEADLINE if deadline is None else deadline
+        deadline_at = time.monotonic() + deadline
+
+        await acquire_async("llm", api_key)
+        async with self._semaphore:
+            attempt = 0
+            while True:
+                try:
+                    stream = await asyncio.wait_for(
+                        self._get_client().chat.completions.create(model=model, messages=messages, stream=True, **params),
+                        timeout=max(0.0, deadline_at - time.monotonic()),
+                    )
+                    break
+                except _rate_limit_error() as e:
+                    attempt += 1
+                    wait = _retry_after_seconds(e, attempt)
+                    if attempt > LLM_MAX_RETRIES or time.monotonic() + wait >= deadline_at:
+                        raise
+                    await asyncio.sleep(wait)
+
+            iterator = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(iterator.__anext__(), timeout=max(0.0, deadline_at - time.monotonic()))
+                except StopAsyncIteration:
+                    return
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def stream(self, model, messages, deadline=None, **params):
+        """Blocking generator over astream() for Flask streaming responses"""
+        loop = self._ensure_loop()
+        deadline = bounded_timeout(LLM_DEFAULT_DEADLINE if deadline is None else deadline)
+        pieces = queue.Queue()
+
+        async def pump():
+            try:
+                async for piece in self.astream(model, messages, deadline=deadline, **params):
+                    pieces.put(("token", piece))
+                pieces.put(("done", None))
+            except BaseException as e:
+                pieces.put(("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        streamed = []
+        try:
+            while True:
+                kind, value = pieces.get()
+                if kind == "token":
+                    streamed.append(value)
+                    yield value
+                elif kind == "done":
+                    return
+                else:
+                    raise value
+        finally:
+            # Stops the upstream completion if the client went away mid-stream
+            future.cancel()
+            # Streamed responses carry no usage block, so count what was delivered
+            record_usage("llm", "calls")
+            record_usage("llm", "completion_tokens", estimate_tokens("".join(streamed)))
+
+    def complete(self, model, messages, deadline=None, **params):
+        """Blocking wrapper around acomplete() for the Flask/Streamlit code paths"""
+        loop = self._ensure_loop()
+        # The event loop thread cannot see the caller's request deadline, so resolve it here
+        deadline = bounded_timeout(LLM_DEFAULT_DEADLINE if deadline is None else deadline)
+        future = asyncio.run_coroutine_threadsafe(self.acomplete(model, messages, deadline=deadline, **params), loop)
+        response = future.result()
+        _record_response_usage(response)
+        return response
+
+
+    async def complete_async(self, model, messages, deadline=None, **params):
+        """complete() for code running on another event loop (the ASGI app)"""
+        loop = self._ensure_loop()
+        deadline = bounded_timeout(LLM_DEFAULT_DEADLINE if deadline is None else deadline)
+        future = asyncio.run_coroutine_threadsafe(self.acomplete(model, messages, deadline=deadline, **params), loop)
+        response = await asyncio.wrap_future(future)
+        _record_response_usage(response)
+        return response
+
+    async def stream_async(self, model, messages, deadline=None, **params):
+        """stream() for code running on another event loop (the ASGI app)"""
+        loop = self._ensure_loop()
+        deadline = bounded_timeout(LLM_DEFAULT_DEADLINE if deadline is None else deadline)
+        caller = asyncio.get_running_loop()
+        pieces = asyncio.Queue()
+
+        async def pump():
+            try:
+                async for piece in self.astream(model, messages, deadline=deadline, **params):
+                    caller.call_soon_threadsafe(pieces.put_nowait, ("token", piece))
+                caller.call_soon_threadsafe(pieces.put_nowait, ("done", None))
+            except BaseException as e:
+                caller.call_soon_threadsafe(pieces.put_nowait, ("error", e))
+
+        future = asyncio.run_coroutine_threadsafe(pump(), loop)
+        streamed = []
+        try:
+            while True:
+                kind, value = await pieces.get()
+                if kind == "token":
+                    streamed.append(value)
+                    yield value
+                elif kind == "done":
+                    return
+                else:
+                    raise value
+        finally:
+            future.cancel()
+            record_usage("llm", "calls")
+            record_usage("llm", "completion_tokens", estimate_tokens("".join(streamed)))
+
+
+def _record_response_usage(response):
+    record_usage("llm", "calls")
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record_usage("llm", "prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        record_usage("llm", "completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+
+gateway = LLMGateway()
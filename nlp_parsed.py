@@ -1,10 +1,16 @@
 import re 
 import os
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 import json
-from postgres_db import store_prompt, conn
-from candidates import candidates
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from llm_gateway import gateway
+from query_rules import fast_parse, log_parse_agreement, FASTPATH_THRESHOLD, FASTPATH_SHADOW_RATE
+from career_timeline import career_timeline_for
+from profile_projection import project_profile, compact_dumps, estimate_tokens, projection_report
+from summary_cache import summary_cache_key, get_cached_summary, put_cached_summary
+import fastjson
 
 
 load_dotenv()
@@ -15,63 +21,43 @@ api_key = os.getenv("AZURE_OPENAI_API_KEY")
 api_version = os.getenv("AZURE_OPENAI_API_VERSION")
 deployment = os.getenv("AZURE_OPENAI_DEPLOYMENT")
 
-client = None  # Initialize client as None
-
-try:
-    client = AzureOpenAI(api_key=api_key, api_version=api_version, azure_endpoint=endpoint)
-except Exception as e:
-    print(f"Failed to initialize Azure OpenAI client: {e}")
-    client = None
+# All completions go through the async gateway; client is None when Azure is not configured
+client = gateway if gateway.available else None
+if client is None:
+    print("Azure OpenAI is not configured - using rule-based fallbacks")
     
 
 def parse_recruiter_query(query):
-    """Parse recruiter query using AI to extract structured data"""
-    if not client:
-        # Mock function when Azure OpenAI is not available
-        import re
-        words = query.lower().split()
-        
-        # Extract job title (basic pattern matching)
-        job_title = "Developer"
-        if "python" in words: job_title = "Python Developer"
-        elif "java" in words: job_title = "Java Developer"
-        elif "data" in words: job_title = "Data Scientist"
-        elif "frontend" in words: job_title = "Frontend Developer"
-        elif "backend" in words: job_title = "Backend Developer"
-        
-        # Extract skills
-        skills = []
-        if "python" in words: skills.append("Python")
-        if "java" in words: skills.append("Java")
-        if "javascript" in words: skills.append("JavaScript")
-        if "react" in words: skills.append("React")
-        if "django" in words: skills.append("Django")
-        
-        # Extract experience
-        experience = "2"
-        for i, word in enumerate(words):
-            if word.isdigit() and i+1 < len(words) and ("year" in words[i+1] or "yr" in words[i+1]):
-                experience = word
-                break
-        if "fresher" in words: experience = "fresher"
-        
-        # Extract location
-        location = []
-        indian_cities = ["mumbai", "delhi", "bangalore", "pune", "hyderabad", "chennai", "kolkata", "ahmedabad", "surat", "gurgaon"]
-        for city in indian_cities:
-            if city in words:
-                location.append(city.title())
-        
-        return {
-            "job_title": job_title,
-            "skills": skills,
-            "experience": experience,
-            "location": location,
-            "work_preference": "remote" if "remote" in words else None,
-            "job_type": "full-time" if "full-time" in words else None,
-            "is_indian": True
-        }
+    """
+    Parse recruiter query into structured data.
+
+    Short, formulaic queries are handled by the rule-based fast path; only
+    queries it cannot explain confidently are sent to the LLM.
+    """
+    rule_parsed, confidence = fast_parse(query)
 
+    if not client:
+        # Azure OpenAI is not available - the rule parse is all we have
+        fallback = dict(rule_parsed)
+        fallback["job_title"] = fallback["job_title"] or "Developer"
+        fallback["experience"] = fallback["experience"] or "2"
+        fallback["location"] = fallback["location"] or []
+        fallback.pop("is_valid")
+        return fallback
+
+    if confidence >= FASTPATH_THRESHOLD:
+        print(f"⚡ Fast-path parse (confidence {confidence:.2f})")
+        if random.random() < FASTPATH_SHADOW_RATE:
+            log_parse_agreement(query, rule_parsed, confidence, _llm_parse_recruiter_query(query), accepted=True)
+        return rule_parsed
+
+    llm_parsed = _llm_parse_recruiter_query(query)
+    log_parse_agreement(query, rule_parsed, confidence, llm_parsed, accepted=False)
+    return llm_parsed
+
+
+def _llm_parse_recruiter_query(query):
+    """Parse recruiter query using AI to extract structured data"""
     try:
         system_prompt = """You are an AI assistant that extracts structured recruitment information from natural language queries.
 
@@ -138,7 +124,7 @@ def parse_recruiter_query(query):
         6. Return ONLY valid JSON."""
 
 
-        response = client.chat.completions.create(
+        response = client.complete(
             model=deployment,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -148,7 +134,7 @@ def parse_recruiter_query(query):
             max_tokens=500
         )
 
-        return json.loads(response.choices[0].message.content)
+        return fastjson.loads(response.choices[0].message.content)
 
     except json.JSONDecodeError:
         return {"error": "Invalid JSON returned from AI"}
@@ -157,13 +143,9 @@ def parse_recruiter_query(query):
 
 
 
-def prompt_enhancer(prompt: str) -> str:
-    """Enhance recruiter prompt to be clearer and more structured"""
-    if not client:
-        return prompt  # fallback: return original if Azure client not available
-
-    try:
-        system_prompt = """You are an AI assistant that enhances recruiter job search prompts.
+def _enhancer_messages(prompt: str) -> list:
+    """Chat messages for the prompt enhancer"""
+    system_prompt = """You are an AI assistant that enhances recruiter job search prompts.
         Your goal is to:
         1. Clean up grammar and spelling mistakes.
         2. Expand shorthand into full professional wording.
@@ -172,7 +154,7 @@ def prompt_enhancer(prompt: str) -> str:
         5. Do not copy examples literally — adapt based on the actual input.
         6. Return ONLY the enhanced recruiter prompt as plain text (no JSON)."""
 
-        user_prompt = f"""Rewrite and enhance this recruiter query for clarity:
+    user_prompt = f"""Rewrite and enhance this recruiter query for clarity:
 
         Input: "{prompt}"
 
@@ -186,12 +168,21 @@ def prompt_enhancer(prompt: str) -> str:
         Now enhance this query: "{prompt}"
         """
 
-        response = client.chat.completions.create(
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+
+
+def prompt_enhancer(prompt: str) -> str:
+    """Enhance recruiter prompt to be clearer and more structured"""
+    if not client:
+        return prompt  # fallback: return original if Azure client not available
+
+    try:
+        response = client.complete(
             model=deployment,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
+            messages=_enhancer_messages(prompt),
             temperature=0.5,   # slightly more creative
             max_tokens=200
         )
@@ -202,6 +193,38 @@ def prompt_enhancer(prompt: str) -> str:
     except Exception as e:
         print(f"Error in prompt_enhancer: {e}")
         return prompt  # fallback to original
+
+
+def prompt_enhancer_stream(prompt: str):
+    """
+    Same as prompt_enhancer but yields the enhanced text piece by piece as
+    the model generates it. Errors propagate so the caller can fall back.
+    """
+    if not client:
+        yield prompt
+        return
+
+    yield from client.stream(
+        model=deployment,
+        messages=_enhancer_messages(prompt),
+        temperature=0.5,
+        max_tokens=200
+    )
+
+
+async def prompt_enhancer_stream_async(prompt: str):
+    """prompt_enhancer_stream for the ASGI app"""
+    if not client:
+        yield prompt
+        return
+
+    async for piece in client.stream_async(
+        model=deployment,
+        messages=_enhancer_messages(prompt),
+        temperature=0.5,
+        max_tokens=200
+    ):
+        yield piece
     
 
 
@@ -375,13 +398,7 @@ def calculate_career_stability(professional_experience):
     }
 
 
-def profile_summary(profiles: list, client=None, deployment=None):
-      """
-      Generate structured profile summary and evaluation for multiple candidates.
-      Each profile should be a dict inside the list.
-      """
-      results = []
-      system_prompt = """
+PROFILE_SUMMARY_SYSTEM_PROMPT = """
         You are an expert AI recruiter specializing in comprehensive candidate analysis.
         TASK:
         For each candidate profile JSON, return ONLY a valid JSON object with the following structure:
@@ -427,36 +444,141 @@ def profile_summary(profiles: list, client=None, deployment=None):
         7. "professional_experience" must cover the entire work history with job_title, duration, and company_and_dates format.
         8. "career_stability_overview" will be calculated separately - just provide the professional_experience data.
         9. Return results for multiple candidates as a JSON array of objects.
+        10. Copy each candidate's "linkedinUrl" from the input into its output object unchanged.
         """
-      try:
-        user_prompt = f"""
+
+# Bump whenever PROFILE_SUMMARY_SYSTEM_PROMPT or the prompt payload changes,
+# so cached summaries produced by an older prompt are not served again.
+SUMMARY_PROMPT_VERSION = "v2"
+
+# Batch summarization settings: profiles are packed into chunks whose prompt
+# stays under the token budget, and each chunk is one chat completion.
+SUMMARY_BATCH_TOKEN_BUDGET = int(os.getenv("SUMMARY_BATCH_TOKEN_BUDGET", "6000"))
+SUMMARY_OUTPUT_TOKENS_PER_PROFILE = int(os.getenv("SUMMARY_OUTPUT_TOKENS_PER_PROFILE", "900"))
+SUMMARY_MAX_OUTPUT_TOKENS = 4000
+SUMMARY_MAX_CONCURRENCY = int(os.getenv("SUMMARY_MAX_CONCURRENCY", "4"))
+
+# Shared across requests so a burst of batch calls cannot flood Azure
+_summary_slots = threading.BoundedSemaphore(SUMMARY_MAX_CONCURRENCY)
+
+
+def chunk_profiles_by_tokens(profiles: list, token_budget: int = SUMMARY_BATCH_TOKEN_BUDGET) -> list:
+    """
+    Pack profiles into chunks whose serialized size stays under token_budget.
+    A single profile larger than the budget gets a chunk of its own.
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for profile in profiles:
+        tokens = estimate_tokens(compact_dumps(project_profile(profile)))
+        if current and current_tokens + tokens > token_budget:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(profile)
+        current_tokens += tokens
+
+    if current:
+        chunks.append(current)
+
+    return chunks
+
+
+def _request_profile_summaries(profiles, client, deployment, max_tokens=1500):
+    """Run one summary completion and attach the computed career stability"""
+    if isinstance(profiles, list):
+        projected = [project_profile(p) for p in profiles]
+    else:
+        projected = project_profile(profiles)
+
+    report = projection_report(profiles)
+    print(f"🗜️ Summary prompt payload: {report['raw_tokens']} → {report['projected_tokens']} tokens ({report['saved_pct']}% smaller)")
+
+    user_prompt = f"""
         Candidate profiles JSON list:
-        {json.dumps(profiles, indent=2)}
+        {compact_dumps(projected)}
         Now return ONLY the JSON list as per the defined schema.
         """
-        response = client.chat.completions.create(
-          model=deployment,
-          messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-          ],
-          temperature=0.0,
-          max_tokens=1500
-        )
-        # Parse AI response
-        result = json.loads(response.choices[0].message.content.strip())
-        
-        # If result is a single object, convert to list for processing
-        if isinstance(result, dict):
-            result = [result]
-        
-        # Calculate career stability for each profile
-        for profile_result in result:
-            if 'professional_experience' in profile_result:
-                career_stability = calculate_career_stability(profile_result['professional_experience'])
-                profile_result['career_stability_overview'] = career_stability
-        
-        results = result
+    response = client.complete(
+      model=deployment,
+      messages=[
+        {"role": "system", "content": PROFILE_SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": user_prompt}
+      ],
+      temperature=0.0,
+      max_tokens=max_tokens
+    )
+    # Parse AI response
+    result = fastjson.loads(response.choices[0].message.content.strip())
+
+    # If result is a single object, convert to list for processing
+    if isinstance(result, dict):
+        result = [result]
+
+    # Calculate career stability for each profile
+    for profile_result in result:
+        if 'professional_experience' in profile_result:
+            career_stability = calculate_career_stability(profile_result['professional_experience'])
+            profile_result['career_stability_overview'] = career_stability
+
+    return result
+
+
+def _attach_career_timeline(summary, profile):
+    """
+    Replace the model-derived stability numbers with the deterministic
+    timeline computed from the profile's experience captions.
+    """
+    if not isinstance(summary, dict) or "error" in summary:
+        return summary
+
+    timeline = career_timeline_for(profile)
+    if not timeline:
+        return summary
+
+    summary = dict(summary)
+    summary['career_stability_overview'] = timeline['career_stability_overview']
+    summary['career_timeline'] = {
+        "gaps": timeline["gaps"],
+        "longest_gap_months": timeline["longest_gap_months"],
+        "role_count": timeline["role_count"],
+    }
+    return summary
+
+
+def profile_summary(profiles: list, client=None, deployment=None):
+      """
+      Generate structured profile summary and evaluation for multiple candidates.
+      Each profile should be a dict inside the list.
+      """
+      results = []
+      profile_list = profiles if isinstance(profiles, list) else [profiles]
+      cache_keys = [summary_cache_key(p, SUMMARY_PROMPT_VERSION) for p in profile_list]
+      cached = [get_cached_summary(key) for key in cache_keys]
+      missing = [i for i, summary in enumerate(cached) if summary is None]
+
+      if not missing:
+        print("⚡ Profile summary served from cache")
+        return [_attach_career_timeline(summary, p) for summary, p in zip(cached, profile_list)]
+
+      try:
+        # Only the profiles without a cached summary go to the model
+        if isinstance(profiles, list):
+          request_profiles = [profile_list[i] for i in missing]
+        else:
+          request_profiles = profiles
+        generated = _request_profile_summaries(request_profiles, client, deployment)
+
+        if len(generated) != len(missing):
+          # Cannot line results up with the inputs - return them uncached
+          return generated
+
+        for i, summary in zip(missing, generated):
+          cached[i] = summary
+          put_cached_summary(cache_keys[i], summary, profile_list[i].get("linkedinUrl"), SUMMARY_PROMPT_VERSION)
+        results = [_attach_career_timeline(summary, p) for summary, p in zip(cached, profile_list)]
       except json.JSONDecodeError:
         results = {"error": "Invalid JSON returned from AI"}
       except Exception as e:
@@ -464,3 +586,80 @@ def profile_summary(profiles: list, client=None, deployment=None):
 
       return results
 
+
+def _summarize_chunk(chunk, client, deployment):
+    """Summarize one chunk and map each result back to its linkedinUrl"""
+    urls = [p.get("linkedinUrl") for p in chunk]
+    max_tokens = min(SUMMARY_MAX_OUTPUT_TOKENS, SUMMARY_OUTPUT_TOKENS_PER_PROFILE * len(chunk))
+
+    with _summary_slots:
+        try:
+            result = _request_profile_summaries(chunk, client, deployment, max_tokens=max_tokens)
+        except json.JSONDecodeError:
+            return {url: {"error": "Invalid JSON returned from AI"} for url in urls}
+        except Exception as e:
+            return {url: {"error": f"Unexpected error: {str(e)}"} for url in urls}
+
+    matched = {}
+    for item in result:
+        url = item.get("linkedinUrl") if isinstance(item, dict) else None
+        if url in urls:
+            matched[url] = item
+
+    # The model did not echo the URLs back - fall back to input order
+    if not matched and len(result) == len(chunk):
+        matched = dict(zip(urls, result))
+
+    for url in urls:
+        matched.setdefault(url, {"error": "No summary returned for this profile"})
+
+    return matched
+
+
+def profile_summary_batch(profiles: list, client=None, deployment=None,
+                          token_budget: int = SUMMARY_BATCH_TOKEN_BUDGET,
+                          max_concurrency: int = SUMMARY_MAX_CONCURRENCY):
+    """
+    Summarize many profiles at once.
+
+    Profiles are packed into token-budgeted chunks that run concurrently
+    (bounded by a shared semaphore). Returns a dict keyed by linkedinUrl.
+    """
+    profiles = [p for p in profiles if isinstance(p, dict) and p.get("linkedinUrl")]
+    if not profiles:
+        return {}
+
+    results = {}
+    cache_keys = {}
+    missing = []
+    by_url = {p["linkedinUrl"]: p for p in profiles}
+    for profile in profiles:
+        url = profile["linkedinUrl"]
+        cache_keys[url] = summary_cache_key(profile, SUMMARY_PROMPT_VERSION)
+        summary = get_cached_summary(cache_keys[url])
+        if summary is not None:
+            results[url] = summary
+        else:
+            missing.append(profile)
+
+    if not missing:
+        print(f"⚡ All {len(profiles)} profile summaries served from cache")
+        return {url: _attach_career_timeline(summary, by_url[url]) for url, summary in results.items()}
+
+    if not client:
+        return {"error": "Azure OpenAI client is not available"}
+
+    chunks = chunk_profiles_by_tokens(missing, token_budget)
+    print(f"📦 Summarizing {len(missing)} profiles in {len(chunks)} chunk(s) ({len(results)} cached)")
+
+    generated = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(max_concurrency, len(chunks)))) as executor:
+        futures = [executor.submit(_summarize_chunk, chunk, client, deployment) for chunk in chunks]
+        for future in as_completed(futures):
+            generated.update(future.result())
+
+    for url, summary in generated.items():
+        put_cached_summary(cache_keys[url], summary, url, SUMMARY_PROMPT_VERSION)
+    results.update(generated)
+
+    return {url: _attach_career_timeline(summary, by_url[url]) for url, summary in results.items()}
@@ -0,0 +1,46 @@
+import os
+
+from dotenv import load_dotenv
+from itsdangerous import URLSafeTimedSerializer, BadSignature, SignatureExpired
+
+
+load_dotenv()
+
+
+# Tokens outlive a typical search session but not a working day
+PARSE_TOKEN_MAX_AGE = 60 * 60
+
+# Tokens decide what /search looks for (and the India-only check), so they are
+# only signed with a key the deployment set itself; without one every search re-parses
+PARSE_TOKEN_KEY = os.environ.get("FLASK_SECRET_KEY") or None
+if PARSE_TOKEN_KEY is None:
+    print("⚠️ FLASK_SECRET_KEY is not set - parse tokens are disabled and every search re-parses its query")
+
+
+def _serializer(secret_key):
+    return URLSafeTimedSerializer(secret_key, salt="saral-parse-token")
+
+
+def issue_parse_token(secret_key, query: str, parsed_data: dict):
+    """Sign the structured query so later calls can reuse it without re-parsing; None without a key"""
+    if not secret_key:
+        return None
+    return _serializer(secret_key).dumps({"q": query, "p": parsed_data})
+
+
+def read_parse_token(secret_key, token, query=None):
+    """
+    Return the parsed data carried by a token, or None if the token is missing,
+    tampered with, expired, or was issued for a different query, and always
+    when no key is configured.
+    """
+    if not token or not secret_key:
+        return None
+    try:
+        payload = _serializer(secret_key).loads(token, max_age=PARSE_TOKEN_MAX_AGE)
+    except (BadSignature, SignatureExpired):
+        return None
+
+    if query is not None and payload.get("q") != query:
+        return None
+    return payload.get("p")
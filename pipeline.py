@@ -0,0 +1,641 @@
+"""
+The sourcing flow as one declared graph of stages, shared by the Flask API,
+the Streamlit app and (through AsyncSearchPipeline) the ASGI app:
+
+    parse -> plan -> serp -> db_lookup -> enrich -+-> ingest
+                                                  +-> validate -> score -> rank
+
+serp .. validate repeat, one SERP page at a time, until the search holds
+enough matched candidates. ingest and validate both only need enrich, so
+ingest only queues the scraped profiles for the write-behind writer and
+validation goes ahead without waiting for the database.
+
+Every stage call goes through SearchPipeline.call, which applies the
+stage's concurrency limit and timeout (SARAL_STAGE_<NAME>_CONCURRENCY /
+SARAL_STAGE_<NAME>_TIMEOUT, 0 = unlimited), answers cacheable stages from
+the cache hook and reports each call to the metrics hooks.
+"""
+import asyncio
+import inspect
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+from candidate_record import CandidateRecord
+from deadline import deadline_scope, remaining, expired, locked_within_deadline
+from search_results import add_matches, score_profiles, order_profiles, PROFILES_PER_PAGE
+from search_state import SearchState, search_key, store as search_states
+from summary_cache import LRUCache
+
+
+STAGES = ("parse", "plan", "serp", "db_lookup", "enrich", "ingest", "validate", "score", "rank")
+
+# Stage -> stages whose output it consumes
+GRAPH = {
+    "parse": (),
+    "plan": ("parse",),
+    "serp": ("plan",),
+    "db_lookup": ("serp",),
+    "enrich": ("db_lookup",),
+    "ingest": ("enrich",),
+    "validate": ("enrich",),
+    "score": ("validate",),
+    "rank": ("score",),
+}
+
+# Stages whose result depends only on their arguments
+CACHEABLE = {"parse", "serp"}
+
+DEFAULT_TIMEOUTS = {"parse": 20, "db_lookup": 10, "enrich": 150}
+# Apify runs are the slowest and most expensive upstream call; cap them process-wide
+DEFAULT_CONCURRENCY = {"enrich": 4}
+
+PIPELINE_CACHE_TTL = int(os.getenv("SARAL_PIPELINE_CACHE_TTL", "900"))
+PIPELINE_CACHE_SIZE = int(os.getenv("SARAL_PIPELINE_CACHE_SIZE", "512"))
+
+RAISE = object()
+
+
+def _stage_setting(stage, name, defaults):
+    value = os.getenv(f"SARAL_STAGE_{stage.upper()}_{name}")
+    return float(value) if value else defaults.get(stage, 0)
+
+
+class StageMetrics:
+    """Calls, failures, cache hits and time spent per stage"""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage, seconds, ok=True, cached=False):
+        with self._lock:
+            stats = self._stats.setdefault(
+                stage, {"calls": 0, "errors": 0, "cache_hits": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            stats["calls"] += 1
+            stats["errors"] += 0 if ok else 1
+            stats["cache_hits"] += 1 if cached else 0
+            stats["total_ms"] += seconds * 1000
+            stats["max_ms"] = max(stats["max_ms"], seconds * 1000)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                stage: dict(stats, avg_ms=round(stats["total_ms"] / stats["calls"], 1),
+                            total_ms=round(stats["total_ms"], 1), max_ms=round(stats["max_ms"], 1))
+                for stage, stats in self._stats.items()
+            }
+
+
+metrics = StageMetrics()
+
+
+class StageCache:
+    """In-process cache hook: LRU entries that expire after ttl seconds"""
+
+    def __init__(self, ttl=PIPELINE_CACHE_TTL, capacity=PIPELINE_CACHE_SIZE):
+        self.ttl = ttl
+        self._lru = LRUCache(capacity)
+
+    def get(self, key):
+        entry = self._lru.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[1]
+
+    def put(self, key, value):
+        self._lru.put(key, (time.monotonic() + self.ttl, value))
+
+
+class SharedStageCache(StageCache):
+    """
+    StageCache whose SERP pages are also kept in the serp_cache table, so
+    every worker process - and pages pre-fetched by cache_warmer.py - share
+    them. Misses read the table once; new pages are written behind.
+    """
+
+    def get(self, key):
+        value = super().get(key)
+        if value is None and key[0] == "serp":
+            from postgres_db import read_serp_page
+            value = read_serp_page(*key[1:])
+            if value is not None:
+                super().put(key, value)
+        return value
+
+    def put(self, key, value):
+        super().put(key, value)
+        if key[0] == "serp":
+            from postgres_db import queue_serp_page
+            queue_serp_page(*key[1:], value)
+
+
+def stage_cache(ttl=PIPELINE_CACHE_TTL):
+    """The front ends' cache hook: shared through Postgres unless SARAL_SERP_CACHE_HOURS=0"""
+    try:
+        from postgres_db import SERP_CACHE_HOURS
+    except Exception as e:
+        print(f"⚠️ Shared SERP cache unavailable: {e}")
+        return StageCache(ttl)
+    return SharedStageCache(ttl) if SERP_CACHE_HOURS > 0 else StageCache(ttl)
+
+
+# Default steps import their modules on first use, like the rest of the app
+
+def _parse(query):
+    from nlp_parsed import parse_recruiter_query
+    return parse_recruiter_query(query)
+
+
+def _plan(query, parsed_data, states):
+    from dork_planner import DorkPlanner
+    from serp_yield import YieldController
+    key = search_key(query, parsed_data)
+    return states.get_or_create(
+        key, lambda: SearchState(key, parsed_data, DorkPlanner(parsed_data), YieldController())
+    )
+
+
+def _serp(query, start, results_per_page):
+    from SERP import serp_api_call
+    return serp_api_call(query, start=start, results_per_page=results_per_page)
+
+
+def _db_lookup(organic_results):
+    from postgres_db import fetch_from_saral_data, get_conn
+    return fetch_from_saral_data({'organic_results': organic_results}, get_conn())
+
+
+def _enrich(urls):
+    from apify import apify_call
+    return apify_call({idx: url for idx, url in enumerate(urls, start=1)})
+
+
+def _ingest(candidates):
+    from postgres_db import queue_profiles
+    return queue_profiles(candidates)
+
+
+def _validate(location, candidates):
+    from validate import validate_function
+    return validate_function(location, candidates)
+
+
+DEFAULT_STEPS = {
+    "parse": _parse,
+    "plan": _plan,
+    "serp": _serp,
+    "db_lookup": _db_lookup,
+    "enrich": _enrich,
+    "ingest": _ingest,
+    "validate": _validate,
+    "score": score_profiles,
+    "rank": order_profiles,
+}
+
+
+class SearchPipeline:
+    """
+    Runs the stage graph. `steps` replaces the default function of any
+    stage (a front end's cached parser, a stub in development); `cache` is
+    any object with get(key)/put(key, value); `hooks` are called as
+    hook(stage, seconds, ok, cached) after every stage call.
+    """
+
+    def __init__(self, steps=None, cache=None, hooks=(metrics.record,)):
+        unknown = set(steps or {}) - set(STAGES)
+        if unknown:
+            raise ValueError(f"Unknown pipeline stages: {', '.join(sorted(unknown))}")
+        self.steps = dict(DEFAULT_STEPS, **(steps or {}))
+        self.cache = cache
+        self.hooks = list(hooks)
+        self.timeouts = {stage: _stage_setting(stage, "TIMEOUT", DEFAULT_TIMEOUTS) for stage in STAGES}
+        self._slots = {
+            stage: threading.BoundedSemaphore(int(limit))
+            for stage in STAGES
+            if (limit := _stage_setting(stage, "CONCURRENCY", DEFAULT_CONCURRENCY)) > 0
+        }
+
+    def _report(self, stage, started, ok, cached=False):
+        seconds = time.perf_counter() - started
+        for hook in self.hooks:
+            try:
+                hook(stage, seconds, ok, cached)
+            except Exception as e:
+                print(f"⚠️ Pipeline hook failed: {e}")
+
+    def call(self, stage, *args, fallback=RAISE):
+        """
+        Run one stage. Failures (including waiting too long for a
+        concurrency slot) return `fallback`, or raise when none is given.
+        """
+        return self.call_with_source(stage, *args, fallback=fallback)[0]
+
+    def call_with_source(self, stage, *args, fallback=RAISE):
+        """call(), returning (result, whether it came from the cache)"""
+        started = time.perf_counter()
+        cache_key = (stage,) + args if self.cache is not None and stage in CACHEABLE else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                self._report(stage, started, True, cached=True)
+                return cached, True
+
+        # The stage timeout narrows the request deadline; it never extends it
+        timeout = self.timeouts[stage] or None
+        left = remaining()
+        if left is not None:
+            timeout = min(timeout, left) if timeout else left
+
+        slot = self._slots.get(stage)
+        try:
+            if slot is not None and not slot.acquire(timeout=timeout):
+                raise TimeoutError(f"no free {stage} slot within {timeout:.1f}s")
+            try:
+                if timeout:
+                    with deadline_scope(timeout):
+                        result = self.steps[stage](*args)
+                else:
+                    result = self.steps[stage](*args)
+            finally:
+                if slot is not None:
+                    slot.release()
+        except Exception as e:
+            self._report(stage, started, False)
+            if fallback is RAISE:
+                raise
+            print(f"⚠️ Pipeline stage {stage} failed: {e}")
+            return fallback, False
+
+        self._report(stage, started, True)
+        if cache_key is not None and result is not None:
+            self.cache.put(cache_key, result)
+        return result, False
+
+    def parse(self, query):
+        return self.call("parse", query)
+
+    def plan(self, query, parsed_data, states=search_states):
+        """The shared SearchState of this search, created on its first page"""
+        return self.call("plan", query, parsed_data, states)
+
+    def enrich(self, state, target_candidates, max_credits, should_stop=None):
+        """
+        Run serp -> db_lookup -> enrich -> ingest/validate for a search until
+        its state holds target_candidates matched profiles, the credit budget
+        is spent, or the yield controller gives up. state.lock is only held
+        to read and update the state, never across an upstream call, and is
+        waited for no longer than the current deadline, so a foreground
+        request and a prefetch of the same search each work on their own
+        dork side by side. Returns the SERP credits spent; pages answered
+        from the cache are free.
+        """
+        planner, controller = state.planner, state.controller
+        credits_used = 0
+
+        # Loop through SERP pages until we have enough candidates for current page
+        try:
+            while True:
+                with locked_within_deadline(state.lock):
+                    if (len(state.matched_profiles) >= target_candidates or credits_used >= max_credits
+                            or not controller.should_continue(credits_used)):
+                        break
+                    if should_stop and should_stop():
+                        print("⏹️ Enrichment cancelled")
+                        break
+                    if expired():
+                        print("⏰ Enrichment stopped at the deadline")
+                        break
+
+                    dorks = planner.claim_next_dorks(1)
+                    if not dorks:
+                        if not planner.any_in_flight():
+                            print("⚠️ All search queries exhausted")
+                            break
+                        # The remaining dorks are being fetched by another worker; wait for its page
+                        left = remaining()
+                        state.changed.wait(timeout=min(1.0, left) if left is not None else 1.0)
+                        continue
+                    dork = dorks[0]
+
+                try:
+                    fetched, cached = self._enrich_page(state, dork)
+                finally:
+                    with state.lock:
+                        planner.release(dork)
+                        state.changed.notify_all()
+                if not fetched:
+                    break
+                if not cached:
+                    credits_used += 1
+        except TimeoutError as e:
+            print(f"⏰ Enrichment stopped: {e}")
+
+        return credits_used
+
+    def _enrich_page(self, state, dork):
+        """
+        One SERP page of a claimed dork through db_lookup -> enrich ->
+        ingest/validate. Returns (fetched, cached); fetched is False when
+        the SERP call failed or the deadline ran out before the page
+        arrived, and the dork is then left unrecorded.
+        """
+        from SERP import normalize_profile_link
+
+        planner, controller = state.planner, state.controller
+        print(f"🌐 Calling SERP API ({dork.label}, start={dork.next_start})...")
+        serp_data, cached = self.call_with_source(
+            "serp", dork.query, dork.next_start, planner.results_per_page, fallback=None
+        )
+        if serp_data is None:
+            # Failed or timed out, not exhausted - leave the dork where it is for the continuation
+            if not expired():
+                print(f"⚠️ SERP call failed for {dork.label}; trying it again on the next request")
+            return False, False
+
+        organic_results = serp_data.get('organic_results') or []
+        if not organic_results:
+            print(f"⚠️ No more results for {dork.label}")
+            with locked_within_deadline(state.lock):
+                planner.record(dork, 0, 0, 0)
+                controller.record_page(0, 0)
+            return True, cached
+
+        print(f"✓ SERP data received: {len(organic_results)} results")
+
+        # Drop profiles another dork (or an earlier page) already surfaced
+        fresh_results = []
+        with locked_within_deadline(state.lock):
+            for result in organic_results:
+                link = normalize_profile_link(result.get('link'))
+                if link and link not in state.seen_links:
+                    state.seen_links.add(link)
+                    fresh_results.append(result)
+            if not fresh_results:
+                planner.record(dork, len(organic_results), 0, 0)
+                controller.record_page(0, 0)
+                return True, cached
+
+        # Check database for existing profiles
+        print("🔍 Checking database for existing profiles...")
+        saral_data, remain_urls = self.call(
+            "db_lookup", fresh_results,
+            fallback=([], [normalize_profile_link(r.get('link')) for r in fresh_results])
+        )
+        print(f"✓ Found {len(saral_data)} existing profiles, {len(remain_urls)} new URLs")
+
+        # Fetch new profiles from Apify if needed
+        apify_json = []
+        if remain_urls:
+            print(f"🤖 Fetching {len(remain_urls)} new profiles from Apify...")
+            apify_json = self.call("enrich", list(remain_urls), fallback=[]) or []
+            print(f"✓ Apify returned {len(apify_json)} profiles")
+
+        # Combine all candidates
+        total_candidates = [CandidateRecord.coerce(profile) for profile in saral_data + apify_json if profile]
+        print(f"✓ Total candidates from {dork.label}: {len(total_candidates)}")
+
+        # Only what Apify just scraped; rows read from the table are not written back
+        scraped = [c for c in total_candidates if not c.is_stored]
+        if scraped:
+            print(f"💾 Queueing {len(scraped)} scraped candidates for storage...")
+            self.call("ingest", scraped, fallback=0)
+
+        # Validate and get only matched candidates
+        print("🎯 Validating candidates...")
+        matched_batch, unmatched_batch = self.call("validate", state.parsed_data.get('location'), total_candidates)
+
+        with locked_within_deadline(state.lock):
+            state.unmatched_profiles.extend(unmatched_batch)
+            new_matches = add_matches(state, matched_batch)
+            planner.record(dork, len(organic_results), len(fresh_results), new_matches)
+            controller.record_page(len(fresh_results), new_matches)
+            print(f"✓ Progress: {len(state.matched_profiles)} total matched candidates collected")
+        return True, cached
+
+    def rank(self, state):
+        """Everything the search has matched so far, scored and best first"""
+        with state.lock:
+            matched_profiles = list(state.matched_profiles)
+        scored = self.call("score", state.parsed_data, matched_profiles)
+        return self.call("rank", scored)
+
+    def run(self, query, page, parsed_data=None, should_stop=None, states=search_states):
+        """
+        Whole graph for one page of a query: returns (state, ranked profiles,
+        SERP credits spent). Front ends that need to check the parse before
+        searching call parse/plan/enrich/rank themselves.
+        """
+        if parsed_data is None:
+            parsed_data = self.parse(query)
+        state = self.plan(query, parsed_data, states)
+        credits_used = self.enrich(state, page * PROFILES_PER_PAGE, state.controller.max_credits, should_stop)
+        return state, self.rank(state), credits_used
+
+
+class AsyncSearchPipeline(SearchPipeline):
+    """
+    SearchPipeline for the ASGI app. Steps may be coroutine functions,
+    which are awaited; plain steps run on a worker thread so the event
+    loop never waits on them. The cache hook's get may be a coroutine
+    function too. While a page still needs many candidates, aenrich claims
+    up to `fanout` dorks at once; their fresh links share one db_lookup and
+    one enrich call.
+    """
+
+    def __init__(self, steps=None, cache=None, hooks=(metrics.record,), fanout=3):
+        super().__init__(steps, cache, hooks)
+        self.fanout = max(1, fanout)
+        self._async_slots = {
+            stage: asyncio.Semaphore(int(_stage_setting(stage, "CONCURRENCY", DEFAULT_CONCURRENCY)))
+            for stage in self._slots
+        }
+
+    async def acall(self, stage, *args, fallback=RAISE):
+        return (await self.acall_with_source(stage, *args, fallback=fallback))[0]
+
+    async def acall_with_source(self, stage, *args, fallback=RAISE):
+        """call_with_source() for the event loop"""
+        started = time.perf_counter()
+        cache_key = (stage,) + args if self.cache is not None and stage in CACHEABLE else None
+        if cache_key is not None:
+            cached = self.cache.get(cache_key)
+            if inspect.isawaitable(cached):
+                cached = await cached
+            if cached is not None:
+                self._report(stage, started, True, cached=True)
+                return cached, True
+
+        timeout = self.timeouts[stage] or None
+        left = remaining()
+        if left is not None:
+            timeout = min(timeout, left) if timeout else left
+
+        step = self.steps[stage]
+        slot = self._async_slots.get(stage)
+        try:
+            if slot is not None:
+                try:
+                    await asyncio.wait_for(slot.acquire(), timeout)
+                except asyncio.TimeoutError:
+                    raise TimeoutError(f"no free {stage} slot within {timeout:.1f}s") from None
+            try:
+                # to_thread copies the context, so a thread step sees the stage deadline too
+                with deadline_scope(timeout) if timeout else nullcontext():
+                    pending = step(*args) if inspect.iscoroutinefunction(step) else asyncio.to_thread(step, *args)
+                    result = await asyncio.wait_for(pending, timeout)
+            finally:
+                if slot is not None:
+                    slot.release()
+        except Exception as e:
+            self._report(stage, started, False)
+            if fallback is RAISE:
+                raise
+            print(f"⚠️ Pipeline stage {stage} failed: {e!r}")
+            return fallback, False
+
+        self._report(stage, started, True)
+        if cache_key is not None and result is not None:
+            self.cache.put(cache_key, result)
+        return result, False
+
+    async def aparse(self, query):
+        return await self.acall("parse", query)
+
+    async def aplan(self, query, parsed_data, states=search_states):
+        return await self.acall("plan", query, parsed_data, states)
+
+    async def aenrich(self, state, target_candidates, max_credits, should_stop=None):
+        """
+        enrich() for the event loop, a round of up to `fanout` dorks at a
+        time. state.lock is only held for in-memory reads and updates, never
+        across an await, so prefetch threads and other requests on the same
+        search keep working. Returns the SERP credits spent.
+        """
+        planner, controller = state.planner, state.controller
+        credits_used = 0
+
+        try:
+            while True:
+                with locked_within_deadline(state.lock):
+                    if (len(state.matched_profiles) >= target_candidates or credits_used >= max_credits
+                            or not controller.should_continue(credits_used)):
+                        break
+                    if should_stop and should_stop():
+                        print("⏹️ Enrichment cancelled")
+                        break
+                    if expired():
+                        print("⏰ Enrichment stopped at the deadline")
+                        break
+
+                    needed = target_candidates - len(state.matched_profiles)
+                    width = 1 if needed <= planner.results_per_page // 2 else min(self.fanout, max_credits - credits_used)
+                    dorks = planner.claim_next_dorks(max(1, width))
+                    if not dorks and not planner.any_in_flight():
+                        print("⚠️ All search queries exhausted")
+                        break
+
+                if not dorks:
+                    # The remaining dorks are being fetched by another worker; give it time to record its page
+                    await asyncio.sleep(0.1)
+                    continue
+
+                try:
+                    fetched, live_pages = await self._aenrich_round(state, dorks)
+                finally:
+                    with state.lock:
+                        for dork in dorks:
+                            planner.release(dork)
+                        state.changed.notify_all()
+                credits_used += live_pages
+                if not fetched:
+                    break
+        except TimeoutError as e:
+            print(f"⏰ Enrichment stopped: {e}")
+
+        return credits_used
+
+    async def _aenrich_round(self, state, dorks):
+        """
+        The next SERP page of each claimed dork through db_lookup -> enrich
+        -> ingest/validate. Returns (fetched, SERP pages not served from the
+        cache); fetched is False when no page arrived. Dorks whose SERP call
+        failed are left unrecorded.
+        """
+        from SERP import normalize_profile_link
+
+        planner, controller = state.planner, state.controller
+        print(f"🌐 Calling SERP API for {', '.join(f'{d.label} (start={d.next_start})' for d in dorks)}...")
+        pages = await asyncio.gather(*(
+            self.acall_with_source("serp", d.query, d.next_start, planner.results_per_page, fallback=None)
+            for d in dorks
+        ))
+        # Failed or timed out, not exhausted - those dorks stay where they are for the continuation
+        answered = [(dork, serp_data, cached) for dork, (serp_data, cached) in zip(dorks, pages) if serp_data is not None]
+        if len(answered) < len(dorks) and not expired():
+            print(f"⚠️ SERP call failed for {len(dorks) - len(answered)} of {len(dorks)} dorks")
+        if not answered:
+            return False, 0
+        dorks = [dork for dork, _, _ in answered]
+        live_pages = sum(1 for _, _, cached in answered if not cached)
+
+        # Fresh links across all pages, remembering which dork surfaced each one
+        owners, organic_counts, fresh_counts, fresh_results = {}, {}, {}, []
+        with locked_within_deadline(state.lock):
+            for dork, serp_data, _ in answered:
+                organic_results = serp_data.get('organic_results') or []
+                organic_counts[dork] = len(organic_results)
+                fresh_counts[dork] = 0
+                for result in organic_results:
+                    link = normalize_profile_link(result.get('link'))
+                    if link and link not in state.seen_links:
+                        state.seen_links.add(link)
+                        owners[_profile_slug(link)] = dork
+                        fresh_counts[dork] += 1
+                        fresh_results.append(result)
+
+        total_candidates = []
+        if fresh_results:
+            print(f"🔍 Checking database for {len(fresh_results)} profiles...")
+            saral_data, remain_urls = await self.acall(
+                "db_lookup", fresh_results,
+                fallback=([], [normalize_profile_link(r.get('link')) for r in fresh_results])
+            )
+            apify_json = []
+            if remain_urls:
+                print(f"🤖 Fetching {len(remain_urls)} new profiles from Apify...")
+                apify_json = await self.acall("enrich", list(remain_urls), fallback=[]) or []
+            total_candidates = [CandidateRecord.coerce(profile) for profile in saral_data + apify_json if profile]
+
+            scraped = [c for c in total_candidates if not c.is_stored]
+            if scraped:
+                await self.acall("ingest", scraped, fallback=0)
+
+        matched_batch, unmatched_batch = await self.acall("validate", state.parsed_data.get('location'), total_candidates)
+
+        # Credit each dork with the matches its own links produced
+        matched_by_dork = {dork: [] for dork in dorks}
+        for profile in matched_batch:
+            matched_by_dork[owners.get(_profile_slug(profile.get('linkedinUrl')), dorks[0])].append(profile)
+
+        with locked_within_deadline(state.lock):
+            state.unmatched_profiles.extend(unmatched_batch)
+            for dork in dorks:
+                new_matches = add_matches(state, matched_by_dork[dork])
+                planner.record(dork, organic_counts[dork], fresh_counts[dork], new_matches)
+                controller.record_page(fresh_counts[dork], new_matches)
+            print(f"✓ Progress: {len(state.matched_profiles)} total matched candidates collected")
+        return True, live_pages
+
+    async def arank(self, state):
+        with state.lock:
+            matched_profiles = list(state.matched_profiles)
+        scored = await self.acall("score", state.parsed_data, matched_profiles)
+        return await self.acall("rank", scored)
+
+
+def _profile_slug(url):
+    url = (url or '').rstrip('/')
+    return url.rsplit('/in/', 1)[-1] if '/in/' in url else url
@@ -1,6 +1,20 @@
 import psycopg2
-import json
+import psycopg2.extras
+import hashlib
+import os
+import threading
+import time
 from datetime import datetime, timedelta
+from career_timeline import compute_career_timeline
+from candidate_record import CandidateRecord
+import fastjson
+from deadline import statement_timeout_ms, locked_within_deadline
+from write_behind import WriteBehindQueue
+
+
+# JSON/JSONB columns are decoded by the fast parser as well
+psycopg2.extras.register_default_json(globally=True, loads=fastjson.loads)
+psycopg2.extras.register_default_jsonb(globally=True, loads=fastjson.loads)
 
 
 
@@ -12,8 +26,18 @@ port_id = 5432
 
 
 
+# Fail fast on first use instead of hanging a request on an unreachable database
+DB_CONNECT_TIMEOUT = int(os.getenv("SARAL_DB_CONNECT_TIMEOUT", "5"))
+# After a failed connect, wait this long before trying again
+DB_RETRY_SECONDS = int(os.getenv("SARAL_DB_RETRY_SECONDS", "30"))
+# A stored profile younger than this is served instead of scraping it again
+FRESH_PROFILE_DAYS = int(os.getenv("SARAL_FRESH_PROFILE_DAYS", "30"))
+# SERP pages kept in the serp_cache table are served for this long (0 = no shared SERP cache)
+SERP_CACHE_HOURS = int(os.getenv("SARAL_SERP_CACHE_HOURS", "24"))
+
 conn = None
-cur = None
+_conn_lock = threading.Lock()
+_conn_failed_at = None
 
 
 def get_connection():
@@ -22,105 +46,330 @@ def get_connection():
         dbname=database,
         user=username,
         password=pwd,
-        port=port_id
+        port=port_id,
+        connect_timeout=DB_CONNECT_TIMEOUT
     )
 
-def check_completeness(cur, name, location, linkedin_url, headline, skills, experience):
+
+def get_conn():
+    """
+    Shared connection, opened on first use rather than at import so cold
+    starts do not wait on the database. Returns None while it is unreachable.
+    """
+    global conn, _conn_failed_at
+    if conn is not None and not conn.closed:
+        return conn
+
+    with _conn_lock:
+        if conn is not None and not conn.closed:
+            return conn
+        if _conn_failed_at is not None and time.monotonic() - _conn_failed_at < DB_RETRY_SECONDS:
+            return None
+        try:
+            conn = get_connection()
+            _conn_failed_at = None
+            print("✓ Connected to database")
+        except Exception as error:
+            print(error)
+            conn = None
+            _conn_failed_at = time.monotonic()
+        return conn
+
+_background_conns = {}
+_background_failed_at = {}
+
+
+def get_background_conn(name):
+    """
+    Connection owned by one background writer thread (or one lock holder),
+    so its commits never interleave with queries on the shared request
+    connection. None while the database is unreachable.
+    """
+    connection = _background_conns.get(name)
+    if connection is not None and not connection.closed:
+        return connection
+    failed_at = _background_failed_at.get(name)
+    if failed_at is not None and time.monotonic() - failed_at < DB_RETRY_SECONDS:
+        return None
+    try:
+        connection = get_connection()
+    except Exception as error:
+        print(f"⚠️ {name} connection could not be opened: {error}")
+        _background_failed_at[name] = time.monotonic()
+        return None
+    _background_failed_at.pop(name, None)
+    _background_conns[name] = connection
+    return connection
+
+def check_completeness(name, location, linkedin_url, headline, skills, experience):
+    """(storable, message, is_complete); only a profile without a LinkedIn URL cannot be stored"""
+    if linkedin_url in [None, ""]:
+        return False, "missing linkedin url", False
+
     is_complete = True
     message = "this data is complete"
 
-    required_fields = [name, location, linkedin_url]
+    required_fields = [name, location]
     for field in required_fields:
         if field in [None, "", []]:
             is_complete = False
             message = "missing required fields"
             break
 
-    cur.execute("SELECT id FROM profiles WHERE linkedin_url = %s", (linkedin_url,))
-    existing = cur.fetchone()
-    if existing:
-        return False, "this data is duplicate", False
-
     optional_fields = [headline, skills, experience]
-    for field in optional_fields:
-        if field in [None, "", []]:
-            is_complete = False
-            message = "some optional fields missing"
-            break
+    if is_complete:
+        for field in optional_fields:
+            if field in [None, "", []]:
+                is_complete = False
+                message = "some optional fields missing"
+                break
 
     return True, message, is_complete
 
 
+# Columns that describe the person. profile_pic is left out: it is a signed
+# URL that changes on every scrape without the profile changing.
+CONTENT_FIELDS = ("name", "location", "email", "headline", "skills", "about", "experience")
 
 
+def profile_content_hash(values):
+    """sha256 over the content columns, with skills/experience as decoded lists"""
+    payload = fastjson.dumps({field: values.get(field) for field in CONTENT_FIELDS}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 
+def content_values(p):
+    """Content columns of a prepare_profile() result, in the shape they decode to from the table"""
+    return dict(
+        {field: p[field] for field in CONTENT_FIELDS if field not in ("skills", "experience")},
+        skills=p["skills_list"], experience=p["experience_raw"],
+    )
 
-def data_input(json_data):
-      insert_script = '''
-            INSERT INTO profiles
-            (name, location, email, linkedin_url, headline, skills, about, experience, profile_pic, is_complete, created_at)
-            VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-      '''    
-      with conn.cursor() as cur:
-            for d in json_data:
-                  name = d.get("fullName")
-                  location = d.get("addressWithCountry")
-                  email = d.get("email")
-                  linkedin_url = d.get("linkedinUrl")
-                  headline = d.get("headline")
-                  profile_pic = d.get("profilePic")
-
-                  # Safe parsing of skills
-                  skills_raw = d.get("skills", [])
-                  if isinstance(skills_raw, str):
-                        try:
-                              skills_raw = json.loads(skills_raw)
-                        except:
-                              skills_raw = []
-                  skills_list = [s.get("title") for s in skills_raw if isinstance(s, dict)]
-                  skills = json.dumps(skills_list)
-
-                  # Safe parsing of experiences
-                  experience_raw = d.get("experiences", [])
-                  if isinstance(experience_raw, str):
-                        try:
-                              experience_raw = json.loads(experience_raw)
-                        except:
-                              experience_raw = []
-                  experience = json.dumps(experience_raw)
-
-                  about = d.get("about")
-
-                  success, message, is_complete = check_completeness(
-                        cur, name, location, linkedin_url, headline, skills_list, experience_raw
-                  )
+
+def profile_changes(old, new):
+    """Compact description of what changed between two content_values() dicts"""
+    changes = {}
+    for field in CONTENT_FIELDS:
+        before, after = old.get(field), new.get(field)
+        if fastjson.dumps(before, sort_keys=True) == fastjson.dumps(after, sort_keys=True):
+            continue
+        if field == "skills":
+            before, after = before or [], after or []
+            changes[field] = {"added": [s for s in after if s not in before],
+                              "removed": [s for s in before if s not in after]}
+        elif field == "experience":
+            # Positions are bulky; the history records that they changed, not their text
+            changes[field] = {"from": len(before or []), "to": len(after or [])}
+        else:
+            changes[field] = {"from": before, "to": after}
+    return changes
+
+
+def apply_statement_deadline(cur):
+    """Cap statements in the current transaction at the time left on the request deadline"""
+    timeout_ms = statement_timeout_ms()
+    if timeout_ms is None:
+        return False
+    cur.execute("SET LOCAL statement_timeout = %s", (timeout_ms,))
+    return True
+
+
+def prepare_profile(d):
+      """Column values for one profile; also attaches the precomputed careerTimeline to d"""
+      # Safe parsing of skills
+      skills_raw = d.get("skills", [])
+      if isinstance(skills_raw, str):
+            try:
+                  skills_raw = fastjson.loads(skills_raw)
+            except:
+                  skills_raw = []
+      skills_list = [s.get("title") for s in skills_raw if isinstance(s, dict)]
+
+      # Safe parsing of experiences
+      experience_raw = d.get("experiences", [])
+      if isinstance(experience_raw, str):
+            try:
+                  experience_raw = fastjson.loads(experience_raw)
+            except:
+                  experience_raw = []
+
+      # Precompute the career timeline so summaries never need the LLM for it
+      career_timeline = compute_career_timeline(experience_raw)
+      d["careerTimeline"] = career_timeline
+
+      return {
+            "name": d.get("fullName"),
+            "location": d.get("addressWithCountry"),
+            "email": d.get("email"),
+            "linkedin_url": d.get("linkedinUrl"),
+            "headline": d.get("headline"),
+            "skills": fastjson.dumps(skills_list),
+            "skills_list": skills_list,
+            "about": d.get("about"),
+            "experience": fastjson.dumps(experience_raw),
+            "experience_raw": experience_raw,
+            "profile_pic": d.get("profilePic"),
+            "career_timeline": fastjson.dumps(career_timeline),
+      }
+
+
+def stored_profiles(cur, links):
+      """
+      Newest row per LinkedIn URL inside the freshness window, with its
+      content columns decoded. A stale row is not reused: the new scrape is
+      inserted and the old row ages out with its partition.
+      """
+      fresh_since = datetime.now() - timedelta(days=FRESH_PROFILE_DAYS)
+      cur.execute("""
+            SELECT DISTINCT ON (linkedin_url)
+                   id, created_at, content_hash, linkedin_url, name, location, email, headline, skills, about, experience
+            FROM profiles
+            WHERE linkedin_url = ANY(%s) AND created_at >= %s
+            ORDER BY linkedin_url, created_at DESC
+      """, (list(links), fresh_since))
+      stored = {}
+      for row in cur.fetchall():
+            values = dict(zip(CONTENT_FIELDS, row[4:]))
+            stored[row[3]] = {
+                  "id": row[0],
+                  "created_at": row[1],
+                  "content_hash": row[2] or profile_content_hash(values),
+                  "values": values,
+            }
+      return stored
+
+
+def prepare_for_upsert(json_data):
+      """prepare_profile() results that can be stored, with is_complete and content_hash set"""
+      prepared = {}
+      for d in json_data:
+            p = prepare_profile(d)
+
+            storable, message, is_complete = check_completeness(
+                  p["name"], p["location"], p["linkedin_url"], p["headline"], p["skills_list"], p["experience_raw"]
+            )
+            if not storable:
                   print(message)
-                  
-                  if not is_complete:  
-                        continue 
-
-                  created_at = datetime.now()
-                  cur.execute(
-                        insert_script,
-                        (
-                              name, location, email, linkedin_url, headline,
-                              skills, about, experience, profile_pic, is_complete, created_at
-                        )
-                  )
-                  
+                  continue
+
+            p["is_complete"] = is_complete
+            p["content_values"] = content_values(p)
+            p["content_hash"] = profile_content_hash(p["content_values"])
+            # The same person twice in one batch: the last scrape wins
+            prepared[p["linkedin_url"]] = p
+      return list(prepared.values())
+
+
+def data_input(json_data, conn):
+      """
+      Upsert scraped profiles by LinkedIn URL on conn (the profiles
+      writer's own connection). A profile whose content hash
+      matches the fresh stored row keeps its created_at and only has
+      checked_at and the picture URL refreshed; a changed one is updated in
+      place and the change is recorded in profile_history. Incomplete
+      profiles are stored too, so they are not sent to Apify again until
+      they go stale. Any other database error is raised after the
+      transaction is rolled back, so the connection stays usable for the
+      retry; a broken connection is closed so the writer opens a new one.
+      """
+      prepared = prepare_for_upsert(json_data)
+      counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+      if not prepared:
+            return counts
+
+      with conn.cursor() as cur:
+            try:
+                  apply_statement_deadline(cur)
+                  stored = stored_profiles(cur, [p["linkedin_url"] for p in prepared])
                   conn.commit()
 
-            
+                  for p in prepared:
+                        apply_statement_deadline(cur)
+                        outcome = upsert_profile(cur, p, stored.get(p["linkedin_url"]))
+                        conn.commit()
+                        counts[outcome] += 1
+            except psycopg2.extensions.QueryCanceledError:
+                  print("⏰ Stopped storing profiles: request deadline reached")
+                  conn.rollback()
+            except psycopg2.OperationalError:
+                  conn.close()
+                  raise
+            except Exception:
+                  conn.rollback()
+                  raise
+
+      print(f"💾 Profiles stored: {counts['inserted']} new, {counts['updated']} updated, "
+            f"{counts['unchanged']} unchanged")
+      return counts
+
+
+def upsert_profile(cur, p, row):
+      """Write one prepared profile against its stored row (or None); returns the outcome"""
+      now = datetime.now()
+
+      if row is None:
+            cur.execute("""
+                  INSERT INTO profiles
+                  (name, location, email, linkedin_url, headline, skills, about, experience, profile_pic, is_complete, created_at, checked_at, career_timeline, content_hash)
+                  VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
+            """, (
+                  p["name"], p["location"], p["email"], p["linkedin_url"], p["headline"],
+                  p["skills"], p["about"], p["experience"], p["profile_pic"], p["is_complete"], now, now,
+                  p["career_timeline"], p["content_hash"]
+            ))
+            return "inserted"
+
+      if row["content_hash"] == p["content_hash"]:
+            # Same person, same data: record when it was confirmed (and keep the signed picture URL valid)
+            cur.execute("""
+                  UPDATE profiles SET checked_at = %s, profile_pic = %s, content_hash = %s
+                  WHERE id = %s AND created_at = %s
+            """, (now, p["profile_pic"], p["content_hash"], row["id"], row["created_at"]))
+            return "unchanged"
+
+      cur.execute("""
+            UPDATE profiles SET
+            name = %s, location = %s, email = %s, headline = %s, skills = %s, about = %s, experience = %s,
+            profile_pic = %s, is_complete = %s, created_at = %s, checked_at = %s, career_timeline = %s, content_hash = %s
+            WHERE id = %s AND created_at = %s
+      """, (
+            p["name"], p["location"], p["email"], p["headline"], p["skills"], p["about"], p["experience"],
+            p["profile_pic"], p["is_complete"], now, now, p["career_timeline"], p["content_hash"],
+            row["id"], row["created_at"]
+      ))
+      cur.execute("""
+            INSERT INTO profile_history (profile_id, linkedin_url, changed_at, old_hash, new_hash, changes)
+            VALUES (%s, %s, %s, %s, %s, %s)
+      """, (
+            row["id"], p["linkedin_url"], now, row["content_hash"], p["content_hash"],
+            fastjson.dumps(profile_changes(row["values"], p["content_values"]))
+      ))
+      return "updated"
+
+
+def _write_profile_batch(profiles):
+      connection = get_background_conn("profiles")
+      if connection is None:
+            raise RuntimeError("database unavailable")
+      data_input(profiles, connection)
+
+
+# Scraped profiles are written in the background, batched across requests
+profile_writes = WriteBehindQueue("profiles", _write_profile_batch, key=lambda p: p.get("linkedinUrl"))
+
+
+def queue_profiles(profiles):
+      """Hand scraped profiles to the background writer; rows read from the table are skipped"""
+      scraped = [p for p in profiles if p and not getattr(p, "is_stored", False)]
+      return profile_writes.put_many(scraped) if scraped else 0
+
 
 def fetch_from_saral_data(serp_data, conn):
       if not serp_data or not isinstance(serp_data, dict):
         print("⚠️ fetch_from_saral_data: serp_data is None or not a dict")
         return [], []   # return empty lists safely
   
-      results = []
-      remaining = []
-      one_month_ago = datetime.now() - timedelta(days=30)
+      fresh_since = datetime.now() - timedelta(days=FRESH_PROFILE_DAYS)
 
       serp_json = {}
       for idx, result in enumerate(serp_data.get("organic_results", []), start=1):
@@ -129,122 +378,270 @@ def fetch_from_saral_data(serp_data, conn):
                   clean_link = link.replace("in.linkedin.com", "linkedin.com")
                   serp_json[idx] = clean_link
 
-      # create a fresh cursor
+      if conn is None:
+            print("⚠️ fetch_from_saral_data: database unavailable, treating all links as new")
+            return [], list(serp_json.values())
+
+      # One round trip for the whole page; the created_at bound lets a
+      # partitioned profiles table skip every month older than the window
+      links = list(serp_json.values())
+      rows = []
       with conn.cursor() as cur:
-            for link in serp_json.values():
-                  cur.execute("""
-                        SELECT id, name, location, email, linkedin_url, headline, skills, about, experience, profile_pic, is_complete, created_at
-                        FROM profiles
-                        WHERE linkedin_url = %s AND created_at >= %s
+        try:
+            bounded = apply_statement_deadline(cur)
+            cur.execute("""
+                  SELECT DISTINCT ON (linkedin_url)
+                         id, name, location, email, linkedin_url, headline, skills, about, experience, profile_pic, is_complete, created_at, career_timeline
+                  FROM profiles
+                  WHERE linkedin_url = ANY(%s) AND created_at >= %s
+                  ORDER BY linkedin_url, created_at DESC
+            """, (links, fresh_since))
+            rows = cur.fetchall()
+
+            if bounded:
+                  cur.execute("SET LOCAL statement_timeout TO DEFAULT")
+        except psycopg2.extensions.QueryCanceledError:
+            # Out of time: links we could not look up are treated as not cached
+            print("⏰ Profile lookup cut short by request deadline")
+            conn.rollback()
+        except Exception as e:
+            # Never leave the shared connection in an aborted transaction
+            print("Error looking up profiles:", e)
+            conn.rollback()
+
+      # Incomplete rows are not candidates; they only keep their links from being scraped again
+      found = {row[4]: CandidateRecord.from_db_row(row) for row in rows}
+      results = [found[link] for link in links if link in found and found[link].is_complete is not False]
+      remaining = [link for link in links if link not in found]
+      return results, remaining
 
-                  """, (link, one_month_ago))
 
+def fetch_profile(conn, profile_id):
+      """One stored profile by numeric id or public LinkedIn id, newest first"""
+      if str(profile_id).isdigit():
+            where, params = "id = %s", (int(profile_id),)
+      else:
+            urls = [f"{prefix}/in/{profile_id}{suffix}"
+                    for prefix in ("https://linkedin.com", "https://www.linkedin.com")
+                    for suffix in ("", "/")]
+            where, params = "linkedin_url = ANY(%s)", (urls,)
+
+      try:
+            with conn.cursor() as cur:
+                  cur.execute(f"""
+                        SELECT id, name, location, email, linkedin_url, headline, skills, about, experience, profile_pic, is_complete, created_at, career_timeline
+                        FROM profiles
+                        WHERE {where}
+                        ORDER BY created_at DESC
+                        LIMIT 1
+                  """, params)
                   row = cur.fetchone()
-                  if row:
-                        results.append({
-                              "id": row[0],  # ✅ add id
-                              "fullName": row[1] if row[1] else "Unknown",
-                              "addressWithCountry": row[2] if row[2] else "Unknown",
-                              "email": row[3] if row[3] else "-",
-                              "linkedinUrl": row[4] if row[4] else "-",
-                              "headline": row[5] if row[5] else "-",
-                              "skills": row[6] if row[6] else [],
-                              "about": row[7] if row[7] else "",
-                              "experiences": row[8] if row[8] else [],
-                              "profilePic": row[9] if row[9] else None,
-                              "is_complete": row[10],
-                              "created_at": row[11]
-                        })
-
-
-                  else:
-                        remaining.append(link)
+      except Exception as e:
+            print("Error fetching profile:", e)
+            conn.rollback()
+            return None
+      return CandidateRecord.from_db_row(row) if row else None
+
+
+def insert_prompts(conn, rows, timeout_ms=None):
+    """
+    Bulk insert of (prompt, parsed_json, created_at) rows into saral_prompts.
+    Returns False (rolled back) on any error, including running past timeout_ms.
+    """
+    values = [
+        (
+            prompt,
+            parsed_json.get("job_title"),
+            fastjson.dumps(parsed_json.get("skills")) if parsed_json.get("skills") else None,
+            parsed_json.get("experience"),
+            parsed_json.get("location") or None,
+            parsed_json.get("work_preference"),
+            parsed_json.get("job_type"),
+            created_at,
+            parsed_json.get("is_indian"),
+        )
+        for prompt, parsed_json, created_at in rows
+    ]
+    try:
+        with conn.cursor() as cur:
+            if timeout_ms:
+                cur.execute("SET LOCAL statement_timeout = %s", (int(timeout_ms),))
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO saral_prompts
+                (prompt, job_title, skills, experience, location, work_preference, job_type, created_at, is_indian)
+                VALUES %s
+            """, values, page_size=500)
+        conn.commit()
+        return True
+    except Exception as e:
+        print("Error inserting prompts:", e)
+        conn.rollback()
+        return False
 
-      return results, remaining
 
+def fetch_profile_summary(conn, cache_key: str):
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT summary FROM profile_summaries WHERE cache_key = %s", (cache_key,))
+            row = cur.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        print("Error reading profile summary:", e)
+        conn.rollback()
+        return None
 
-def store_prompt(conn, prompt: str, parsed_json: dict):
-    job_title = parsed_json.get("job_title")
-    skills = parsed_json.get("skills", [])
-    experience = parsed_json.get("experience")
-    location = parsed_json.get("location", [])
-    work_preference = parsed_json.get("work_preference")
-    job_type = parsed_json.get("job_type")
-    is_indian = parsed_json.get("is_indian")
 
+def store_profile_summary(conn, cache_key: str, linkedin_url, prompt_version, summary: dict):
     try:
         with conn.cursor() as cur:
             cur.execute("""
-                INSERT INTO saral_prompts
-                (prompt, job_title, skills, experience, location, work_preference, job_type, created_at,is_indian)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s,%s)
+                INSERT INTO profile_summaries
+                (cache_key, linkedin_url, prompt_version, summary, created_at)
+                VALUES (%s, %s, %s, %s, %s)
+                ON CONFLICT (cache_key) DO NOTHING
             """, (
-                prompt,
-                job_title,
-                json.dumps(skills) if skills else None,   # ensure proper type
-                experience,
-                location if location else None,
-                work_preference,
-                job_type,
-                datetime.now(),
-                is_indian
+                cache_key,
+                linkedin_url,
+                prompt_version,
+                fastjson.dumps(summary),
+                datetime.now()
             ))
         conn.commit()
     except Exception as e:
-        print("Error inserting prompt:", e)
-        conn.rollback()   
+        print("Error storing profile summary:", e)
+        conn.rollback()
+
+
+def add_api_usage(conn, counters: dict):
+    """counters maps (day, upstream, metric) -> amount to add"""
+    try:
+        with conn.cursor() as cur:
+            for (day, upstream, metric), amount in counters.items():
+                cur.execute("""
+                    INSERT INTO api_usage_daily (day, upstream, metric, amount, updated_at)
+                    VALUES (%s, %s, %s, %s, %s)
+                    ON CONFLICT (day, upstream, metric)
+                    DO UPDATE SET amount = api_usage_daily.amount + EXCLUDED.amount,
+                                  updated_at = EXCLUDED.updated_at
+                """, (day, upstream, metric, amount, datetime.now()))
+        conn.commit()
+        return True
+    except Exception as e:
+        print("Error storing API usage:", e)
+        conn.rollback()
+        return False
+
+
+def fetch_api_usage(conn, days: int = 7):
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT day, upstream, metric, amount FROM api_usage_daily
+                WHERE day >= %s ORDER BY day DESC, upstream, metric
+            """, (datetime.now().date() - timedelta(days=days - 1),))
+            rows = cur.fetchall()
+    except Exception as e:
+        print("Error reading API usage:", e)
+        conn.rollback()
+        return None
 
+    usage = {}
+    for day, upstream, metric, amount in rows:
+        usage.setdefault(day.isoformat(), {})[f"{upstream}.{metric}"] = amount
+    return usage
 
 
+def fetch_recent_prompts(conn, days: int = 14, limit: int = 5000):
+    """Parsed fields of the newest logged prompts from the last `days` days, newest first"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT prompt, job_title, skills::text, experience, location, work_preference, job_type,
+                       is_indian, created_at
+                FROM saral_prompts
+                WHERE created_at >= %s
+                ORDER BY created_at DESC
+                LIMIT %s
+            """, (datetime.now() - timedelta(days=days), limit))
+            rows = cur.fetchall()
+        conn.rollback()
+    except Exception as e:
+        print("Error reading prompts:", e)
+        conn.rollback()
+        return None
+    return rows
 
-try:
-      conn = psycopg2.connect(
-            host=hostname, dbname=database, user=username, password=pwd, port=port_id
-      )
 
-      cur = conn.cursor()
+# Cache reads from request and prefetch threads share one connection, one query at a time
+_serp_read_lock = threading.Lock()
 
-      create_script = """
-                  CREATE TABLE IF NOT EXISTS profiles (
-                  id SERIAL PRIMARY KEY,
-                  name TEXT,
-                  location TEXT,
-                  email TEXT,
-                  linkedin_url TEXT,
-                  headline TEXT,
-                  skills JSONB,
-                  about TEXT,
-                  experience JSONB,
-                  profile_pic TEXT,          
-                  is_complete BOOLEAN,
-                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                  );
-            """
-      
-      # cur.execute(create_script)
-            
-      
-      
 
-      conn.commit()
-      
-      
-      
-      
-except Exception as error:
-    print(error)
+def fetch_serp_page(conn, query: str, start: int, results_per_page: int, max_age_hours: int = SERP_CACHE_HOURS):
+    """A SERP response stored within the last max_age_hours, or None"""
+    if conn is None or max_age_hours <= 0:
+        return None
+    try:
+        with conn.cursor() as cur:
+            bounded = apply_statement_deadline(cur)
+            cur.execute("""
+                SELECT response FROM serp_cache
+                WHERE query = %s AND start_index = %s AND results_per_page = %s AND fetched_at >= %s
+            """, (query, start, results_per_page, datetime.now() - timedelta(hours=max_age_hours)))
+            row = cur.fetchone()
+            if bounded:
+                cur.execute("SET LOCAL statement_timeout TO DEFAULT")
+        conn.rollback()
+        return row[0] if row else None
+    except Exception as e:
+        print("Error reading SERP cache:", e)
+        conn.rollback()
+        return None
+
+
+def read_serp_page(query: str, start: int, results_per_page: int):
+    """
+    fetch_serp_page on the connection kept for serp_cache reads, never the
+    shared request connection; a lookup that cannot get it before the
+    deadline is a miss
+    """
+    if SERP_CACHE_HOURS <= 0:
+        return None
+    try:
+        with locked_within_deadline(_serp_read_lock):
+            return fetch_serp_page(get_background_conn("serp_cache_reads"), query, start, results_per_page)
+    except TimeoutError:
+        return None
 
 
-finally:
-#     if cur is not None:
-#         cur.close()
-#     if conn is not None:
-#         conn.close()
-      pass
+def store_serp_pages(conn, pages):
+    """Upsert (query, start, results_per_page, response) rows into serp_cache"""
+    now = datetime.now()
+    try:
+        with conn.cursor() as cur:
+            psycopg2.extras.execute_values(cur, """
+                INSERT INTO serp_cache (query, start_index, results_per_page, response, fetched_at)
+                VALUES %s
+                ON CONFLICT (query, start_index, results_per_page)
+                DO UPDATE SET response = EXCLUDED.response, fetched_at = EXCLUDED.fetched_at
+            """, [(query, start, rpp, fastjson.dumps(response), now) for query, start, rpp, response in pages])
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
 
 
-print('hello')
+def _write_serp_batch(pages):
+    connection = get_background_conn("serp_cache")
+    if connection is None:
+        raise RuntimeError("database unavailable")
+    store_serp_pages(connection, pages)
 
 
+# SERP pages fetched by any process (and the cache warmer) are shared through serp_cache
+serp_page_writes = WriteBehindQueue("serp_cache", _write_serp_batch, key=lambda page: page[:3])
 
 
+def queue_serp_page(query, start, results_per_page, response):
+    """Keep a live SERP response for other processes, without waiting for the database"""
+    if SERP_CACHE_HOURS > 0 and isinstance(response, dict) and "error" not in response:
+        serp_page_writes.put((query, start, results_per_page, response))
@@ -0,0 +1,114 @@
+import fastjson
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Token count of text - exact with tiktoken, ~4 characters per token otherwise"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def compact_dumps(obj) -> str:
+    """Serialize without indentation or padding whitespace"""
+    return fastjson.dumps(obj, default=str)
+
+
+def _as_list(value):
+    """DB rows may hold JSON columns as strings"""
+    if isinstance(value, str):
+        try:
+            value = fastjson.loads(value)
+        except Exception:
+            return []
+    return value if isinstance(value, list) else []
+
+
+def _description_texts(sub_components):
+    """Collect the free-text description lines, skipping insight/link components"""
+    texts = []
+    for sub in sub_components or []:
+        if not isinstance(sub, dict):
+            continue
+        for desc in sub.get("description") or []:
+            if isinstance(desc, dict) and desc.get("type") == "textComponent" and desc.get("text"):
+                texts.append(desc["text"])
+    return texts
+
+
+def _project_entry(entry, company=None):
+    projected = {
+        "title": entry.get("title"),
+        "company": company or entry.get("subtitle"),
+        "dates": entry.get("caption"),
+        "location": entry.get("metadata"),
+        "description": _description_texts(entry.get("subComponents")),
+    }
+    return {k: v for k, v in projected.items() if v}
+
+
+def project_experiences(experiences):
+    """Flatten experiences into title/company/dates rows, expanding grouped roles"""
+    rows = []
+    for exp in _as_list(experiences):
+        if not isinstance(exp, dict):
+            continue
+        roles = [sub for sub in exp.get("subComponents") or [] if isinstance(sub, dict) and sub.get("title")]
+        if exp.get("breakdown") and roles:
+            # Several roles at one company: the parent title is the company name
+            rows.extend(_project_entry(role, company=exp.get("title")) for role in roles)
+        else:
+            rows.append(_project_entry(exp))
+    return [row for row in rows if row]
+
+
+def project_skills(skills):
+    """Apify gives skill dicts, the profiles table stores plain titles"""
+    titles = []
+    for skill in _as_list(skills):
+        title = skill.get("title") if isinstance(skill, dict) else skill
+        if title and title not in titles:
+            titles.append(title)
+    return titles
+
+
+def project_profile(profile: dict) -> dict:
+    """Reduce a raw Apify item or DB row to the fields the summary prompt needs"""
+    educations = [
+        {k: v for k, v in (("school", e.get("title")), ("degree", e.get("subtitle")), ("dates", e.get("caption"))) if v}
+        for e in _as_list(profile.get("educations")) if isinstance(e, dict)
+    ]
+    certifications = [
+        c.get("title") for c in _as_list(profile.get("licenseAndCertificates"))
+        if isinstance(c, dict) and c.get("title")
+    ]
+
+    projected = {
+        "linkedinUrl": profile.get("linkedinUrl"),
+        "fullName": profile.get("fullName"),
+        "headline": profile.get("headline"),
+        "location": profile.get("addressWithCountry"),
+        "about": profile.get("about"),
+        "experiences": project_experiences(profile.get("experiences")),
+        "educations": educations,
+        "skills": project_skills(profile.get("skills")),
+        "certifications": certifications,
+    }
+    return {k: v for k, v in projected.items() if v}
+
+
+def projection_report(profiles) -> dict:
+    """Prompt token counts for the raw pretty-printed payload vs the compact projection"""
+    raw_tokens = estimate_tokens(fastjson.dumps(profiles, indent=True, default=str))
+    projected = [project_profile(p) for p in profiles] if isinstance(profiles, list) else project_profile(profiles)
+    projected_tokens = estimate_tokens(compact_dumps(projected))
+    return {
+        "raw_tokens": raw_tokens,
+        "projected_tokens": projected_tokens,
+        "saved_pct": round(100 * (1 - projected_tokens / raw_tokens), 1) if raw_tokens else 0.0,
+    }
@@ -0,0 +1,129 @@
+"""
+Off-the-request-path logging of recruiter prompts into saral_prompts.
+
+log_prompt() only queues the row. The write-behind writer inserts queued
+prompts in bulk on its own connection. When the database is unreachable
+or slower than PROMPT_LOG_TIMEOUT_MS the batch is appended to a local
+JSON-lines spill file instead, and the spill file is replayed into the
+table after the next successful write.
+
+Delivery is at least once. An insert that commits on the server but whose
+reply never reaches the client (a dropped connection at COMMIT) counts as
+failed, so its rows are spilled and inserted again on replay. saral_prompts
+is an analytics log, where an occasional duplicate row only nudges a
+query's use count in cache_warmer.py, so rows are not deduplicated.
+"""
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import fastjson
+from write_behind import WriteBehindQueue
+
+
+PROMPT_LOG_TIMEOUT_MS = int(os.getenv("SARAL_PROMPT_LOG_TIMEOUT_MS", "2000"))
+PROMPT_LOG_FLUSH_SECONDS = float(os.getenv("SARAL_PROMPT_LOG_FLUSH_SECONDS", "5"))
+PROMPT_SPILL_PATH = os.getenv(
+    "SARAL_PROMPT_SPILL_PATH", os.path.join(tempfile.gettempdir(), "saral_prompts.spill.jsonl")
+)
+# Replay the spill file at most this often, so a flapping database is not hammered
+PROMPT_REPLAY_SECONDS = int(os.getenv("SARAL_PROMPT_REPLAY_SECONDS", "60"))
+REPLAY_CHUNK = 500
+
+_spill_lock = threading.Lock()
+_last_replay = 0.0
+_stats = {"spilled": 0, "replayed": 0}
+
+
+def _insert(rows):
+    import postgres_db
+    conn = postgres_db.get_background_conn("prompts")
+    if conn is None:
+        return False
+    try:
+        return postgres_db.insert_prompts(conn, rows, timeout_ms=PROMPT_LOG_TIMEOUT_MS)
+    except Exception as e:
+        print(f"⚠️ Prompt insert failed: {e}")
+        return False
+
+
+def spill(rows):
+    """Append rows to the local spill file (one JSON object per line)"""
+    lines = "".join(
+        fastjson.dumps({"prompt": prompt, "parsed": parsed, "created_at": created_at.isoformat()}) + "\n"
+        for prompt, parsed, created_at in rows
+    )
+    try:
+        with _spill_lock, open(PROMPT_SPILL_PATH, "a", encoding="utf-8") as f:
+            f.write(lines)
+        _stats["spilled"] += len(rows)
+        print(f"📝 Spilled {len(rows)} prompts to {PROMPT_SPILL_PATH}")
+    except OSError as e:
+        print(f"⚠️ Could not spill {len(rows)} prompts: {e}")
+
+
+def replay_spilled(force=False):
+    """
+    Move spilled prompts into the table; whatever fails stays in the spill
+    file. A chunk whose commit reply was lost is inserted again next time.
+    """
+    global _last_replay
+    if not force and time.monotonic() - _last_replay < PROMPT_REPLAY_SECONDS:
+        return 0
+    _last_replay = time.monotonic()
+
+    # Only the writer thread replays, so a .replaying file here is left over from a crash mid-replay
+    replaying = PROMPT_SPILL_PATH + ".replaying"
+    with _spill_lock:
+        if not os.path.exists(replaying):
+            if not os.path.exists(PROMPT_SPILL_PATH):
+                return 0
+            os.replace(PROMPT_SPILL_PATH, replaying)
+
+    rows = []
+    with open(replaying, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = fastjson.loads(line)
+                rows.append((entry["prompt"], entry["parsed"], datetime.fromisoformat(entry["created_at"])))
+            except (ValueError, KeyError, TypeError):
+                continue  # a torn last line from a crash mid-append
+
+    replayed = 0
+    for start in range(0, len(rows), REPLAY_CHUNK):
+        chunk = rows[start:start + REPLAY_CHUNK]
+        if not _insert(chunk):
+            spill(rows[start:])
+            break
+        replayed += len(chunk)
+    os.remove(replaying)
+
+    _stats["replayed"] += replayed
+    if replayed:
+        print(f"✓ Replayed {replayed} spilled prompts into saral_prompts")
+    return replayed
+
+
+def _write_batch(rows):
+    # Never raises: a batch the database cannot take right now goes to the spill file
+    if _insert(rows):
+        replay_spilled()
+    else:
+        spill(rows)
+
+
+prompt_writes = WriteBehindQueue("prompts", _write_batch, flush_seconds=PROMPT_LOG_FLUSH_SECONDS)
+
+
+def log_prompt(prompt, parsed_json):
+    """Record a recruiter prompt without waiting for the database"""
+    row = (prompt, dict(parsed_json or {}), datetime.now())
+    if not prompt_writes.put(row):
+        spill([row])  # queue full or shutting down: a local append is still cheap
+
+
+def metrics():
+    return dict(_stats, spill_file=PROMPT_SPILL_PATH,
+                spill_bytes=os.path.getsize(PROMPT_SPILL_PATH) if os.path.exists(PROMPT_SPILL_PATH) else 0)
@@ -0,0 +1,321 @@
+import json
+import os
+import re
+from datetime import datetime
+
+
+# Queries whose rule-based parse scores at least this much skip the LLM
+FASTPATH_THRESHOLD = float(os.getenv("SARAL_FASTPATH_THRESHOLD", "0.9"))
+# Fraction of fast-path hits that are also sent to the LLM to measure agreement
+FASTPATH_SHADOW_RATE = float(os.getenv("SARAL_FASTPATH_SHADOW_RATE", "0"))
+# Optional JSON-lines file the agreement records are appended to
+AGREEMENT_LOG = os.getenv("SARAL_PARSE_AGREEMENT_LOG")
+
+
+# Multi-word titles first so "data scientist" wins over a bare "scientist"
+JOB_TITLES = [
+    "machine learning engineer", "full stack developer", "fullstack developer",
+    "frontend developer", "front end developer", "backend developer", "back end developer",
+    "software engineer", "software developer", "web developer", "mobile developer",
+    "devops engineer", "data engineer", "data scientist", "data analyst",
+    "business analyst", "product manager", "project manager", "product designer",
+    "ui ux designer", "ui/ux designer", "ux designer", "ui designer", "graphic designer",
+    "qa engineer", "test engineer", "automation tester", "manual tester",
+    "digital marketing executive", "digital marketer", "seo executive", "content writer",
+    "sales executive", "business development executive", "hr executive", "hr manager",
+    "recruiter", "accountant", "chartered accountant", "cloud engineer", "network engineer",
+    "system administrator", "solution architect", "scrum master",
+]
+
+# role noun (as typed) -> canonical form
+ROLE_NOUNS = {
+    "developer": "Developer", "dev": "Developer", "engineer": "Engineer", "designer": "Designer",
+    "analyst": "Analyst", "scientist": "Scientist", "manager": "Manager", "executive": "Executive",
+    "tester": "Tester", "architect": "Architect", "consultant": "Consultant",
+    "administrator": "Administrator", "specialist": "Specialist", "intern": "Intern", "lead": "Lead",
+}
+
+# lowercase alias -> canonical skill name
+SKILLS = {
+    "python": "Python", "java": "Java", "javascript": "JavaScript", "js": "JavaScript",
+    "typescript": "TypeScript", "react": "React", "reactjs": "React", "react.js": "React", "react js": "React",
+    "react native": "React Native", "angular": "Angular", "vue": "Vue.js", "vue.js": "Vue.js",
+    "node": "Node.js", "nodejs": "Node.js", "node.js": "Node.js", "node js": "Node.js", "node-js": "Node.js",
+    "express": "Express.js",
+    "next.js": "Next.js", "nextjs": "Next.js", "redux": "Redux", "django": "Django",
+    "flask": "Flask", "fastapi": "FastAPI", "spring boot": "Spring Boot", "spring": "Spring",
+    "php": "PHP", "laravel": "Laravel", "wordpress": "WordPress", ".net": ".NET", "c#": "C#",
+    "c++": "C++", "golang": "Go", "rust": "Rust", "kotlin": "Kotlin", "swift": "Swift",
+    "flutter": "Flutter", "dart": "Dart", "android": "Android", "ios": "iOS",
+    "html": "HTML", "css": "CSS", "tailwind": "Tailwind CSS", "bootstrap": "Bootstrap",
+    "sql": "SQL", "mysql": "MySQL", "postgresql": "PostgreSQL", "postgres": "PostgreSQL",
+    "mongodb": "MongoDB", "redis": "Redis", "aws": "AWS", "azure": "Azure", "gcp": "GCP",
+    "docker": "Docker", "kubernetes": "Kubernetes", "terraform": "Terraform", "linux": "Linux",
+    "git": "Git", "jenkins": "Jenkins", "machine learning": "Machine Learning", "ml": "Machine Learning",
+    "deep learning": "Deep Learning", "nlp": "NLP", "tensorflow": "TensorFlow", "pytorch": "PyTorch",
+    "pandas": "Pandas", "numpy": "NumPy", "power bi": "Power BI", "tableau": "Tableau",
+    "excel": "Excel", "selenium": "Selenium", "figma": "Figma", "photoshop": "Photoshop",
+    "illustrator": "Illustrator", "seo": "SEO", "salesforce": "Salesforce", "sap": "SAP",
+}
+
+# lowercase alias -> canonical Indian city
+INDIAN_CITIES = {
+    "mumbai": "Mumbai", "bombay": "Mumbai", "navi mumbai": "Navi Mumbai", "thane": "Thane",
+    "delhi": "Delhi", "new delhi": "Delhi", "ncr": "Delhi", "noida": "Noida",
+    "gurgaon": "Gurgaon", "gurugram": "Gurgaon", "faridabad": "Faridabad", "ghaziabad": "Ghaziabad",
+    "bangalore": "Bangalore", "bengaluru": "Bangalore", "pune": "Pune", "hyderabad": "Hyderabad",
+    "chennai": "Chennai", "kolkata": "Kolkata", "calcutta": "Kolkata", "ahmedabad": "Ahmedabad",
+    "surat": "Surat", "vadodara": "Vadodara", "baroda": "Vadodara", "rajkot": "Rajkot",
+    "gandhinagar": "Gandhinagar", "jaipur": "Jaipur", "indore": "Indore", "bhopal": "Bhopal",
+    "nagpur": "Nagpur", "nashik": "Nashik", "lucknow": "Lucknow", "kanpur": "Kanpur",
+    "chandigarh": "Chandigarh", "mohali": "Mohali", "kochi": "Kochi", "cochin": "Kochi",
+    "trivandrum": "Thiruvananthapuram", "thiruvananthapuram": "Thiruvananthapuram",
+    "coimbatore": "Coimbatore", "madurai": "Madurai", "mysore": "Mysore", "mysuru": "Mysore",
+    "mangalore": "Mangalore", "visakhapatnam": "Visakhapatnam", "vizag": "Visakhapatnam",
+    "vijayawada": "Vijayawada", "bhubaneswar": "Bhubaneswar", "patna": "Patna",
+    "ranchi": "Ranchi", "guwahati": "Guwahati", "dehradun": "Dehradun", "goa": "Goa",
+}
+
+# Only tokens that cannot be an ordinary word: "us" is left out, it is far more often the pronoun
+FOREIGN_LOCATIONS = {
+    "usa", "united states", "uk", "united kingdom", "london", "new york", "california",
+    "canada", "toronto", "dubai", "uae", "singapore", "australia", "sydney", "germany",
+    "berlin", "france", "paris", "netherlands", "amsterdam", "europe",
+}
+
+# Short aliases that also occur as abbreviations or plain words; a title or a
+# rejection that rests on one of them is left for the LLM to confirm
+AMBIGUOUS_ALIASES = {"js", "ml", "uk"}
+AMBIGUOUS_CONFIDENCE = 0.75
+
+WORK_PREFERENCES = {"remote": "remote", "wfh": "remote", "work from home": "remote",
+                    "onsite": "onsite", "on-site": "onsite", "on site": "onsite", "hybrid": "hybrid"}
+
+JOB_TYPES = {"full-time": "full-time", "full time": "full-time", "fulltime": "full-time",
+             "part-time": "part-time", "part time": "part-time", "contract": "contract",
+             "freelance": "contract", "internship": "internship", "intern": "internship"}
+
+FRESHER_TERMS = ["fresher", "freshers", "fresh graduate", "entry level", "entry-level"]
+
+# Words that carry no information of their own and do not lower confidence
+FILLER_WORDS = {
+    "a", "an", "the", "for", "with", "and", "or", "of", "in", "from", "at", "to", "who",
+    "looking", "need", "needed", "hiring", "want", "wanted", "required", "require", "seeking",
+    "we", "are", "is", "i", "candidate", "candidates", "profile", "profiles", "someone",
+    "experience", "experienced", "exp", "year", "years", "yr", "yrs", "based", "location",
+    "role", "job", "position", "skills", "skill", "knowledge", "good", "strong", "having",
+    "senior", "sr", "junior", "jr", "mid", "level", "plus", "minimum", "min", "atleast", "least",
+    "india", "city", "near", "or", "any",
+}
+
+_EXPERIENCE_PATTERNS = [
+    # "2-3 years", "2 to 3 yrs"
+    re.compile(r'(\d+)\s*(?:-|to)\s*(\d+)\s*\+?\s*(?:years?|yrs?)\b'),
+    # "5+ years", "2 years", "2yrs", "3 year"
+    re.compile(r'(\d+)\s*(\+)?\s*(?:years?|yrs?)\b'),
+    # "5+ exp", "3 exp"
+    re.compile(r'(\d+)\s*(\+)?\s*exp\b'),
+    # "exp 3", "experience of 4"
+    re.compile(r'\b(?:exp|experience)\s*(?:of\s*)?(\d+)\s*(\+)?'),
+]
+
+
+def _find_phrases(text, lexicon):
+    """Match lexicon phrases on word boundaries, longest first, without overlaps"""
+    found = []
+    taken = []
+    for phrase in sorted(lexicon, key=len, reverse=True):
+        pattern = r'(?<![\w.+#])' + re.escape(phrase) + r'(?![\w+#])'
+        for m in re.finditer(pattern, text):
+            if any(m.start() < end and start < m.end() for start, end in taken):
+                continue
+            taken.append((m.start(), m.end()))
+            found.append((m.start(), phrase))
+    found.sort()
+    return [phrase for _, phrase in found], taken
+
+
+def _extract_experience(text):
+    for term in FRESHER_TERMS:
+        m = re.search(r'\b' + re.escape(term) + r'\b', text)
+        if m:
+            return "fresher", [(m.start(), m.end())]
+
+    for pattern in _EXPERIENCE_PATTERNS:
+        m = pattern.search(text)
+        if not m:
+            continue
+        groups = m.groups()
+        if pattern is _EXPERIENCE_PATTERNS[0]:
+            value = f"{groups[0]}-{groups[1]}"
+        else:
+            value = groups[0] + ("+" if groups[1] else "")
+        return value, [(m.start(), m.end())]
+
+    return None, []
+
+
+def _title_case(phrase):
+    return " ".join(w.upper() if w in ("ui", "ux", "ui/ux", "qa", "hr", "seo") else w.capitalize()
+                    for w in phrase.split())
+
+
+def _extract_job_title(text, skill_phrases):
+    """(title, spans, skill alias the title was built from or None)"""
+    titles, spans = _find_phrases(text, JOB_TITLES)
+    if titles:
+        title, (start, end) = _title_case(titles[0]), spans[0]
+        # Keep a technology qualifier in front of the title: "react frontend developer"
+        for alias in sorted(skill_phrases, key=len, reverse=True):
+            prefix = alias + " "
+            if text[:start].endswith(prefix):
+                return f"{SKILLS[alias]} {title}", [(start - len(prefix), end)], alias
+        return title, [(start, end)], None
+
+    # "<skill> <role noun>", e.g. "react developer", "node.js engineer"
+    for alias in sorted(skill_phrases, key=len, reverse=True):
+        m = re.search(r'(?<![\w.+#])' + re.escape(alias) + r'\s+(' + "|".join(ROLE_NOUNS) + r')\b', text)
+        if m:
+            return f"{SKILLS[alias]} {ROLE_NOUNS[m.group(1)]}", [(m.start(), m.end())], alias
+
+    return None, [], None
+
+
+def fast_parse(query: str):
+    """
+    Deterministic parse of a recruiter query.
+
+    Returns (parsed, confidence). parsed has the same keys as the LLM parser;
+    confidence in [0, 1] reflects how much of the query the lexicons explained.
+    """
+    text = " " + query.lower().strip() + " "
+    text = re.sub(r'\s+', ' ', text.replace(",", " , "))
+
+    skill_aliases, skill_spans = _find_phrases(text, SKILLS)
+    job_title, title_spans, title_alias = _extract_job_title(text, skill_aliases)
+    experience, exp_spans = _extract_experience(text)
+    cities, city_spans = _find_phrases(text, INDIAN_CITIES)
+    foreign, foreign_spans = _find_phrases(text, FOREIGN_LOCATIONS)
+    work_prefs, wp_spans = _find_phrases(text, WORK_PREFERENCES)
+    job_types, jt_spans = _find_phrases(text, JOB_TYPES)
+
+    skills = []
+    for alias in skill_aliases:
+        if SKILLS[alias] not in skills:
+            skills.append(SKILLS[alias])
+
+    location = []
+    for alias in cities:
+        if INDIAN_CITIES[alias] not in location:
+            location.append(INDIAN_CITIES[alias])
+
+    parsed = {
+        "job_title": job_title,
+        "skills": skills,
+        "experience": experience,
+        "location": location or None,
+        "work_preference": WORK_PREFERENCES[work_prefs[0]] if work_prefs else None,
+        "job_type": JOB_TYPES[job_types[0]] if job_types else None,
+        "is_indian": not (foreign and not location),
+        "is_valid": job_title is not None,
+    }
+
+    if not job_title:
+        return parsed, 0.0
+
+    # Coverage: share of informative words explained by some extracted entity
+    covered = skill_spans + title_spans + exp_spans + city_spans + foreign_spans + wp_spans + jt_spans
+    informative = 0
+    explained = 0
+    for m in re.finditer(r"[a-z0-9][a-z0-9.+#/-]*", text):
+        word = m.group(0).strip(".")
+        if word in FILLER_WORDS or word.isdigit() and any(s <= m.start() < e for s, e in exp_spans):
+            continue
+        informative += 1
+        if any(s <= m.start() < e for s, e in covered):
+            explained += 1
+
+    coverage = explained / informative if informative else 1.0
+    confidence = round(0.4 + 0.6 * coverage, 3)
+
+    rejected_on_ambiguous = not parsed["is_indian"] and all(f in AMBIGUOUS_ALIASES for f in foreign)
+    if title_alias in AMBIGUOUS_ALIASES or rejected_on_ambiguous:
+        confidence = min(confidence, AMBIGUOUS_CONFIDENCE)
+    return parsed, confidence
+
+
+def _norm(value):
+    if isinstance(value, list):
+        return sorted(str(v).strip().lower() for v in value if v)
+    if value in (None, "", []):
+        return None
+    return str(value).strip().lower()
+
+
+def parse_agreement(rule_parsed: dict, llm_parsed: dict) -> dict:
+    """Field-by-field agreement between the rule parse and the LLM parse"""
+    fields = ["job_title", "skills", "experience", "location", "work_preference", "job_type", "is_indian"]
+    return {f: _norm(rule_parsed.get(f)) == _norm(llm_parsed.get(f)) for f in fields}
+
+
+def log_parse_agreement(query: str, rule_parsed: dict, confidence: float, llm_parsed: dict, accepted: bool):
+    """Record how the rule parse compared to the LLM so the threshold can be tuned"""
+    if not isinstance(llm_parsed, dict) or "error" in llm_parsed:
+        return
+
+    agreement = parse_agreement(rule_parsed, llm_parsed)
+    score = sum(agreement.values()) / len(agreement)
+    print(f"📐 Fast-path agreement {score:.2f} at confidence {confidence:.2f} "
+          f"({'accepted' if accepted else 'escalated'})")
+
+    if not AGREEMENT_LOG:
+        return
+
+    record = {
+        "ts": datetime.now().isoformat(),
+        "query": query,
+        "confidence": confidence,
+        "accepted": accepted,
+        "agreement": agreement,
+        "score": score,
+        "rule": rule_parsed,
+        "llm": llm_parsed,
+    }
+    try:
+        with open(AGREEMENT_LOG, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+    except Exception as e:
+        print(f"Could not write parse agreement log: {e}")
+
+
+# Queries the fast path once got wrong: (query, expected fields, must it escalate to the LLM)
+REGRESSION_CASES = [
+    # "us" is the pronoun here, not a country: never an "India only" rejection
+    ("python developer for us, 3 years", {"is_indian": True, "job_title": "Python Developer"}, False),
+    ("node js developer 2 yrs ahmedabad",
+     {"job_title": "Node.js Developer", "skills": ["Node.js"], "location": ["Ahmedabad"]}, False),
+    ("nodejs developer pune", {"job_title": "Node.js Developer"}, False),
+    ("js developer pune", {"job_title": "JavaScript Developer"}, True),
+    ("python developer in uk", {"is_indian": False}, True),
+]
+
+
+def check_regressions():
+    """Run REGRESSION_CASES; returns the list of failure messages"""
+    failures = []
+    for query, expected, escalates in REGRESSION_CASES:
+        parsed, confidence = fast_parse(query)
+        for field, value in expected.items():
+            if parsed.get(field) != value:
+                failures.append(f"{query!r}: {field} = {parsed.get(field)!r}, expected {value!r}")
+        if escalates and confidence >= FASTPATH_THRESHOLD:
+            failures.append(f"{query!r}: confidence {confidence} would skip the LLM")
+    return failures
+
+
+if __name__ == "__main__":
+    failures = check_regressions()
+    for failure in failures:
+        print(f"✗ {failure}")
+    print(f"{'✗' if failures else '✓'} {len(REGRESSION_CASES)} parse regression cases, {len(failures)} failures")
+    raise SystemExit(1 if failures else 0)
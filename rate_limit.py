@@ -0,0 +1,220 @@
+import asyncio
+import atexit
+import contextvars
+import hashlib
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import date
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call would have to wait longer than its timeout for a token"""
+
+
+# upstream -> (tokens per second, burst capacity); override with SARAL_RATE_<UPSTREAM>="rate,burst"
+DEFAULT_LIMITS = {
+    "serp": (1.0, 5),
+    "apify": (0.5, 2),
+    "llm": (5.0, 10),
+}
+USAGE_FLUSH_SECONDS = int(os.getenv("SARAL_USAGE_FLUSH_SECONDS", "30"))
+RECENT_REQUESTS = 200
+
+
+def _limits_for(upstream):
+    override = os.getenv(f"SARAL_RATE_{upstream.upper()}")
+    if override:
+        try:
+            rate, burst = override.split(",")
+            return float(rate), int(burst)
+        except ValueError:
+            print(f"Ignoring malformed SARAL_RATE_{upstream.upper()}={override!r}")
+    return DEFAULT_LIMITS.get(upstream, (1.0, 1))
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Callers reserve tokens up front and then sleep
+    for the returned wait, so waiters are served in arrival order.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, tokens=1, timeout=None):
+        """Take tokens (possibly going into debt) and return how long to wait before using them"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (tokens - self._tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                raise RateLimitExceeded(f"rate limit wait {wait:.1f}s exceeds {timeout:.1f}s")
+            self._tokens -= tokens
+            return wait
+
+    def acquire(self, tokens=1, timeout=None):
+        wait = self.reserve(tokens, timeout)
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1, timeout=None):
+        wait = self.reserve(tokens, timeout)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def state(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {"rate": self.rate, "capacity": self.capacity, "available": round(self._tokens, 2)}
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def _key_id(api_key):
+    return hashlib.sha1((api_key or "").encode("utf-8")).hexdigest()[:8]
+
+
+def bucket_for(upstream, api_key=None):
+    """Token bucket for one upstream and API key (keys are never stored in clear)"""
+    key = (upstream, _key_id(api_key))
+    with _buckets_lock:
+        if key not in _buckets:
+            _buckets[key] = TokenBucket(*_limits_for(upstream))
+        return _buckets[key]
+
+
+def acquire(upstream, api_key=None, tokens=1, timeout=None):
+    bucket_for(upstream, api_key).acquire(tokens, timeout)
+
+
+async def acquire_async(upstream, api_key=None, tokens=1, timeout=None):
+    await bucket_for(upstream, api_key).acquire_async(tokens, timeout)
+
+
+# ---- quota accounting -------------------------------------------------------
+
+_request_usage = contextvars.ContextVar("saral_request_usage", default=None)
+_daily = defaultdict(int)      # (day, upstream, metric) -> amount, not yet persisted
+_daily_total = defaultdict(int)  # (day, upstream, metric) -> amount seen by this process
+_recent_requests = deque(maxlen=RECENT_REQUESTS)
+_usage_lock = threading.Lock()
+# One flush at a time, so the usage connection is only ever used by one thread
+_flush_lock = threading.Lock()
+_flusher_started = False
+
+
+def begin_request(label):
+    """Start collecting usage for the current request"""
+    usage = {"label": label, "started": time.time(), "usage": defaultdict(int)}
+    _request_usage.set(usage)
+    return usage
+
+
+def end_request():
+    """Finish the current request's usage record and return its counters"""
+    usage = _request_usage.get()
+    if usage is None:
+        return {}
+    _request_usage.set(None)
+    counters = dict(usage["usage"])
+    if counters:
+        with _usage_lock:
+            _recent_requests.append({
+                "label": usage["label"],
+                "started": usage["started"],
+                "duration_ms": int((time.time() - usage["started"]) * 1000),
+                "usage": counters,
+            })
+    return counters
+
+
+def record_usage(upstream, metric, amount=1):
+    """Count spend against the current request and today's persistent totals"""
+    if not amount:
+        return
+    key = (date.today().isoformat(), upstream, metric)
+    with _usage_lock:
+        _daily[key] += amount
+        _daily_total[key] += amount
+    usage = _request_usage.get()
+    if usage is not None:
+        usage["usage"][f"{upstream}.{metric}"] += amount
+    _ensure_flusher()
+
+
+def flush_usage():
+    """
+    Persist pending daily counters on the usage connection, never the
+    shared request one; they are kept for the next flush if the DB is
+    unavailable
+    """
+    with _flush_lock:
+        with _usage_lock:
+            pending = dict(_daily)
+            _daily.clear()
+        if not pending:
+            return True
+
+        try:
+            import postgres_db
+            conn = postgres_db.get_background_conn("usage")
+            if conn is not None and postgres_db.add_api_usage(conn, pending):
+                return True
+        except Exception as e:
+            print(f"⚠️ Could not persist API usage: {e}")
+
+    with _usage_lock:
+        for key, amount in pending.items():
+            _daily[key] += amount
+    return False
+
+
+def _ensure_flusher():
+    global _flusher_started
+    if _flusher_started:
+        return
+    with _usage_lock:
+        if _flusher_started:
+            return
+        _flusher_started = True
+
+    def run():
+        while True:
+            time.sleep(USAGE_FLUSH_SECONDS)
+            try:
+                flush_usage()
+            except Exception as e:
+                print(f"⚠️ Usage flush failed: {e}")
+
+    threading.Thread(target=run, name="usage-flusher", daemon=True).start()
+    atexit.register(flush_usage)
+
+
+def usage_snapshot():
+    """Process-local view for the admin endpoint: buckets, today's counters, recent requests"""
+    with _buckets_lock:
+        buckets = {f"{upstream}:{key_id}": b.state() for (upstream, key_id), b in _buckets.items()}
+    with _usage_lock:
+        process_totals = defaultdict(dict)
+        for (day, upstream, metric), amount in _daily_total.items():
+            process_totals[day][f"{upstream}.{metric}"] = amount
+        recent = list(_recent_requests)[-50:]
+        pending = sum(_daily.values())
+    return {
+        "buckets": buckets,
+        "process_totals": dict(process_totals),
+        "pending_flush": pending,
+        "recent_requests": recent,
+    }
@@ -5,14 +5,51 @@ from dotenv import load_dotenv
 from openai import AzureOpenAI
 import json
 from nlp_parsed import parse_recruiter_query,prompt_enhancer
-from SERP import query_making, serp_api_call
-from apify import apify_call
-from validate import validate_function, score_candidates
-from postgres_db import fetch_from_saral_data, check_completeness, data_input, cur, conn, store_prompt
+from prompt_log import log_prompt
+from pipeline import SearchPipeline, stage_cache
+from search_results import PROFILES_PER_PAGE
 
 
 st.set_page_config(page_title="LinkedIn Recruiter Assistant", page_icon="🎯")
 
+# How long a parsed query / searched page is reused before the upstream APIs are asked again
+CACHE_TTL = int(os.getenv("SARAL_STREAMLIT_CACHE_TTL", "900"))
+# Parse while typing (one LLM call per edit) instead of only when Enter is pressed
+LIVE_PARSE = os.getenv("SARAL_STREAMLIT_LIVE_PARSE", "false").lower() in ("1", "true", "yes")
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def cached_parse(query):
+    return parse_recruiter_query(query)
+
+
+@st.cache_data(ttl=CACHE_TTL, show_spinner=False)
+def cached_enhance(query):
+    return prompt_enhancer(query)
+
+
+@st.cache_resource
+def get_pipeline():
+    # One pipeline (and its ingest workers and SERP cache) per server, not per rerun
+    return SearchPipeline(steps={'parse': cached_parse}, cache=stage_cache(ttl=CACHE_TTL))
+
+
+# cache_resource rather than cache_data: candidate records lazily load their raw
+# Apify payload and are not picklable. A page is shared read-only across sessions.
+@st.cache_resource(ttl=CACHE_TTL, max_entries=200, show_spinner=False)
+def search_page(user_input, page):
+    """Matched (scored) candidates for one page of a query, and the candidates rejected so far"""
+    parsed_data = cached_parse(user_input)
+    state, ranked, _ = get_pipeline().run(user_input, page + 1, parsed_data)
+    start = page * PROFILES_PER_PAGE
+    return ranked[start:start + PROFILES_PER_PAGE], list(state.unmatched_profiles)
+
+
+def go_to_page(page):
+    # Runs before the rerun, so the search below already sees the new page
+    st.session_state.current_page = max(0, page)
+    st.session_state.run_search = True
+
 
 if "parsed_data" not in st.session_state:
     st.session_state.parsed_data = {}
@@ -38,6 +75,10 @@ if "run_search" not in st.session_state:
     
 if "user_input" not in st.session_state:
     st.session_state.user_input = ""
+if "parsed_query" not in st.session_state:
+    st.session_state.parsed_query = None
+if "stored_prompt" not in st.session_state:
+    st.session_state.stored_prompt = None
     
 
 st.header("Saral AI")
@@ -50,16 +91,25 @@ user_input = st.text_area(
 )
 
 
+if user_input != st.session_state.user_input:
+    # Edited query: results and stored prompt belong to the old text
+    st.session_state.run_search = False
+    st.session_state.matched_results = []
+    st.session_state.unmatched_results = []
 st.session_state.user_input = user_input
 
+live_parse = st.toggle("Live query preview", value=LIVE_PARSE)
 
-# Show query parsing immediately (live preview)
-if user_input.strip():
-    parsed_data = parse_recruiter_query(user_input)   
-    
-    
+
+# Show query parsing immediately (live preview), otherwise once Enter has been pressed for this text
+if user_input.strip() and (live_parse or st.session_state.parsed_query == user_input):
+    parsed_data = cached_parse(user_input)
+    st.session_state.parsed_query = user_input
     st.session_state.parsed_data = parsed_data
+else:
+    parsed_data = {}
 
+if parsed_data:
     if "error" in parsed_data:
         st.error(parsed_data["error"])
     elif parsed_data.get("is_indian") == False:
@@ -85,7 +135,7 @@ if user_input.strip():
 
 # Enhance prompt button
 if st.button("Enhance Prompt", use_container_width=True):
-    enhanced = prompt_enhancer(st.session_state.user_input)
+    enhanced = cached_enhance(st.session_state.user_input)
 
     # Store only in your own session_state variable
     st.session_state.user_input = enhanced
@@ -103,6 +153,11 @@ if st.button(
 ):
     st.session_state.current_page = 0  # reset pagination
     st.session_state.run_search = True
+    if user_input.strip() and not parsed_data:
+        # Parse on submit
+        parsed_data = cached_parse(user_input)
+        st.session_state.parsed_query = user_input
+        st.session_state.parsed_data = parsed_data
 
 
 if st.session_state.run_search:
@@ -112,7 +167,12 @@ if st.session_state.run_search:
     
     
 
-    store_prompt(conn,user_input,parsed_data)
+    parsed_data = cached_parse(user_input)
+
+    # Once per query, not on every rerun or page change
+    if st.session_state.stored_prompt != user_input:
+        log_prompt(user_input, parsed_data)
+        st.session_state.stored_prompt = user_input
     
     # Progress bar
     st.session_state.progress_placeholder = st.empty()
@@ -120,59 +180,13 @@ if st.session_state.run_search:
     status = st.empty()
 
     if user_input.strip() and "error" not in parsed_data:
-        query, location = query_making(parsed_data) # getting query like https:://linkedin.com --- AND location list 
-        
-        print(query)
- 
-        
         ### pagination concept 
         
         if st.session_state.current_page >= 0 :
-            results_per_page = 10
-            start = st.session_state.current_page * results_per_page
-            
-            serp_data = serp_api_call(
-                query,
-                start= start,
-                results_per_page=10
-            )
-            
-        
-            saral_data, remain_urls = fetch_from_saral_data(serp_data, conn)
-            
-            print(remain_urls)
-            
-            
             st.session_state.progress.progress(30)
-            
-            serp_json = {}
-            
-            apify_json = {}
-            
-            if len(remain_urls) >= 1:
-                for idx, i in enumerate(remain_urls,start=1):
-                    serp_json[idx] = i
-                    
-                apify_json = apify_call(serp_json)
-                st.session_state.progress.progress(70)
-                
-
-            if apify_json:
-                total_candidates = saral_data + apify_json
-                
-            else:
-                total_candidates = saral_data
-             
-            data_input(total_candidates)
-
-            # Validate funciton (location)
-            matched, unmatched = validate_function(location, total_candidates)
+            matched, unmatched = search_page(user_input, st.session_state.current_page)
             st.session_state.progress.progress(70)
             
-            
-            
-            matched = score_candidates(parsed_data , matched)
-            
             st.session_state.matched_results = matched
             st.session_state.unmatched_results = unmatched
             
@@ -199,23 +213,20 @@ if st.session_state.matched_results:
     
     col1, col2, col3 = st.columns([1,2,1])
     with col1:
-        if st.button("< Previous") and st.session_state.current_page > 0:
-            st.session_state.current_page -= 1
-            st.session_state.run_search = True 
+        st.button("< Previous", disabled=st.session_state.current_page == 0,
+                  on_click=go_to_page, args=(st.session_state.current_page - 1,))
         
     with col2:
         st.write(f'Current Page {st.session_state.current_page + 1}')
 
     with col3:
-        if st.button("Next >"):
-            st.session_state.current_page += 1
-            st.session_state.run_search = True 
+        st.button("Next >", on_click=go_to_page, args=(st.session_state.current_page + 1,))
            
 
     st.subheader("Candidates Profiles")
     for idx, profiles in enumerate(st.session_state.matched_results, start=1):
         with st.expander(f"{idx}. {profiles.get('fullName', 'Unknown')}"):
-            st.json(profiles)
+            st.json(profiles.to_dict())
             
         with st.expander(
             f"{idx}. {profiles.get('fullName', 'Unknown')} • Score: {profiles.get('score','None')} ", expanded=True
@@ -1,4 +1,9 @@
-from flask import Flask, render_template, request, jsonify, session
+import time
+
+_boot_started = time.perf_counter()
+
+from flask import Flask, render_template, request, jsonify, session, Response, stream_with_context
+import hmac
 import os
 import traceback
 from dotenv import load_dotenv
@@ -7,7 +12,7 @@ load_dotenv()
 
 # Try to import modules with error handling
 try:
-    from nlp_parsed import parse_recruiter_query, prompt_enhancer, profile_summary, client , deployment
+    from nlp_parsed import parse_recruiter_query, prompt_enhancer, prompt_enhancer_stream, profile_summary, profile_summary_batch, client , deployment
     print("✓ NLP module imported successfully")
 except Exception as e:
     print(f"✗ Error importing nlp_parsed: {e}")
@@ -58,42 +63,77 @@ except Exception as e:
         }
 
     def prompt_enhancer(query): return query
+    prompt_enhancer_stream = None
+    client = None
 
+# The pipeline's default steps cover the rest of the graph; these are the ones this app overrides
 try:
-    from SERP import query_making, serp_api_call
+    from SERP import serp_api_call
     print("✓ SERP module imported successfully")
 except Exception as e:
     print(f"✗ Error importing SERP: {e}")
-    def query_making(data): return "", []
     def serp_api_call(query, start=0, results_per_page=10): return None
 
 try:
-    from apify import apify_call
-    print("✓ Apify module imported successfully")
-except Exception as e:
-    print(f"✗ Error importing apify: {e}")
-    def apify_call(serp_json): return []
-
-try:
-    from validate import validate_function, score_candidates
+    from validate import validate_function
     print("✓ Validate module imported successfully")
 except Exception as e:
     print(f"✗ Error importing validate: {e}")
     def validate_function(location, candidates): return candidates, []
-    def score_candidates(parsed_data, matched): return matched
 
 try:
-    from postgres_db import fetch_from_saral_data, data_input, store_prompt, conn
+    from postgres_db import get_conn, fetch_profile
     print("✓ Database module imported successfully")
 except Exception as e:
     print(f"✗ Error importing postgres_db: {e}")
-    def fetch_from_saral_data(serp_data, conn): return [], []
-    def data_input(candidates): pass
-    def store_prompt(conn, query, parsed_data): pass
-    conn = None
+    def get_conn(): return None
+    def fetch_profile(conn, profile_id): return None
+
+from parse_token import issue_parse_token, read_parse_token, PARSE_TOKEN_KEY
+from candidate_record import parse_projection
+from search_results import paginate, parse_paging, PROFILES_PER_PAGE
+from pipeline import SearchPipeline, stage_cache, metrics as pipeline_metrics
+from write_behind import queue_metrics
+from prompt_log import log_prompt, metrics as prompt_log_metrics
+from http_compression import compress_response
+from json_provider import FastJSONProvider
+import fastjson
+from search_state import start_prefetch, store as search_states
+from rate_limit import begin_request, end_request, usage_snapshot, flush_usage
+from deadline import deadline_scope, expired, SEARCH_DEADLINE_MS, SEARCH_DEADLINE_RESERVE
+
+SEARCH_DEADLINE_MAX_MS = int(os.environ.get("SARAL_SEARCH_DEADLINE_MAX_MS", "55000"))
+
+# parse -> plan -> serp -> db_lookup -> enrich -> ingest/validate -> score -> rank, shared with saral-ai.py
+pipeline = SearchPipeline(
+    steps={'parse': parse_recruiter_query, 'serp': serp_api_call, 'validate': validate_function},
+    cache=stage_cache(),
+)
+
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "a-secret-key-for-saral-ai")
+ADMIN_TOKEN = os.environ.get("SARAL_ADMIN_TOKEN")
+
+
+@app.before_request
+def start_usage_tracking():
+    begin_request(f"{request.method} {request.path}")
+
+
+@app.after_request
+def finish_usage_tracking(response):
+    usage = end_request()
+    if usage:
+        print(f"💳 {request.method} {request.path} upstream usage: {usage}")
+    return response
+
+
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
 
 @app.route('/')
 def index():
@@ -122,15 +162,36 @@ def parse_query():
         return jsonify({
             'success': True,
             'parsed_data': parsed_data,
+            'parse_token': issue_parse_token(PARSE_TOKEN_KEY, query, parsed_data),
             'is_indian': parsed_data.get('is_indian', True)
         })
 
     except Exception as e:
         return jsonify({'error': f'Error parsing query: {str(e)}'}), 500
 
+def _sse(event, payload):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {fastjson.dumps(payload)}\n\n"
+
+
+def _stream_enhanced_prompt(query):
+    """SSE stream of enhancer tokens, ending with the full enhanced query"""
+    pieces = []
+    try:
+        for piece in prompt_enhancer_stream(query):
+            pieces.append(piece)
+            yield _sse('token', {'text': piece})
+        yield _sse('done', {'success': True, 'enhanced_query': ''.join(pieces).strip()})
+    except Exception as e:
+        print(f"⚠️ Enhance stream failed: {e}")
+        # Nothing usable was streamed - hand back the original query like the blocking path does
+        enhanced = ''.join(pieces).strip() or query
+        yield _sse('done', {'success': True, 'enhanced_query': enhanced, 'partial': bool(pieces)})
+
+
 @app.route('/enhance_prompt', methods=['POST'])
 def enhance_prompt():
-    """Enhance user prompt for better clarity"""
+    """Enhance user prompt for better clarity (streams tokens when the client accepts SSE)"""
     try:
         data = request.get_json()
         query = data.get('query', '').strip()
@@ -138,6 +199,14 @@ def enhance_prompt():
         if not query:
             return jsonify({'error': 'Please enter a valid query'}), 400
 
+        wants_stream = 'text/event-stream' in request.headers.get('Accept', '')
+        if wants_stream and client and prompt_enhancer_stream:
+            return Response(
+                stream_with_context(_stream_enhanced_prompt(query)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+
         enhanced = prompt_enhancer(query)
         return jsonify({
             'success': True,
@@ -157,181 +226,29 @@ def search_profiles():
             return jsonify({'error': 'Invalid JSON data'}), 400
 
         query = data.get('query', '').strip()
-        page = data.get('page', 1)
-
-        print(f"🔍 Search request: query='{query}', page={page}")
-
-        if not query:
-            return jsonify({'error': 'Please enter a valid query'}), 400
-
-        # Parse the query
-        print("📝 Parsing query...")
-        parsed_data = parse_recruiter_query(query)
-        print(f"✓ Parsed data: {parsed_data}")
+        try:
+            page, cursor = parse_paging(data.get('page', 1), data.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        if "error" in parsed_data:
-            return jsonify({'error': parsed_data["error"]}), 400
+        try:
+            deadline_ms = int(data.get('deadline_ms') or SEARCH_DEADLINE_MS)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'deadline_ms must be an integer'}), 400
+        deadline_ms = max(1000, min(deadline_ms, SEARCH_DEADLINE_MAX_MS))
 
-        if parsed_data.get("is_indian") is False:
-            return jsonify({'error': 'Our platform currently supports searches within India only'}), 400
-
-        if parsed_data.get("is_valid") is False:
-            return jsonify({'error': 'Please Give valid prompt so that Saral AI can understand'}), 400
-
-        # Store prompt in database (only on first page)
-        if page == 1:
-            print("💾 Storing prompt in database...")
-            try:
-                store_prompt(conn, query, parsed_data)
-            except Exception as e:
-                print(f"⚠️ Warning: Could not store prompt: {e}")
-
-        # Generate search query
-        print("🔗 Generating search query...")
-        search_query, location = query_making(parsed_data)
-        print(f"✓ Search query: {search_query}")
-
-        # Live enriching: search only enough to get 10 candidates for current page
-        matched_profiles = []
-        unique_profile_urls = set()
-        serp_page = 0
-        target_candidates = page * 10  # Target enough candidates for current page
-        max_serp_pages = min(5, page + 2)  # Limit search depth for performance
-        results_per_page = 10
-
-        print(f"🎯 Live enriching for page {page}, targeting {target_candidates} candidates...")
-
-        # Loop through SERP pages until we have enough candidates for current page
-        while len(matched_profiles) < target_candidates and serp_page < max_serp_pages:
-            start = serp_page * results_per_page
-            
-            print(f"🌐 Calling SERP API (page={serp_page}, start={start})...")
-            serp_data = serp_api_call(search_query, start=start, results_per_page=results_per_page)
+        try:
+            view, fields = parse_projection(data.get('view'), data.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-            if not serp_data or not serp_data.get('organic_results'):
-                print(f"⚠️ No more results found at page {serp_page}")
-                break
+        print(f"🔍 Search request: query='{query}', page={page}, deadline={deadline_ms}ms")
 
-            print(f"✓ SERP data received: {len(serp_data.get('organic_results', []))} results")
-
-            # Check database for existing profiles
-            print("🔍 Checking database for existing profiles...")
-            saral_data, remain_urls = fetch_from_saral_data(serp_data, conn)
-            print(f"✓ Found {len(saral_data)} existing profiles, {len(remain_urls)} new URLs")
-
-            # Fetch new profiles from Apify if needed
-            apify_json = []
-            if remain_urls:
-                print(f"🤖 Fetching {len(remain_urls)} new profiles from Apify...")
-                try:
-                    serp_json = {idx: url for idx, url in enumerate(remain_urls, start=1)}
-                    apify_json = apify_call(serp_json)
-                    print(f"✓ Apify returned {len(apify_json)} profiles")
-                except Exception as e:
-                    print(f"⚠️ Warning: Apify call failed: {e}")
-                    apify_json = []
-
-            # Combine all candidates
-            total_candidates = saral_data + apify_json if apify_json else saral_data
-
-            print(f"✓ Total candidates for page {serp_page}: {len(total_candidates)}")
-
-            # Store new candidates in database
-            if total_candidates:
-                print("💾 Storing new candidates in database...")
-                try:
-                    data_input(total_candidates)
-                except Exception as e:
-                    print(f"⚠️ Warning: Could not store candidates: {e}")
-
-            # Validate and get only matched candidates (no unmatched)
-            print("🎯 Validating candidates...")
-            matched_batch, _ = validate_function(location, total_candidates)  # Ignore unmatched
-            
-            # Filter unique profiles based on LinkedIn URL and ensure they have name
-            for profile in matched_batch:
-                # Skip if profile is None
-                if not profile:
-                    continue
-                    
-                profile_url = profile.get('linkedinUrl', '')
-                profile_name = profile.get('fullName', '')
-                
-                # Safely handle fullName - check if it exists and is not None before strip
-                if profile_name:
-                    profile_name = profile_name.strip()
-                else:
-                    profile_name = ''
-                
-                # Only add profiles that have both URL and name
-                if (profile_url and profile_url not in unique_profile_urls and 
-                    profile_name and profile_name.lower() != 'none'):
-                    unique_profile_urls.add(profile_url)
-                    matched_profiles.append(profile)
-
-            print(f"✓ Progress: {len(matched_profiles)} total matched candidates collected")
-            serp_page += 1
-
-        # Score and rank matched profiles
-        print("🏆 Scoring and ranking matched profiles...")
-        
-        # Ensure parsed_data has valid structure for scoring
-        validated_parsed_data = {
-            'job_title': parsed_data.get('job_title', ''),
-            'skills': parsed_data.get('skills') or [],  # Convert None to empty list
-            'experience': parsed_data.get('experience', ''),
-            'location': parsed_data.get('location') or [],  # Convert None to empty list
-            'work_preference': parsed_data.get('work_preference', ''),
-            'job_type': parsed_data.get('job_type', ''),
-            'is_indian': parsed_data.get('is_indian', True)
-        }
-        
-        # Only score if we have matched profiles
-        if matched_profiles:
-            matched_profiles = score_candidates(validated_parsed_data, matched_profiles)
-            
-            # Filter out profiles without valid scores
-            matched_profiles = [
-                profile for profile in matched_profiles 
-                if profile.get('score') is not None and profile.get('score') > 0
-            ]
-            
-            # Sort by score in descending order (highest score first)
-            matched_profiles.sort(key=lambda x: x.get('score', 0), reverse=True)
-            print(f"✅ Ranked {len(matched_profiles)} profiles by score")
-        else:
-            print("⚠️ No matched profiles to score")
-
-        # Pagination logic - show 10 candidates per page
-        profiles_per_page = 10
-        start_index = (page - 1) * profiles_per_page
-        end_index = start_index + profiles_per_page
-        
-        paginated_profiles = matched_profiles[start_index:end_index]
-        
-        # Calculate pagination info
-        total_available = len(matched_profiles)
-        has_more_data = serp_page < 20  # Assume more data available if we haven't exhausted search
-        estimated_total_pages = max(page + 1 if has_more_data else page, 
-                                  (total_available + profiles_per_page - 1) // profiles_per_page)
-        
-        has_next = len(paginated_profiles) == profiles_per_page and (page * profiles_per_page < total_available or has_more_data)
-        has_prev = page > 1
-
-        print(f"✅ Page {page} Results: showing {len(paginated_profiles)} profiles")
+        if not query:
+            return jsonify({'error': 'Please enter a valid query'}), 400
 
-        return jsonify({
-            'success': True,
-            'matched_profiles': paginated_profiles,
-            'matched_count': len(paginated_profiles),
-            'total_matched': total_available,
-            'current_page': page,
-            'total_pages': estimated_total_pages,
-            'has_next': has_next,
-            'has_prev': has_prev,
-            'is_live_enriched': True,
-            'parsed_data': parsed_data
-        })
+        with deadline_scope(deadline_ms / 1000):
+            return _search_within_deadline(data, query, page, cursor, deadline_ms, view, fields)
 
     except Exception as e:
         # Log the full traceback for debugging
@@ -343,10 +260,148 @@ def search_profiles():
             'traceback': traceback.format_exc() if app.debug else None
         }), 500
 
+
+def _search_within_deadline(data, query, page, cursor, deadline_ms, view, fields):
+    """
+    Body of /search. Every SERP, Apify and DB call below is bounded by the
+    request deadline; when it runs out the candidates ranked so far are
+    returned with partial=True and a cursor to resume the same page.
+    """
+    # Reuse the parse from /parse_query (or an earlier page) when the client sends its token
+    parsed_data = read_parse_token(PARSE_TOKEN_KEY, data.get('parse_token'), query)
+    if parsed_data is not None:
+        print("♻️ Reusing parsed query from parse token")
+    else:
+        print("📝 Parsing query...")
+        parsed_data = pipeline.parse(query)
+    print(f"✓ Parsed data: {parsed_data}")
+
+    if "error" in parsed_data:
+        return jsonify({'error': parsed_data["error"]}), 400
+
+    if parsed_data.get("is_indian") is False:
+        return jsonify({'error': 'Our platform currently supports searches within India only'}), 400
+
+    if parsed_data.get("is_valid") is False:
+        return jsonify({'error': 'Please Give valid prompt so that Saral AI can understand'}), 400
+
+    # Log the prompt (only on first page, and not again when resuming it); written in the background
+    if page == 1 and not cursor:
+        log_prompt(query, parsed_data)
+
+    # Earlier pages (and any prefetch) of the same search are reused, not re-run
+    state = pipeline.plan(query, parsed_data, search_states)
+    state.cancel_prefetch.set()  # this request takes over from a running prefetch
+    if cursor.get('search_key') == state.key:
+        page = cursor.get('page') or page
+        print(f"⏩ Resuming page {page} from continuation cursor")
+    planner, controller = state.planner, state.controller
+
+    # Live enriching: search only enough to get 10 candidates for current page
+    target_candidates = page * 10  # Target enough candidates for current page
+    print(f"🎯 Live enriching for page {page}, targeting {target_candidates} candidates "
+          f"({len(state.matched_profiles)} already collected)...")
+
+    credits_used = pipeline.enrich(state, target_candidates, controller.max_credits,
+                                 should_stop=lambda: expired(SEARCH_DEADLINE_RESERVE))
+    deadline_hit = expired(SEARCH_DEADLINE_RESERVE)
+
+    print(f"📊 Search plan yield: {planner.stats()}")
+    if controller.stopped_for_yield:
+        print(f"🛑 Stopped deepening: marginal yield below {controller.min_yield:.0%} of unique profiles")
+
+    ranked = pipeline.rank(state)
+    result = paginate(state, ranked, page, deadline_hit)
+
+    response = jsonify({
+        'success': True,
+        'matched_profiles': [profile.project(view, fields) for profile in result['profiles']],
+        'matched_count': len(result['profiles']),
+        'total_matched': result['total_matched'],
+        'current_page': page,
+        'total_pages': result['total_pages'],
+        'has_next': result['has_next'],
+        'has_prev': result['has_prev'],
+        'is_live_enriched': True,
+        'parsed_data': parsed_data,
+        'parse_token': issue_parse_token(PARSE_TOKEN_KEY, query, parsed_data),
+        'estimated_total': result['estimated_total'],
+        'serp_credits_used': credits_used,
+        'serp_yield': controller.stats(),
+        'search_plan': planner.stats(),
+        'partial': result['partial'],
+        'cursor': result['cursor'],
+        'deadline_ms': deadline_ms,
+        'view': 'fields' if fields else view
+    })
+
+    # Once this page is on its way, keep enriching in the background: the rest of
+    # this page if the deadline cut it short, otherwise the next one
+    if result['has_next'] or result['partial']:
+        next_target = (page if result['partial'] else page + 1) * PROFILES_PER_PAGE
+        response.call_on_close(lambda: start_prefetch(state, pipeline.enrich, next_target))
+
+    return response
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'message': 'Saral AI Flask API is running'})
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Saral AI Flask API is running',
+        'cold_start': {
+            'import_ms': COLD_START_MS,
+            'budget_ms': COLD_START_BUDGET_MS,
+            'within_budget': COLD_START_MS <= COLD_START_BUDGET_MS
+        },
+        'write_queues': {name: m['depth'] for name, m in queue_metrics().items()}
+    })
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Full details for one candidate card - from a live search first, then the database"""
+    try:
+        view, fields = parse_projection(request.args.get('view', 'full'), request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    profile = search_states.find_profile(profile_id)
+    if profile is None:
+        conn = get_conn()
+        profile = fetch_profile(conn, profile_id) if conn is not None else None
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+
+    body = {'success': True, 'profile': profile.project(view, fields)}
+    if request.args.get('raw') in ('1', 'true'):
+        # The complete upstream payload, re-read from the Apify dataset when we have one
+        body['raw'] = profile.raw
+    return jsonify(body)
+
+@app.route('/admin/usage', methods=['GET'])
+def admin_usage():
+    """Upstream spend per day and per recent request, rate-limiter state, stage timings and write queues"""
+    # Header only: a token in the query string ends up in access and proxy logs
+    token = request.headers.get('X-Admin-Token') or ''
+    if not ADMIN_TOKEN or not hmac.compare_digest(token.encode(), ADMIN_TOKEN.encode()):
+        return jsonify({'success': False, 'error': 'Forbidden'}), 403
+
+    days = request.args.get('days', 7, type=int)
+    flush_usage()
+    daily = None
+    conn = get_conn()
+    if conn is not None:
+        from postgres_db import fetch_api_usage
+        daily = fetch_api_usage(conn, days)
+
+    return jsonify({
+        'success': True,
+        'daily': daily,
+        'pipeline_stages': pipeline_metrics.snapshot(),
+        'write_behind': queue_metrics(),
+        'prompt_log': prompt_log_metrics(),
+        **usage_snapshot()
+    })
 
 @app.route('/profile_summary', methods=['POST'])
 def get_profile_summary():
@@ -382,7 +437,8 @@ def get_profile_summary():
                 'success': True,
                 'profile_summary': summary_result,
                 'candidate_name': profile.get('fullName', 'Unknown'),
-                'linkedin_url': profile.get('linkedinUrl', '')
+                'linkedin_url': profile.get('linkedinUrl', ''),
+                'parsed_data': read_parse_token(PARSE_TOKEN_KEY, data.get('parse_token'))
             })
 
         except Exception as summary_error:
@@ -402,6 +458,55 @@ def get_profile_summary():
         }), 500
 
 
+@app.route('/profile_summary_batch', methods=['POST'])
+def get_profile_summary_batch():
+    """Generate summaries for several candidates at once, keyed by LinkedIn URL"""
+    try:
+        data = request.get_json()
+        if data is None:
+            return jsonify({'error': 'Invalid JSON data'}), 400
+
+        profiles = data.get('profiles')
+        if not profiles or not isinstance(profiles, list):
+            return jsonify({'error': 'A list of profiles is required'}), 400
+
+        print(f"📊 Generating batch profile summaries for {len(profiles)} candidates")
+
+        summaries = profile_summary_batch(profiles, client, deployment)
+
+        if "error" in summaries:
+            print(f"❌ Batch profile summary error: {summaries['error']}")
+            return jsonify({
+                'success': False,
+                'error': summaries['error']
+            }), 500
+
+        failed = sum(1 for s in summaries.values() if isinstance(s, dict) and "error" in s)
+        print(f"✅ Batch profile summaries generated ({len(summaries) - failed} ok, {failed} failed)")
+
+        return jsonify({
+            'success': True,
+            'summaries': summaries,
+            'summary_count': len(summaries),
+            'failed_count': failed,
+            'parsed_data': read_parse_token(PARSE_TOKEN_KEY, data.get('parse_token'))
+        })
+
+    except Exception as e:
+        print(f"❌ Batch profile summary endpoint error: {str(e)}")
+        print(f"📋 Traceback: {traceback.format_exc()}")
+        return jsonify({
+            'success': False,
+            'error': f'Batch profile summary failed: {str(e)}',
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+
+# Everything above runs on a cold start; clients, the DB connection and fixtures are created on first use
+COLD_START_BUDGET_MS = int(os.environ.get("SARAL_COLD_START_BUDGET_MS", "500"))
+COLD_START_MS = round((time.perf_counter() - _boot_started) * 1000, 1)
+print(f"🚀 Saral AI API ready in {COLD_START_MS}ms (budget {COLD_START_BUDGET_MS}ms)")
+
 
 if __name__ == '__main__':
     # Use 0.0.0.0 to bind to all interfaces for Replit
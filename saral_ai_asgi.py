@@ -0,0 +1,389 @@
+"""
+asyncio-native variant of saral_ai_api.py (same routes and response shapes).
+
+SerpAPI goes through httpx, Postgres through an asyncpg pool and Apify through
+ApifyClientAsync, so a request waiting on upstream I/O holds no thread. Run it
+with any ASGI server, e.g.
+
+    uvicorn saral_ai_asgi:app --host 0.0.0.0 --port 8000
+"""
+import asyncio
+import os
+import traceback
+
+import httpx
+from dotenv import load_dotenv
+from quart import Quart, Response, jsonify, render_template, request
+
+import async_db
+import fastjson
+from apify import apify_call_async
+from candidate_record import parse_projection
+from deadline import deadline_scope, expired, SEARCH_DEADLINE_MS, SEARCH_DEADLINE_RESERVE
+from http_compression import choose_encoding, compress_body, COMPRESS_MIN_BYTES
+from json_provider import FastJSONProvider
+from nlp_parsed import (parse_recruiter_query, prompt_enhancer, prompt_enhancer_stream_async,
+                        profile_summary, profile_summary_batch, client, deployment)
+from parse_token import issue_parse_token, read_parse_token, PARSE_TOKEN_KEY
+from pipeline import AsyncSearchPipeline, StageCache
+from postgres_db import queue_serp_page
+from prompt_log import log_prompt
+from rate_limit import begin_request, end_request
+from search_results import paginate, parse_paging, PROFILES_PER_PAGE
+from search_state import store as search_states
+from SERP import serp_api_call_async, normalize_profile_link
+from write_behind import drain_all, queue_metrics
+
+load_dotenv()
+
+SEARCH_DEADLINE_MAX_MS = int(os.environ.get("SARAL_SEARCH_DEADLINE_MAX_MS", "55000"))
+# Distinct dorks whose next SERP page is fetched concurrently while a page still needs many candidates
+SERP_FANOUT = int(os.environ.get("SARAL_ASGI_SERP_FANOUT", "3"))
+
+
+app = Quart(__name__)
+app.json = FastJSONProvider(app)
+app.secret_key = os.environ.get("FLASK_SECRET_KEY", "a-secret-key-for-saral-ai")
+
+http = None
+
+
+@app.before_serving
+async def open_clients():
+    global http
+    http = httpx.AsyncClient(limits=httpx.Limits(max_connections=100, max_keepalive_connections=20))
+
+
+@app.after_serving
+async def close_clients():
+    if http is not None:
+        await http.aclose()
+    await async_db.close_pool()
+    await asyncio.to_thread(drain_all)
+
+
+@app.before_request
+async def start_usage_tracking():
+    begin_request(f"{request.method} {request.path}")
+
+
+@app.after_request
+async def finish_request(response):
+    usage = end_request()
+    if usage:
+        print(f"💳 {request.method} {request.path} upstream usage: {usage}")
+
+    # Same policy as http_compression.compress_response; SSE streams are text/event-stream and skipped
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if (response.mimetype == 'application/json' and 200 <= response.status_code < 300
+            and 'Content-Encoding' not in response.headers):
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            body = await response.get_data()
+            if len(body) >= COMPRESS_MIN_BYTES:
+                response.set_data(compress_body(body, encoding))
+                response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.route('/')
+async def index():
+    """Main page to display the search interface"""
+    return await render_template('index.html')
+
+
+@app.route('/parse_query', methods=['POST'])
+async def parse_query():
+    """Parse user query and return structured data"""
+    try:
+        data = await request.get_json()
+        query = data.get('query', '').strip()
+
+        if not query:
+            return jsonify({'error': 'Please enter a valid query'}), 400
+
+        # The rules fast path is CPU only; an LLM fallback waits on the gateway loop off this one
+        parsed_data = await asyncio.to_thread(parse_recruiter_query, query)
+
+        if "error" in parsed_data:
+            return jsonify({'error': parsed_data["error"]}), 400
+
+        return jsonify({
+            'success': True,
+            'parsed_data': parsed_data,
+            'parse_token': issue_parse_token(PARSE_TOKEN_KEY, query, parsed_data),
+            'is_indian': parsed_data.get('is_indian', True)
+        })
+
+    except Exception as e:
+        return jsonify({'error': f'Error parsing query: {str(e)}'}), 500
+
+
+def _sse(event, payload):
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {fastjson.dumps(payload)}\n\n"
+
+
+async def _stream_enhanced_prompt(query):
+    """SSE stream of enhancer tokens, ending with the full enhanced query"""
+    pieces = []
+    try:
+        async for piece in prompt_enhancer_stream_async(query):
+            pieces.append(piece)
+            yield _sse('token', {'text': piece})
+        yield _sse('done', {'success': True, 'enhanced_query': ''.join(pieces).strip()})
+    except Exception as e:
+        print(f"⚠️ Enhance stream failed: {e}")
+        enhanced = ''.join(pieces).strip() or query
+        yield _sse('done', {'success': True, 'enhanced_query': enhanced, 'partial': bool(pieces)})
+
+
+@app.route('/enhance_prompt', methods=['POST'])
+async def enhance_prompt():
+    """Enhance user prompt for better clarity (streams tokens when the client accepts SSE)"""
+    try:
+        data = await request.get_json()
+        query = data.get('query', '').strip()
+
+        if not query:
+            return jsonify({'error': 'Please enter a valid query'}), 400
+
+        if 'text/event-stream' in request.headers.get('Accept', '') and client:
+            response = Response(
+                _stream_enhanced_prompt(query),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
+            response.timeout = None
+            return response
+
+        enhanced = await asyncio.to_thread(prompt_enhancer, query)
+        return jsonify({'success': True, 'enhanced_query': enhanced})
+
+    except Exception as e:
+        return jsonify({'error': f'Error enhancing prompt: {str(e)}'}), 500
+
+
+class SerpCache(StageCache):
+    """In-process SERP pages backed by the shared serp_cache table, read through the asyncpg pool"""
+
+    async def get(self, key):
+        value = super().get(key)
+        if value is None and key[0] == "serp":
+            value = await async_db.fetch_serp_page(*key[1:])
+            if value is not None:
+                super().put(key, value)
+        return value
+
+    def put(self, key, value):
+        super().put(key, value)
+        if key[0] == "serp":
+            queue_serp_page(*key[1:], value)
+
+
+async def serp_page(query, start, results_per_page):
+    return await serp_api_call_async(http, query, start=start, results_per_page=results_per_page)
+
+
+async def db_lookup(organic_results):
+    return await async_db.fetch_from_saral_data([normalize_profile_link(r.get('link')) for r in organic_results])
+
+
+async def enrich_profiles(urls):
+    return await apify_call_async({idx: url for idx, url in enumerate(urls, start=1)})
+
+
+# Same stage graph as the Flask app; only the upstream steps are swapped for their async clients
+pipeline = AsyncSearchPipeline(
+    steps={'parse': parse_recruiter_query, 'serp': serp_page, 'db_lookup': db_lookup, 'enrich': enrich_profiles},
+    cache=SerpCache(),
+    fanout=SERP_FANOUT,
+)
+
+
+@app.route('/search', methods=['POST'])
+async def search_profiles():
+    """Main search function with live enriching - shows 10 candidates at a time"""
+    try:
+        data = await request.get_json()
+        if data is None:
+            return jsonify({'error': 'Invalid JSON data'}), 400
+
+        query = data.get('query', '').strip()
+        try:
+            page, cursor = parse_paging(data.get('page', 1), data.get('cursor'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        try:
+            deadline_ms = int(data.get('deadline_ms') or SEARCH_DEADLINE_MS)
+        except (TypeError, ValueError):
+            return jsonify({'error': 'deadline_ms must be an integer'}), 400
+        deadline_ms = max(1000, min(deadline_ms, SEARCH_DEADLINE_MAX_MS))
+
+        try:
+            view, fields = parse_projection(data.get('view'), data.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        print(f"🔍 Search request: query='{query}', page={page}, deadline={deadline_ms}ms")
+
+        if not query:
+            return jsonify({'error': 'Please enter a valid query'}), 400
+
+        with deadline_scope(deadline_ms / 1000):
+            return await _search_within_deadline(data, query, page, cursor, deadline_ms, view, fields)
+
+    except Exception as e:
+        print(f"❌ Search error: {str(e)}")
+        print(f"📋 Traceback: {traceback.format_exc()}")
+        return jsonify({
+            'success': False,
+            'error': f'Search failed: {str(e)}',
+            'traceback': traceback.format_exc() if app.debug else None
+        }), 500
+
+
+async def _search_within_deadline(data, query, page, cursor, deadline_ms, view, fields):
+    parsed_data = read_parse_token(PARSE_TOKEN_KEY, data.get('parse_token'), query)
+    if parsed_data is None:
+        parsed_data = await pipeline.aparse(query)
+
+    if "error" in parsed_data:
+        return jsonify({'error': parsed_data["error"]}), 400
+
+    if parsed_data.get("is_indian") is False:
+        return jsonify({'error': 'Our platform currently supports searches within India only'}), 400
+
+    if parsed_data.get("is_valid") is False:
+        return jsonify({'error': 'Please Give valid prompt so that Saral AI can understand'}), 400
+
+    # Written in the background; the search does not wait for it
+    if page == 1 and not cursor:
+        log_prompt(query, parsed_data)
+
+    state = await pipeline.aplan(query, parsed_data, search_states)
+    if cursor.get('search_key') == state.key:
+        page = cursor.get('page') or page
+    planner, controller = state.planner, state.controller
+
+    target_candidates = page * PROFILES_PER_PAGE
+    credits_used = await pipeline.aenrich(state, target_candidates, controller.max_credits,
+                                          should_stop=lambda: expired(SEARCH_DEADLINE_RESERVE))
+    deadline_hit = expired(SEARCH_DEADLINE_RESERVE)
+
+    ranked = await pipeline.arank(state)
+    result = paginate(state, ranked, page, deadline_hit)
+
+    return jsonify({
+        'success': True,
+        'matched_profiles': [profile.project(view, fields) for profile in result['profiles']],
+        'matched_count': len(result['profiles']),
+        'total_matched': result['total_matched'],
+        'current_page': page,
+        'total_pages': result['total_pages'],
+        'has_next': result['has_next'],
+        'has_prev': result['has_prev'],
+        'is_live_enriched': True,
+        'parsed_data': parsed_data,
+        'parse_token': issue_parse_token(PARSE_TOKEN_KEY, query, parsed_data),
+        'estimated_total': result['estimated_total'],
+        'serp_credits_used': credits_used,
+        'serp_yield': controller.stats(),
+        'search_plan': planner.stats(),
+        'partial': result['partial'],
+        'cursor': result['cursor'],
+        'deadline_ms': deadline_ms,
+        'view': 'fields' if fields else view
+    })
+
+
+@app.route('/profiles/<profile_id>', methods=['GET'])
+async def get_profile(profile_id):
+    """Full details for one candidate card - from a live search first, then the database"""
+    try:
+        view, fields = parse_projection(request.args.get('view', 'full'), request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    profile = search_states.find_profile(profile_id) or await async_db.fetch_profile(profile_id)
+    if profile is None:
+        return jsonify({'success': False, 'error': 'Profile not found'}), 404
+
+    body = {'success': True, 'profile': profile.project(view, fields)}
+    if request.args.get('raw') in ('1', 'true'):
+        body['raw'] = await asyncio.to_thread(lambda: profile.raw)
+    return jsonify(body)
+
+
+@app.route('/health', methods=['GET'])
+async def health_check():
+    """Health check endpoint"""
+    return jsonify({
+        'status': 'healthy',
+        'message': 'Saral AI ASGI API is running',
+        'write_queues': {name: m['depth'] for name, m in queue_metrics().items()}
+    })
+
+
+@app.route('/profile_summary', methods=['POST'])
+async def get_profile_summary():
+    """Generate structured profile summary and evaluation for a candidate"""
+    try:
+        data = await request.get_json()
+        if data is None:
+            return jsonify({'error': 'Invalid JSON data'}), 400
+
+        profile = data.get('profile')
+        if not profile:
+            return jsonify({'error': 'Profile data is required'}), 400
+
+        summary_result = await asyncio.to_thread(profile_summary, profile, client, deployment)
+        if isinstance(summary_result, dict) and "error" in summary_result:
+            return jsonify({'success': False, 'error': summary_result['error']}), 500
+
+        return jsonify({
+            'success': True,
+            'profile_summary': summary_result,
+            'candidate_name': profile.get('fullName', 'Unknown'),
+            'linkedin_url': profile.get('linkedinUrl', ''),
+            'parsed_data': read_parse_token(PARSE_TOKEN_KEY, data.get('parse_token'))
+        })
+
+    except Exception as e:
+        print(f"❌ Profile summary endpoint error: {str(e)}")
+        return jsonify({'success': False, 'error': f'Profile summary failed: {str(e)}'}), 500
+
+
+@app.route('/profile_summary_batch', methods=['POST'])
+async def get_profile_summary_batch():
+    """Generate summaries for several candidates at once, keyed by LinkedIn URL"""
+    try:
+        data = await request.get_json()
+        if data is None:
+            return jsonify({'error': 'Invalid JSON data'}), 400
+
+        profiles = data.get('profiles')
+        if not profiles or not isinstance(profiles, list):
+            return jsonify({'error': 'A list of profiles is required'}), 400
+
+        summaries = await asyncio.to_thread(profile_summary_batch, profiles, client, deployment)
+        if "error" in summaries:
+            return jsonify({'success': False, 'error': summaries['error']}), 500
+
+        failed = sum(1 for s in summaries.values() if isinstance(s, dict) and "error" in s)
+        return jsonify({
+            'success': True,
+            'summaries': summaries,
+            'summary_count': len(summaries),
+            'failed_count': failed,
+            'parsed_data': read_parse_token(PARSE_TOKEN_KEY, data.get('parse_token'))
+        })
+
+    except Exception as e:
+        print(f"❌ Batch profile summary endpoint error: {str(e)}")
+        return jsonify({'success': False, 'error': f'Batch profile summary failed: {str(e)}'}), 500
+
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=8000)
@@ -0,0 +1,127 @@
+from validate import score_candidates
+
+
+PROFILES_PER_PAGE = 10
+
+
+def add_matches(state, matched_batch):
+    """Append validated profiles the search has not collected yet; returns how many were new"""
+    matched_before = len(state.matched_profiles)
+
+    # Filter unique profiles based on LinkedIn URL and ensure they have name
+    for profile in matched_batch:
+        # Skip if profile is None
+        if not profile:
+            continue
+
+        profile_url = profile.get('linkedinUrl', '')
+        profile_name = (profile.get('fullName', '') or '').strip()
+
+        # Only add profiles that have both URL and name
+        if (profile_url and profile_url not in state.unique_profile_urls and
+                profile_name and profile_name.lower() != 'none'):
+            state.unique_profile_urls.add(profile_url)
+            state.matched_profiles.append(profile)
+
+    return len(state.matched_profiles) - matched_before
+
+
+def score_profiles(parsed_data, matched_profiles):
+    """Attach score and score_breakdown to each profile"""
+    print("🏆 Scoring and ranking matched profiles...")
+
+    # Ensure parsed_data has valid structure for scoring
+    validated_parsed_data = {
+        'job_title': parsed_data.get('job_title', ''),
+        'skills': parsed_data.get('skills') or [],  # Convert None to empty list
+        'experience': parsed_data.get('experience', ''),
+        'location': parsed_data.get('location') or [],  # Convert None to empty list
+        'work_preference': parsed_data.get('work_preference', ''),
+        'job_type': parsed_data.get('job_type', ''),
+        'is_indian': parsed_data.get('is_indian', True)
+    }
+
+    if not matched_profiles:
+        print("⚠️ No matched profiles to score")
+        return []
+
+    return score_candidates(validated_parsed_data, matched_profiles)
+
+
+def order_profiles(scored_profiles):
+    """Drop zero scores and sort best first"""
+    # Filter out profiles without valid scores
+    ranked = [
+        profile for profile in scored_profiles
+        if profile.get('score') is not None and profile.get('score') > 0
+    ]
+
+    # Sort by score in descending order (highest score first)
+    ranked.sort(key=lambda x: x.get('score', 0), reverse=True)
+    print(f"✅ Ranked {len(ranked)} profiles by score")
+    return ranked
+
+
+def rank_profiles(parsed_data, matched_profiles):
+    """Score, drop zero scores and sort best first"""
+    return order_profiles(score_profiles(parsed_data, matched_profiles))
+
+
+def _positive_int(value, name):
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be a positive integer")
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a positive integer") from None
+    if number < 1:
+        raise ValueError(f"{name} must be a positive integer")
+    return number
+
+
+def parse_paging(page=1, cursor=None):
+    """
+    Validate the page= / cursor= request parameters of /search. Returns
+    (page, cursor) with cursor a dict whose page, if any, is an int. Raises
+    ValueError with a message for the client.
+    """
+    page = _positive_int(page, "page")
+    cursor = cursor or {}
+    if not isinstance(cursor, dict):
+        raise ValueError("cursor must be an object")
+    if cursor.get('page') is not None:
+        cursor = dict(cursor, page=_positive_int(cursor['page'], "cursor.page"))
+    return page, cursor
+
+
+def paginate(state, ranked_profiles, page, deadline_hit=False):
+    """Page slice plus the pagination fields of the /search response"""
+    planner, controller = state.planner, state.controller
+
+    start_index = (page - 1) * PROFILES_PER_PAGE
+    paginated_profiles = ranked_profiles[start_index:start_index + PROFILES_PER_PAGE]
+
+    total_available = len(ranked_profiles)
+    # More data exists only if some dork is still live and recent pages were still productive
+    has_more_data = controller.has_more(sources_left=planner.next_dork() is not None)
+    estimated_total = max(total_available, controller.estimate_total(total_available, sources_left=has_more_data))
+
+    has_next = len(paginated_profiles) == PROFILES_PER_PAGE and (page * PROFILES_PER_PAGE < total_available or has_more_data)
+    estimated_total_pages = max(page + 1 if has_next else page,
+                                (estimated_total + PROFILES_PER_PAGE - 1) // PROFILES_PER_PAGE)
+
+    # Ran out of time before this page was full and there is still somewhere left to look
+    partial = deadline_hit and len(paginated_profiles) < PROFILES_PER_PAGE and has_more_data
+
+    print(f"✅ Page {page} Results: showing {len(paginated_profiles)} profiles" + (" (partial)" if partial else ""))
+
+    return {
+        'profiles': paginated_profiles,
+        'total_matched': total_available,
+        'total_pages': estimated_total_pages,
+        'has_next': has_next,
+        'has_prev': page > 1,
+        'estimated_total': estimated_total,
+        'partial': partial,
+        'cursor': {'search_key': state.key, 'page': page} if partial else None,
+    }
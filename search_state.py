@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from deadline import deadline_scope
+
+
+SEARCH_STATE_TTL = int(os.getenv("SARAL_SEARCH_STATE_TTL", "900"))
+SEARCH_STATE_MAX = int(os.getenv("SARAL_SEARCH_STATE_MAX", "200"))
+
+PREFETCH_ENABLED = os.getenv("SARAL_PREFETCH", "false").lower() in ("1", "true", "yes")
+# SERP credits one background prefetch may spend
+PREFETCH_MAX_CREDITS = int(os.getenv("SARAL_PREFETCH_MAX_CREDITS", "3"))
+# Prefetch is abandoned once nobody has looked at the search for this long
+PREFETCH_IDLE_SECONDS = int(os.getenv("SARAL_PREFETCH_IDLE_SECONDS", "60"))
+PREFETCH_MAX_CONCURRENT = int(os.getenv("SARAL_PREFETCH_MAX_CONCURRENT", "4"))
+# Upper bound on one prefetch, upstream calls included
+PREFETCH_DEADLINE_SECONDS = float(os.getenv("SARAL_PREFETCH_DEADLINE_SECONDS", "60"))
+
+_prefetch_slots = threading.BoundedSemaphore(PREFETCH_MAX_CONCURRENT)
+
+
+def search_key(query: str, parsed_data: dict) -> str:
+    """Identity of one search intent: the query text and its parse"""
+    payload = json.dumps({"q": query.strip().lower(), "p": parsed_data}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class SearchState:
+    """Everything collected so far for one search, shared by its pages"""
+
+    def __init__(self, key, parsed_data, planner, controller):
+        self.key = key
+        self.parsed_data = parsed_data
+        self.planner = planner
+        self.controller = controller
+        self.matched_profiles = []
+        # Candidates validation rejected (location mismatch); only the Streamlit app shows them
+        self.unmatched_profiles = []
+        self.unique_profile_urls = set()
+        self.seen_links = set()
+        # Held only to read or update this state, never across an upstream call
+        self.lock = threading.Lock()
+        # Notified whenever a worker finishes a page, for workers waiting on a dork in flight
+        self.changed = threading.Condition(self.lock)
+        self.last_access = time.monotonic()
+        self.prefetching = False
+        self.cancel_prefetch = threading.Event()
+
+    def touch(self):
+        self.last_access = time.monotonic()
+
+    def idle_for(self):
+        return time.monotonic() - self.last_access
+
+
+class SearchStateStore:
+    """In-process LRU of search states with a time-to-live"""
+
+    def __init__(self, ttl=SEARCH_STATE_TTL, max_entries=SEARCH_STATE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key, factory):
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None and state.idle_for() > self.ttl:
+                state.cancel_prefetch.set()
+                state = None
+            if state is None:
+                state = factory()
+                self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_entries:
+                _, evicted = self._states.popitem(last=False)
+                evicted.cancel_prefetch.set()
+            state.touch()
+            return state
+
+    def get(self, key):
+        with self._lock:
+            return self._states.get(key)
+
+    def find_profile(self, profile_id):
+        """A candidate collected by any live search, by public LinkedIn id"""
+        with self._lock:
+            states = list(self._states.values())
+        for state in reversed(states):
+            # matched_profiles is only ever appended to; a copy is a consistent snapshot
+            for profile in list(state.matched_profiles):
+                if getattr(profile, "profile_id", None) == profile_id:
+                    return profile
+        return None
+
+    def __len__(self):
+        return len(self._states)
+
+
+store = SearchStateStore()
+
+
+def start_prefetch(state, enrich, target):
+    """
+    Enrich state up to `target` matched candidates on a background thread.
+
+    enrich(state, target, max_credits, should_stop) does the work; it is
+    called without holding state.lock and must take it itself. The prefetch
+    stops when its credit budget is spent, PREFETCH_DEADLINE_SECONDS pass,
+    the search goes idle, or a foreground request sets state.cancel_prefetch.
+    """
+    if not PREFETCH_ENABLED or state.prefetching or len(state.matched_profiles) >= target:
+        return False
+    if not _prefetch_slots.acquire(blocking=False):
+        return False
+
+    state.prefetching = True
+    state.cancel_prefetch.clear()
+
+    def should_stop():
+        return state.cancel_prefetch.is_set() or state.idle_for() > PREFETCH_IDLE_SECONDS
+
+    def run():
+        try:
+            print(f"🔮 Prefetching up to {target} candidates for search {state.key[:8]}")
+            with deadline_scope(PREFETCH_DEADLINE_SECONDS):
+                enrich(state, target, PREFETCH_MAX_CREDITS, should_stop)
+        except Exception as e:
+            print(f"⚠️ Prefetch failed: {e}")
+        finally:
+            state.prefetching = False
+            _prefetch_slots.release()
+
+    threading.Thread(target=run, name=f"prefetch-{state.key[:8]}", daemon=True).start()
+    return True
@@ -0,0 +1,85 @@
+import os
+
+
+# Stop deepening once this many consecutive SERP pages fall below the yield threshold
+SERP_YIELD_WINDOW = int(os.getenv("SARAL_SERP_YIELD_WINDOW", "2"))
+# Minimum matched/unique ratio for a SERP page to count as productive
+SERP_MIN_YIELD = float(os.getenv("SARAL_SERP_MIN_YIELD", "0.15"))
+# Hard ceiling on SERP credits a single /search request may spend
+SERP_MAX_CREDITS = int(os.getenv("SARAL_SERP_MAX_CREDITS", "10"))
+
+
+class YieldController:
+    """
+    Decides whether another SERP page is worth paying for, based on the
+    matched/unique ratio of the pages fetched so far for this query.
+    Pages without a single new profile (an exhausted dork, or one that only
+    overlapped the others) say nothing about the query's yield: they cost a
+    credit but stay out of the window, so overlapping dorks cannot end a
+    search that other dorks could still fill.
+    """
+
+    def __init__(self, max_credits=SERP_MAX_CREDITS, min_yield=SERP_MIN_YIELD,
+                 window=SERP_YIELD_WINDOW, results_per_page=10):
+        self.max_credits = max_credits
+        self.min_yield = min_yield
+        self.window = window
+        self.results_per_page = results_per_page
+        self.pages = []  # (unique, matched) per SERP page that surfaced new profiles
+        self.empty_pages = 0
+        self.stopped_for_yield = False
+
+    @property
+    def credits_used(self):
+        return len(self.pages) + self.empty_pages
+
+    def record_page(self, unique, matched):
+        if not unique:
+            self.empty_pages += 1
+            return
+        self.pages.append((unique, matched))
+        recent = self.pages[-self.window:]
+        if len(recent) == self.window and all(self._ratio(u, m) < self.min_yield for u, m in recent):
+            self.stopped_for_yield = True
+
+    @staticmethod
+    def _ratio(unique, matched):
+        return matched / unique if unique else 0.0
+
+    def marginal_yield(self):
+        """Matched candidates per SERP page over the recent window"""
+        recent = self.pages[-self.window:]
+        if not recent:
+            return None
+        return sum(m for _, m in recent) / len(recent)
+
+    def should_continue(self, credits_spent=None):
+        """credits_spent: credits used by the current request, when the controller outlives it"""
+        spent = self.credits_used if credits_spent is None else credits_spent
+        return not self.stopped_for_yield and spent < self.max_credits
+
+    def has_more(self, sources_left=True):
+        """Whether further pages are likely to produce matches at all"""
+        return sources_left and not self.stopped_for_yield
+
+    def estimate_total(self, matched_so_far, sources_left=True, horizon=None):
+        """
+        Expected matched candidates if the search kept going for another
+        `horizon` pages (defaults to this request's budget) at the recent yield.
+        """
+        if not self.has_more(sources_left):
+            return matched_so_far
+        per_page = self.marginal_yield()
+        if per_page is None:
+            return matched_so_far
+        horizon = self.max_credits if horizon is None else horizon
+        return matched_so_far + int(per_page * horizon)
+
+    def stats(self):
+        return {
+            "serp_pages": self.credits_used,
+            "pages_without_new_profiles": self.empty_pages,
+            "matched_per_page": [m for _, m in self.pages],
+            "unique_per_page": [u for u, _ in self.pages],
+            "stopped_for_yield": self.stopped_for_yield,
+        }
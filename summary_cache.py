@@ -0,0 +1,97 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import postgres_db
+from profile_projection import project_profile
+
+
+SUMMARY_CACHE_SIZE = int(os.getenv("SUMMARY_CACHE_SIZE", "512"))
+
+# Keys that change between scrapes without changing what the summary says
+# (signed image URLs, counters, our own bookkeeping columns).
+VOLATILE_KEYS = {
+    "id", "created_at", "is_complete", "score", "score_breakdown",
+    "profilePic", "profilePicHighQuality", "profilePicAllDimensions", "logo",
+    "connections", "followers",
+}
+
+
+class LRUCache:
+    """Small thread-safe LRU used for hot in-process entries"""
+
+    def __init__(self, capacity=SUMMARY_CACHE_SIZE):
+        self.capacity = capacity
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.capacity:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+_hot = LRUCache()
+
+
+def normalize_profile(value):
+    """Drop volatile keys recursively so equal content hashes equally"""
+    if isinstance(value, dict):
+        return {k: normalize_profile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [normalize_profile(v) for v in value]
+    return value
+
+
+def summary_cache_key(profile: dict, prompt_version: str) -> str:
+    """Content address of a profile for a given summary prompt version.
+
+    Only the projected fields are hashed, so changes to data the prompt never
+    sees do not invalidate the cached summary.
+    """
+    payload = json.dumps(normalize_profile(project_profile(profile)), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{prompt_version}:{payload}".encode("utf-8")).hexdigest()
+
+
+def get_cached_summary(cache_key: str, conn=None):
+    """Look the summary up in the LRU first, then in the profile_summaries table"""
+    summary = _hot.get(cache_key)
+    if summary is not None:
+        return summary
+
+    conn = conn or postgres_db.get_conn()
+    if conn is None:
+        return None
+
+    summary = postgres_db.fetch_profile_summary(conn, cache_key)
+    if summary is not None:
+        _hot.put(cache_key, summary)
+    return summary
+
+
+def put_cached_summary(cache_key: str, summary: dict, linkedin_url=None, prompt_version=None, conn=None):
+    """Remember a freshly generated summary in the LRU and the database"""
+    if not isinstance(summary, dict) or "error" in summary:
+        return
+
+    _hot.put(cache_key, summary)
+
+    conn = conn or postgres_db.get_conn()
+    if conn is None:
+        return
+
+    postgres_db.store_profile_summary(conn, cache_key, linkedin_url, prompt_version, summary)
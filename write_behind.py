@@ -0,0 +1,247 @@
+"""
+Bounded write-behind queue for writes nobody has to wait for.
+
+Callers enqueue and return at once. A background thread hands batches to
+the writer when batch_size items are waiting or flush_seconds after the
+oldest one arrived, whichever comes first, so rows from many requests
+share one round trip. A failed batch is retried with back-off, so a short
+database outage loses nothing, and dropped after MAX_ATTEMPTS.
+When the queue is full new items are refused and counted rather than
+blocking the request. Whatever is still queued is written at shutdown.
+"""
+import atexit
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+WRITE_BEHIND_MAX_ITEMS = int(os.getenv("SARAL_WRITE_BEHIND_MAX_ITEMS", "5000"))
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("SARAL_WRITE_BEHIND_BATCH_SIZE", "100"))
+WRITE_BEHIND_FLUSH_SECONDS = float(os.getenv("SARAL_WRITE_BEHIND_FLUSH_SECONDS", "2"))
+# How long shutdown may spend writing what is left
+WRITE_BEHIND_DRAIN_SECONDS = float(os.getenv("SARAL_WRITE_BEHIND_DRAIN_SECONDS", "10"))
+# With back-off doubling from 1s up to a minute, 8 attempts ride out about three minutes of outage
+MAX_ATTEMPTS = int(os.getenv("SARAL_WRITE_BEHIND_MAX_ATTEMPTS", "8"))
+MAX_BACKOFF_SECONDS = 60
+
+_queues = []
+_queues_lock = threading.Lock()
+
+
+class WriteBehindQueue:
+    """
+    writer(batch) writes a list of items and raises on failure. With `key`,
+    an item queued again before it was written replaces the queued copy
+    (latest wins) instead of being written twice.
+    """
+
+    def __init__(self, name, writer, key=None, max_items=WRITE_BEHIND_MAX_ITEMS,
+                 batch_size=WRITE_BEHIND_BATCH_SIZE, flush_seconds=WRITE_BEHIND_FLUSH_SECONDS):
+        self.name = name
+        self.writer = writer
+        self.key = key
+        self.max_items = max_items
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+
+        self._items = OrderedDict()  # key -> (item, attempts)
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self._first_queued_at = None
+        self._retry_at = 0.0
+        self._backoff = 0.0
+        self._in_flight = 0
+        self._closing = False
+        self._thread = None
+        self._stats = {
+            "enqueued": 0, "coalesced": 0, "dropped": 0, "written": 0, "batches": 0,
+            "failed_batches": 0, "abandoned": 0, "max_depth": 0,
+            "last_batch_ms": None, "last_error": None,
+        }
+
+        with _queues_lock:
+            _queues.append(self)
+
+    def put(self, item):
+        return self.put_many([item]) == 1
+
+    def put_many(self, items):
+        """Queue items; returns how many were accepted"""
+        accepted = 0
+        with self._cond:
+            for item in items:
+                key = self.key(item) if self.key else None
+                if key is None:
+                    key = ("seq", next(self._sequence))
+                if key in self._items:
+                    self._items[key] = (item, 0)
+                    self._stats["coalesced"] += 1
+                    accepted += 1
+                    continue
+                if self._closing or len(self._items) >= self.max_items:
+                    self._stats["dropped"] += 1
+                    continue
+                self._items[key] = (item, 0)
+                self._stats["enqueued"] += 1
+                accepted += 1
+            if self._items and self._first_queued_at is None:
+                self._first_queued_at = time.monotonic()
+            self._stats["max_depth"] = max(self._stats["max_depth"], len(self._items))
+            self._cond.notify()
+        if accepted:
+            self._ensure_thread()
+        if accepted < len(items):
+            print(f"⚠️ {self.name} write queue full or closed: dropped {len(items) - accepted} items")
+        return accepted
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _due(self, now):
+        """Seconds until the next batch should go out (0 = now)"""
+        if not self._items:
+            return None
+        if self._closing:
+            return 0
+        if now < self._retry_at:
+            return self._retry_at - now
+        if len(self._items) >= self.batch_size:
+            return 0
+        return max(0.0, self._first_queued_at + self.flush_seconds - now)
+
+    def _take_batch(self):
+        batch = []
+        while self._items and len(batch) < self.batch_size:
+            batch.append(self._items.popitem(last=False))
+        self._first_queued_at = time.monotonic() if self._items else None
+        self._in_flight = len(batch)
+        return batch
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    wait = self._due(time.monotonic())
+                    if wait == 0:
+                        break
+                    if self._closing and not self._items:
+                        return
+                    self._cond.wait(timeout=wait)
+                batch = self._take_batch()
+            self._write(batch)
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            self.writer([item for _, (item, _) in batch])
+        except Exception as e:
+            self._requeue(batch, e)
+            return
+        finally:
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+
+        with self._cond:
+            self._backoff = 0.0
+            self._stats["written"] += len(batch)
+            self._stats["batches"] += 1
+            self._stats["last_batch_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def _requeue(self, batch, error):
+        print(f"⚠️ {self.name} write-behind batch of {len(batch)} failed: {error}")
+        with self._cond:
+            self._stats["failed_batches"] += 1
+            self._stats["last_error"] = str(error)
+            if self._closing:
+                self._stats["abandoned"] += len(batch)
+                return
+            self._backoff = min(MAX_BACKOFF_SECONDS, max(1.0, self._backoff * 2))
+            self._retry_at = time.monotonic() + self._backoff
+
+            retried = OrderedDict()
+            for key, (item, attempts) in batch:
+                if key in self._items:
+                    continue  # a newer copy was queued meanwhile and will be written instead
+                if attempts + 1 >= MAX_ATTEMPTS:
+                    self._stats["abandoned"] += 1
+                    continue
+                retried[key] = (item, attempts + 1)
+            # Failed items go back to the front, ahead of newer writes, as long as there is room
+            room = max(0, self.max_items - len(self._items))
+            kept = list(retried.items())[:room]
+            self._stats["dropped"] += len(retried) - len(kept)
+            self._items = OrderedDict(kept + list(self._items.items()))
+            if self._items and self._first_queued_at is None:
+                self._first_queued_at = time.monotonic()
+
+    def flush(self, timeout=None):
+        """Write everything queued now, ignoring the size/time triggers; True once empty"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._items and not self._in_flight:
+                return True
+            self._retry_at = 0.0
+            self._first_queued_at = time.monotonic() - self.flush_seconds
+            self._cond.notify_all()
+        self._ensure_thread()
+        with self._cond:
+            while self._items or self._in_flight:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    return False
+                self._first_queued_at = time.monotonic() - self.flush_seconds
+                self._cond.notify_all()
+                self._cond.wait(timeout=min(left, 0.1) if left is not None else 0.1)
+        return True
+
+    def close(self, timeout=WRITE_BEHIND_DRAIN_SECONDS):
+        """Stop accepting items and write what is queued, waiting at most timeout seconds"""
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            pending = len(self._items)
+        if self._thread is not None:
+            self._thread.join(timeout)
+        with self._cond:
+            left = len(self._items) + self._in_flight
+        if pending:
+            print(f"💾 {self.name} write-behind drained {pending - left}/{pending} queued items at shutdown")
+        return left == 0
+
+    def metrics(self):
+        with self._cond:
+            oldest = time.monotonic() - self._first_queued_at if self._first_queued_at else 0.0
+            return dict(
+                self._stats,
+                depth=len(self._items),
+                in_flight=self._in_flight,
+                capacity=self.max_items,
+                oldest_age_s=round(oldest, 2),
+            )
+
+
+def queue_metrics():
+    """Metrics of every write-behind queue in this process, by name"""
+    with _queues_lock:
+        queues = list(_queues)
+    return {queue.name: queue.metrics() for queue in queues}
+
+
+def drain_all(timeout=WRITE_BEHIND_DRAIN_SECONDS):
+    """Write out every queue; shared across them, the whole drain takes at most timeout seconds"""
+    deadline = time.monotonic() + timeout
+    with _queues_lock:
+        queues = list(_queues)
+    for queue in queues:
+        queue.close(max(0.1, deadline - time.monotonic()))
+
+
+atexit.register(drain_all)